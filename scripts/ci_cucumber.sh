@@ -44,31 +44,58 @@ ci_cuc_validate_aws_keys () {
   python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_validate_aws_keys.py"
 }
 
+## One time setup: create the status indexes in the DynamoDB test metadata table, one per call
+## With the indexes, looking up the NOT_RUN tests only reads the NOT_RUN records (of the shard), not the whole test run
+## The AWS keys need dynamodb:UpdateTable and dynamodb:DescribeTable to run this command
+ci_cuc_create_status_index () {
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_create_status_index.py"
+}
+
 ## Scan feature files, find the tests match given tags, reset the test metadata in DynamoDB for a given test run
+## The parse result of each feature file is cached in $PROJECT_ROOT/.ci_cuc_cache, unchanged files are not parsed again.
+## Set CI_CUC_FEATURE_CACHE=false to parse every feature file
 ## It add new tests to the test run, delete the tests that do not match the given tag anymore
 ## It update the test names, example rows, test locations
 ## It set the status of all the tests to NOT_RUN
 ## This command is used before you start a new full cycle tests for the given test run
 # Argument 1: Test Run Name -- required
-# Argument 2: Include Tags, comma delimited -- optional
-# Argument 3: Exclude Tags, comma delimited -- optional
+# Argument 2: Include Tags, comma delimited or a tag expression like "@a and not @b" -- optional
+# Argument 3: Exclude Tags, comma delimited or a tag expression -- optional
 ci_cuc_reset_test_run () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
   assert_configured "PROJECT_NAME" "PROJECT_ROOT" "FEATURE_FOLDER"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_reset_test_run.py" "$PROJECT_NAME" "$PROJECT_ROOT" "$FEATURE_FOLDER" "$1" "RUNNING,FAILED,PASSED" "$2" "$3"
+  local cache_option=()
+  if [[ "$CI_CUC_FEATURE_CACHE" == 'false' ]]; then cache_option=(--no-cache); fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" reset "$PROJECT_NAME" "$PROJECT_ROOT" "$FEATURE_FOLDER" "$1" "RUNNING,FAILED,PASSED" "$2" "$3" "${cache_option[@]}"
 }
 
 ## A command that is very similar with ci_cuc_reset_test_run. The difference is:
 ## For each test in the DynamoDB, if the metadata (name, example row, location) is not changed AND the status is PASSED, keep it as is.
 ## This command is used before you start the re-run cycle tests for the given test run
 ## Since the PASSED tests (if metadata is not changed) remain PASSED, those will be skipped
+## With CI_CUC_IMPACT_ANALYSIS=true, a PASSED test is reset anyway when its scenario text or its step definitions changed
+## since it passed
 # Argument 1: Test Run Name -- required
-# Argument 2: Include Tags, comma delimited -- optional
-# Argument 3: Exclude Tags, comma delimited -- optional
+# Argument 2: Include Tags, comma delimited or a tag expression like "@a and not @b" -- optional
+# Argument 3: Exclude Tags, comma delimited or a tag expression -- optional
 ci_cuc_reset_test_run_keep_passed () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
   assert_configured "PROJECT_NAME" "PROJECT_ROOT" "FEATURE_FOLDER"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_reset_test_run.py" "$PROJECT_NAME" "$PROJECT_ROOT" "$FEATURE_FOLDER" "$1" "RUNNING,FAILED" "$2" "$3"
+  local cache_option=()
+  if [[ "$CI_CUC_FEATURE_CACHE" == 'false' ]]; then cache_option=(--no-cache); fi
+  if [[ "$CI_CUC_IMPACT_ANALYSIS" == 'true' ]]; then cache_option+=(--impact); fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" reset "$PROJECT_NAME" "$PROJECT_ROOT" "$FEATURE_FOLDER" "$1" "RUNNING,FAILED" "$2" "$3" "${cache_option[@]}"
+}
+
+## Move the FAILED and RUNNING tests of the test run back to NOT_RUN for a retry round, keeping the PASSED tests
+## Unlike ci_cuc_reset_test_run_keep_passed, the feature files are not scanned again. Every retry counts one more
+## attempt of the test, and a test that already ran the maximum number of attempts stays FAILED
+# Argument 1: Test Run Name -- required
+# Argument 2: Maximum attempts of a test, default CI_CUC_MAX_TEST_ATTEMPTS or 3 -- optional
+ci_cuc_retry_failed_tests () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  assert_configured "PROJECT_NAME"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" retry "$PROJECT_NAME" "$1" $2
 }
 
 ## Generate a markdown format report for the given test run. It includes reset and finish time, test numbers by status, test list by status
@@ -79,7 +106,7 @@ ci_cuc_markdown_test_report () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
   if [[ -n "$2" ]]; then STATUS_LIST="$2"; else STATUS_LIST='FAILED'; fi
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_test_report.py" "$PROJECT_NAME" "$1" "markdown" "$STATUS_LIST"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" report "$PROJECT_NAME" "$1" "markdown" "$STATUS_LIST"
 }
 
 ## Generate a human readable format report for the given test run. It includes reset and finish time, test numbers by status, test list by status
@@ -92,7 +119,21 @@ ci_cuc_plain_txt_test_report () {
   if [[ -n "$2" ]]; then STATUS_LIST="$2"; else STATUS_LIST='FAILED'; fi
 
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_test_report.py" "$PROJECT_NAME" "$1" "plain" "$STATUS_LIST"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" report "$PROJECT_NAME" "$1" "plain" "$STATUS_LIST"
+}
+
+## Write the plain text, markdown and json reports of a test run into a folder, print "true" if all tests PASSED
+## Every report and the verdict come from one query of the test run (or from the local report snapshot,
+## see CI_CUC_REPORT_CACHE_SECONDS), instead of one query per report
+# Argument 1: Test Run Name -- required
+# Argument 2: Output Folder -- required. Gets report.txt, report.md, report.json and passed.txt
+# Argument 3: Status List -- optional, comma separated, default FAILED. The tests of these statuses are listed in the reports
+ci_cuc_write_test_reports () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  if [[ -z "$2" ]]; then echo 'Expected the 2nd argument (Output Folder), Found 0' && return 1; fi
+  if [[ -n "$3" ]]; then STATUS_LIST="$3"; else STATUS_LIST='FAILED'; fi
+  assert_configured "PROJECT_NAME"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" report "$PROJECT_NAME" "$1" "all" "$STATUS_LIST" --output-dir "$2"
 }
 
 ## Generate a brief report in markdown table format for the given test run. It includes reset and finish time, test numbers by status
@@ -102,7 +143,35 @@ ci_cuc_markdown_test_summary_table () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run List), Found 0' && return 1; fi
   if [[ -n "$2" ]]; then LINK_LIST="$2"; else LINK_LIST=''; fi
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_markdown_test_summary_table.py" "$PROJECT_NAME" "$1" "$LINK_LIST"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" summary "$PROJECT_NAME" "$1" "$LINK_LIST"
+}
+
+## Profile the startup import time of every ci_cuc command, fail if one is over CI_CUC_STARTUP_BUDGET_MS (default 100)
+## or imports boto3 before it needs the storage. Run it after changing the imports of ci_cucumber_src
+ci_cuc_profile_startup () {
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" profile
+}
+
+## Count the tests of a test run by status again and rewrite its summary item
+## The counts and the pass/fail verdict are read from the summary item. Run this for a test run created before there
+## were summary items, or if the counts look wrong, e.g. after a reset while workers were still updating tests
+# Argument 1: Test Run Name -- required
+ci_cuc_repair_test_run_summary () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  assert_configured "PROJECT_NAME"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" repair "$PROJECT_NAME" "$1"
+}
+
+## Print the test runs of the project as a json list, from the run registry
+## Until the registry is backfilled (Argument 1), the test runs are found by scanning the whole table
+# Argument 1: "backfill" to register the test runs created before the run registry, once -- optional
+ci_cuc_list_test_runs () {
+  assert_configured "PROJECT_NAME"
+  if [[ "$1" == "backfill" ]]; then
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" runs "$PROJECT_NAME" --backfill
+  else
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" runs "$PROJECT_NAME"
+  fi
 }
 
 ## Print "true" if all tests have status PASSED in a given test run
@@ -111,7 +180,7 @@ ci_cuc_markdown_test_summary_table () {
 ci_cuc_test_run_passed() {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_test_run_passed.py" "$PROJECT_NAME" "$1"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" passed "$PROJECT_NAME" "$1"
 }
 
 
@@ -121,18 +190,75 @@ ci_cuc_test_run_passed() {
 ci_cuc_count_of_not_run_tests () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_test_count_by_status.py" "$PROJECT_NAME" "$1" "NOT_RUN"
+  if [[ -n "$CI_CUC_DAEMON_SOCKET" && "$CI_CUC_DAEMON_TEST_RUN" == "$1" ]]; then
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" count "NOT_RUN"
+    local rc=$?
+    if [[ $rc -ne 3 ]]; then return $rc; fi
+  fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" count "$PROJECT_NAME" "$1" "NOT_RUN"
 }
 
 ## Randomly pick one NOT_RUN test, set the status to RUNNING, print the test metadata
 ## This command is used by the multi-thread parallel test runner.
 ## It's atomic, so it make sure there always be only one thread can claim a test, avoiding the race condition.
 ## Why it only pick NOT_RUN test? If it also picks FAILED/RUNNING tests, it would cause infinite loop or race condition.
+## The only exception is a RUNNING test whose lease expired (its worker died), see ci_cuc_renew_leases
 # Argument 1: Test Run Name -- required
 ci_cuc_claim_not_run_test () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_claim_not_run_test.py" "$PROJECT_NAME" "$1"
+  if [[ -n "$CI_CUC_DAEMON_SOCKET" && "$CI_CUC_DAEMON_TEST_RUN" == "$1" ]]; then
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" claim
+    local rc=$?
+    if [[ $rc -ne 3 ]]; then return $rc; fi
+  fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" claim "$PROJECT_NAME" "$1"
+}
+
+## Claim up to N NOT_RUN tests at once, set their status to RUNNING, print the metadata of each claimed test as one json per line
+## The tests are moved to RUNNING with one transactional write, so a thread pays one round trip for N tests.
+## This command is used by the multi-thread parallel test runner when CI_CUC_CLAIM_BATCH is greater than 1
+# Argument 1: Test Run Name -- required
+# Argument 2: Batch Size -- required
+ci_cuc_claim_test_batch () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  if [[ -z "$2" ]]; then echo 'Expected the 2nd argument (Batch Size), Found 0' && return 1; fi
+  assert_configured "PROJECT_NAME"
+  if [[ -n "$CI_CUC_DAEMON_SOCKET" && "$CI_CUC_DAEMON_TEST_RUN" == "$1" ]]; then
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" claim_batch "$2"
+    local rc=$?
+    if [[ $rc -ne 3 ]]; then return $rc; fi
+  fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" claim "$PROJECT_NAME" "$1" "$2"
+}
+
+## Renew the leases of the tests claimed by this worker (CI_CUC_WORKER_ID) through the ci_cuc daemon, print how many
+## were renewed. The parallel test runner calls it as a heartbeat every CI_CUC_HEARTBEAT_SECONDS. A RUNNING test whose
+## lease is not renewed within CI_CUC_LEASE_SECONDS (default 600) is treated as abandoned and can be claimed again.
+## Only the daemon knows the tests of each worker, return 3 if it cannot be reached
+# Argument 1: Test Run Name -- required
+ci_cuc_renew_leases () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  if [[ -z "$CI_CUC_DAEMON_SOCKET" || "$CI_CUC_DAEMON_TEST_RUN" != "$1" ]]; then
+    echo "The leases are renewed through the ci_cuc daemon, it is not running for $1" >&2
+    return 3
+  fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" renew
+}
+
+## Print the seconds until the first lease held by another worker expires, print nothing if no other worker holds a test
+## A worker with nothing left to claim waits for it, so the tests of a dead worker are rerun in the same test run cycle
+# Argument 1: Test Run Name -- required
+# Argument 2: Only count the leases expiring within this many seconds -- optional, default any lease
+ci_cuc_seconds_to_lease_expiry () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  assert_configured "PROJECT_NAME"
+  if [[ -n "$CI_CUC_DAEMON_SOCKET" && "$CI_CUC_DAEMON_TEST_RUN" == "$1" ]]; then
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" lease_wait $2
+    local rc=$?
+    if [[ $rc -ne 3 ]]; then return $rc; fi
+  fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_lease.py" "$PROJECT_NAME" "$1" $2
 }
 
 ## Set the status of a given test from RUNNING to PASSED or FAILED
@@ -149,7 +275,43 @@ ci_cuc_update_test_result () {
   assert_configured "PROJECT_NAME"
   export TEST_RUN_NAME="$1"
   escaped_scenario_name=$(printf '%s' "$2" | sed 's/"/\\"/g')
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_update_test_result.py" "$PROJECT_NAME" "$TEST_RUN_NAME" "$escaped_scenario_name" "$3" "$4"
+  if [[ -n "$CI_CUC_DAEMON_SOCKET" && "$CI_CUC_DAEMON_TEST_RUN" == "$1" ]]; then
+    python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" update "$escaped_scenario_name" "$3" "$4"
+    local rc=$?
+    if [[ $rc -ne 3 ]]; then return $rc; fi
+  fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" update "$PROJECT_NAME" "$TEST_RUN_NAME" "$escaped_scenario_name" "$3" "$4"
+}
+
+## Start a local ci_cuc daemon for the given test run. It keeps one warm DynamoDB connection and serves the
+## claim/update/count calls over a Unix socket, so the test runner threads do not pay the python + boto3 startup per test.
+## ci_cuc_claim_not_run_test and ci_cuc_update_test_result use the daemon while CI_CUC_DAEMON_SOCKET is set,
+## and fall back to the one-process-per-call scripts if the daemon cannot be reached
+# Argument 1: Test Run Name -- required
+ci_cuc_start_daemon () {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  assert_configured "PROJECT_NAME"
+  local socket_path daemon_pid
+  # The same path the daemon and its clients compute for the test run
+  socket_path=$(python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" socket-path "$PROJECT_NAME" "$1")
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon.py" "$PROJECT_NAME" "$1" "$socket_path" &
+  daemon_pid=$!
+  if python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$socket_path" wait 30; then
+    export CI_CUC_DAEMON_SOCKET="$socket_path"
+    export CI_CUC_DAEMON_TEST_RUN="$1"
+  else
+    echo "ci_cuc daemon did not start, falling back to one process per call"
+    kill "$daemon_pid" 2> /dev/null
+    unset CI_CUC_DAEMON_SOCKET CI_CUC_DAEMON_TEST_RUN
+  fi
+}
+
+## Stop the daemon started by ci_cuc_start_daemon and print how long its requests took,
+## next to the estimated cost of the same requests in the one-process-per-call path
+ci_cuc_stop_daemon () {
+  if [[ -z "$CI_CUC_DAEMON_SOCKET" ]]; then return 0; fi
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_daemon_client.py" "$CI_CUC_DAEMON_SOCKET" stop
+  unset CI_CUC_DAEMON_SOCKET CI_CUC_DAEMON_TEST_RUN
 }
 
 ## Run cucumber test by provided location
@@ -159,7 +321,8 @@ ci_cuc_run_by_location() {
   assert_configured "PROJECT_ROOT" "CUCUMBER_LANGUAGE" "CUCUMBER_REQUIRES"
   cd "$PROJECT_ROOT" || return 1
   local location="$1"
-  local resultPath="$RESULT_PATH/cucumber-result-$(echo "${location##*/}" | sed 's/:/-/g; s/.feature/_feature/')"
+  # The worker id keeps the results of reruns by different threads apart, ci_cuc_merge_test_results keeps the latest
+  local resultPath="$RESULT_PATH/cucumber-result-w${CUCUMBER_WORKER_ID:-0}--$(echo "${location##*/}" | sed 's/:/-/g; s/.feature/_feature/')"
   IFS=',' read -ra requiresArray <<< "$CUCUMBER_REQUIRES"
   # New directory for persistent logs
   local DEPRECATION_LOG_DIR="$PROJECT_ROOT/deprecation_logs"
@@ -197,20 +360,75 @@ ci_cuc_test_run_in_parallel() {
   assert_configured "PROJECT_ROOT"
   failure_file="ci_cuc_test_failure_$1.txt"
   rm -f "$failure_file"
+  if [[ "$CI_CUC_USE_DAEMON" != 'false' ]]; then ci_cuc_start_daemon "$1"; fi
   export CUCUMBER_TOTAL_WORKERS=$2
+  local worker_pids=()
   for ((i = 1; i <= CUCUMBER_TOTAL_WORKERS; i++)); do
     (
       cd "$PROJECT_ROOT" || return 1
       export CUCUMBER_WORKER_ID=$i
+      # The owner of the test leases, unique across the runners of the test run
+      export CI_CUC_WORKER_ID="$(hostname)-$$-$i"
       echo "ci_cuc_test_run_in_parallel: running thread $CUCUMBER_WORKER_ID, total is $CUCUMBER_TOTAL_WORKERS"
       # If github action step install gems by restoring from cache, point to the cached path
       cached_gem_path="vendor/bundle"
       if [ -d "$cached_gem_path" ]; then bundle config set --local path "$cached_gem_path"; fi
       set +e
+      # With CI_CUC_CLAIM_BATCH > 1 the thread claims its tests in batches into a local queue,
+      # and claims the next batch in the background while the last test of the current batch runs
+      claim_batch=${CI_CUC_CLAIM_BATCH:-1}
+      queue_file=$(mktemp)
+      prefetch_file=$(mktemp)
+      prefetch_pid=''
+      # Heartbeat: keep renewing the leases of the claimed tests while this thread is alive, through the daemon only.
+      # Without the daemon there is no heartbeat, so the tests are claimed without a lease
+      lease_seconds=${CI_CUC_LEASE_SECONDS:-600}
+      heartbeat_seconds=${CI_CUC_HEARTBEAT_SECONDS:-60}
+      heartbeat_pid=''
+      if [[ -z "$CI_CUC_DAEMON_SOCKET" ]]; then
+        lease_seconds=0
+        export CI_CUC_LEASE_SECONDS=0
+      fi
+      if [[ "$lease_seconds" -gt 0 ]]; then
+        ( while sleep "$heartbeat_seconds"; do
+            ci_cuc_renew_leases "$1" > /dev/null 2>&1
+            if [[ $? -eq 3 ]]; then break; fi
+          done ) &
+        heartbeat_pid=$!
+      fi
+      # A lease that missed two heartbeats belongs to a dead worker, the live workers keep theirs far from expiry
+      stale_within=$((lease_seconds - 2 * heartbeat_seconds))
+      if [[ "$stale_within" -lt "$heartbeat_seconds" ]]; then stale_within=$heartbeat_seconds; fi
       while true; do
-        test_json=$(ci_cuc_claim_not_run_test "$1")
+        if [[ "$claim_batch" -gt 1 ]]; then
+          if [ ! -s "$queue_file" ]; then
+            if [[ -n "$prefetch_pid" ]]; then
+              wait "$prefetch_pid"
+              prefetch_pid=''
+              cp "$prefetch_file" "$queue_file"
+            else
+              ci_cuc_claim_test_batch "$1" "$claim_batch" > "$queue_file"
+            fi
+          fi
+          test_json=$(head -n 1 "$queue_file")
+          tail -n +2 "$queue_file" > "$queue_file.rest" && mv "$queue_file.rest" "$queue_file"
+          if [[ -n "$test_json" && ! -s "$queue_file" ]]; then
+            ci_cuc_claim_test_batch "$1" "$claim_batch" > "$prefetch_file" &
+            prefetch_pid=$!
+          fi
+        else
+          test_json=$(ci_cuc_claim_not_run_test "$1")
+        fi
         this_test_result="PASSED"
         if [ -z "$test_json" ]; then
+          # The tests of a dead worker are reclaimed once their lease expires, wait for it if one is near expiry.
+          # Otherwise every other test is held by a live worker, nothing is left for this thread
+          lease_wait=''
+          if [[ "$lease_seconds" -gt 0 ]]; then lease_wait=$(ci_cuc_seconds_to_lease_expiry "$1" "$stale_within"); fi
+          if [[ -n "$lease_wait" ]]; then
+            sleep $((lease_wait < heartbeat_seconds ? lease_wait + 1 : heartbeat_seconds))
+            continue
+          fi
           echo "No more test with NOT_RUN status, quiting the test runner #$CUCUMBER_WORKER_ID"
           break
         else
@@ -218,7 +436,11 @@ ci_cuc_test_run_in_parallel() {
           scenario_name=$(echo "$test_json" | jq -r '.scenario_name')
           example_row=$(echo "$test_json" | jq -r '.example_row')
           test_name_example_row=$(echo "$test_json" | jq -r '.test_name_example_row')
-          echo "Test runner #$CUCUMBER_WORKER_ID claimed test: <$test_name_example_row>"
+          if [[ $(echo "$test_json" | jq -r '.test_status') == 'RUNNING' ]]; then
+            echo "Test runner #$CUCUMBER_WORKER_ID reclaimed test with an expired lease: <$test_name_example_row>"
+          else
+            echo "Test runner #$CUCUMBER_WORKER_ID claimed test: <$test_name_example_row>"
+          fi
         fi
         ci_cuc_run_by_location "$test_location"
         if [[ $? -ne 0 ]]; then
@@ -227,9 +449,14 @@ ci_cuc_test_run_in_parallel() {
         fi
         ci_cuc_update_test_result "$1" "$scenario_name" "$example_row" "$this_test_result"
       done
+      if [[ -n "$heartbeat_pid" ]]; then kill "$heartbeat_pid" 2> /dev/null; fi
+      rm -f "$queue_file" "$prefetch_file"
     ) &
+    worker_pids+=($!)
   done
-  wait
+  # Only wait for the test runner threads, the daemon keeps running until it is stopped
+  wait "${worker_pids[@]}"
+  ci_cuc_stop_daemon
   echo "Tests are finished, checking if there is any thread that has failure"
   if [[ -f "$failure_file" ]]; then
     echo "There were failures in one or more threads." >&2
@@ -249,12 +476,22 @@ ci_cuc_test_summary_for_tickets () {
   if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run List), Found 0' && return 1; fi
   if [[ -z "$2" ]]; then echo 'Expected the 2nd argument (Ticket List), Found 0' && return 1; fi
   assert_configured "PROJECT_NAME"
-  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_test_summary_for_tickets.py" "$PROJECT_NAME" "$1" "$2" "$3" "$4"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc.py" tickets "$PROJECT_NAME" "$1" "$2" "$3" "$4"
+}
+
+## Merge the cucumber-result-* JUnit files in RESULT_PATH into one JUnit file and a timing table, keeping only the
+## latest attempt of every scenario location, and record the scenario durations in the test run
+# Argument 1: Test Run Name -- required
+# Argument 2: Output Folder -- optional, default "${RESULT_PATH}_merged". Gets junit.xml and timing.csv
+ci_cuc_merge_test_results() {
+  if [[ -z "$1" ]]; then echo 'Expected the 1st argument (Test Run Name), Found 0' && return 1; fi
+  assert_configured "PROJECT_NAME" "RESULT_PATH"
+  python3 "$CI_CUC_FOLDER/ci_cucumber_src/ci_cuc_merge_junit.py" "$PROJECT_NAME" "$1" "$RESULT_PATH" "${2:-${RESULT_PATH}_merged}"
 }
 
 # This function sets up the results folder under the PROJECT_ROOT
 ci_cuc_setup_results_directory() {
-  rm -rf "$RESULT_PATH"
+  rm -rf "$RESULT_PATH" "${RESULT_PATH}_merged"
   mkdir -p "$RESULT_PATH"
   echo "Created cucumber result folder: $RESULT_PATH"
 }
\ No newline at end of file
@@ -0,0 +1,125 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import defusedxml.ElementTree as element_tree  # noqa: E402
+from ci_cuc_cleanup_behave_xml import CLEANED_MARKER, clean_up_behave_xml, clean_up_folder  # noqa: E402
+
+# Times the Behave report cleanup on large synthetic JUnit reports:
+#   full_tree: the previous implementation, the whole report parsed into one ElementTree
+#   streaming: ci_cuc_cleanup_behave_xml, one test case at a time, serial and across a process pool
+#   rerun:     the same folder cleaned again, every report is recognized by its marker and skipped
+# Peak python memory of one report is measured with tracemalloc.
+
+
+def write_report(path: Path, test_cases: int, skipped_ratio: float, output_lines: int, rng: random.Random):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+        f.write(f'<testsuite name="synthetic.{path.stem}" tests="{test_cases}" errors="0" failures="0" '
+                f'skipped="0" time="1.0">\n')
+        for i in range(test_cases):
+            skipped = rng.random() < skipped_ratio
+            f.write(f'  <testcase classname="synthetic.{path.stem}" name="Scenario {i} -- @1.{i % 20} Examples" '
+                    f'status="{"skipped" if skipped else "passed"}" time="0.5">\n')
+            if skipped:
+                f.write('    <skipped />\n')
+            f.write('    <system-out>\n      <![CDATA[\n')
+            f.write(''.join(f"      Given step {n} of scenario {i} &lt;row&gt; ... passed in 0.001s\n"
+                            for n in range(output_lines)))
+            f.write('      ]]>\n    </system-out>\n  </testcase>\n')
+        f.write('</testsuite>\n')
+
+
+def full_tree_clean(xml_path):
+    tree = element_tree.parse(xml_path)
+    root = tree.getroot()
+    for testcase in list(root):
+        if testcase.find('skipped') is not None:
+            root.remove(testcase)
+    tree.write(xml_path, encoding='utf-8', xml_declaration=True)
+
+
+def same_as_full_tree(full_tree_path, streaming_path) -> bool:
+    # The streaming output, without its cleaned marker, is the full tree output byte for byte
+    full_tree = Path(full_tree_path).read_text(encoding='utf-8')
+    streaming = Path(streaming_path).read_text(encoding='utf-8').replace(f"{CLEANED_MARKER}\n", '', 1)
+    return full_tree == streaming
+
+
+def peak_memory_mb(func, path) -> float:
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(path, path) if func is clean_up_behave_xml else func(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench(files: int, test_cases: int, output_lines: int, workers: int) -> dict:
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / 'source'
+        source.mkdir()
+        for i in range(files):
+            write_report(source / f"TESTS-synthetic_{i:04d}.xml", test_cases, 0.3, output_lines, rng)
+        size_mb = sum(p.stat().st_size for p in source.iterdir()) / 1024 / 1024
+
+        def fresh_copy(name):
+            target = Path(tmp) / name
+            shutil.copytree(source, target)
+            return target
+
+        full_tree_folder = fresh_copy('full_tree')
+        full_tree_seconds, _ = timed(lambda: [full_tree_clean(str(p)) for p in full_tree_folder.rglob('*.xml')])
+        serial_seconds, _ = timed(clean_up_folder, fresh_copy('serial'), 1)
+        parallel_folder = fresh_copy('parallel')
+        parallel_seconds, stats = timed(clean_up_folder, parallel_folder, workers)
+        rerun_seconds, _ = timed(clean_up_folder, parallel_folder, workers)
+
+        one_report = next(source.iterdir())
+        full_tree_copy, streaming_copy = Path(tmp) / 'one_full.xml', Path(tmp) / 'one_streaming.xml'
+        shutil.copy(one_report, full_tree_copy)
+        shutil.copy(one_report, streaming_copy)
+        return {
+            'files': files,
+            'test_cases_per_file': test_cases,
+            'total_mb': size_mb,
+            'removed_test_cases': stats['removed_test_cases'],
+            'full_tree_seconds': full_tree_seconds,
+            'streaming_serial_seconds': serial_seconds,
+            'streaming_parallel_seconds': parallel_seconds,
+            'parallel_workers': workers,
+            'rerun_already_cleaned_seconds': rerun_seconds,
+            'one_report_mb': one_report.stat().st_size / 1024 / 1024,
+            'one_report_full_tree_peak_mb': peak_memory_mb(full_tree_clean, str(full_tree_copy)),
+            'one_report_streaming_peak_mb': peak_memory_mb(clean_up_behave_xml, str(streaming_copy)),
+            'one_report_same_as_full_tree': same_as_full_tree(full_tree_copy, streaming_copy)
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='?', type=int, default=32)
+    parser.add_argument('test_cases', nargs='?', type=int, default=2000)
+    parser.add_argument('output_lines', nargs='?', type=int, default=10)
+    parser.add_argument('workers', nargs='?', type=int, default=4)
+    args = parser.parse_args()
+
+    print(json.dumps(bench(args.files, args.test_cases, args.output_lines, args.workers), indent=2))
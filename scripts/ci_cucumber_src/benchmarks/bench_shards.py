@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cucumber_tracker import CucumberTestTracker, TABLE_NAME, TRACKER_INDEXES, PASSED, RUNNING  # noqa: E402
+from local_dynamodb import LocalDynamoDB  # noqa: E402
+
+# Claim contention of a growing runner matrix, every runner with the same number of workers:
+#   shared:  every worker claims from the whole test run
+#   sharded: the reset spreads the tests over one shard per runner by duration estimate, every worker queries only
+#            the shard of its runner and steals from the busiest shard once its own is empty
+# Every test must be claimed exactly once and end up PASSED. items_read_per_claim is what the claim queries read,
+# shard_balance is the most expected work of a worker over the least.
+PROJECT = 'ci_cuc_benchmark'
+
+
+def synthetic_tests(tests: int) -> list[dict]:
+    return [
+        {'scenario_name': f"Scenario {i}", 'example_row': 'N/A', 'scenario_outline': False,
+         'test_location': f"features/area_{i % 20}.feature:{i}", 'tags': ['regression_api']}
+        for i in range(tests)
+    ]
+
+
+def claim_worker(db, test_run, shard, batch_size, claimed: Counter, lock: threading.Lock):
+    ctt = CucumberTestTracker(PROJECT, test_run, db=db, shard=shard)
+    while True:
+        tests = ctt.claim_batch(batch_size)
+        if len(tests) == 0:
+            return
+        with lock:
+            claimed.update(test['test_name_example_row'] for test in tests)
+        for test in tests:
+            ctt.update_test_status(test['scenario_name'], test['example_row'], PASSED, RUNNING, print_log=False)
+
+
+def bench(db: LocalDynamoDB, scenarios: list[dict], durations: dict, runners: int, workers: int, batch_size: int,
+          sharded: bool) -> dict:
+    test_run = f"shards_{runners}_{workers}_{sharded}"
+    ctt = CucumberTestTracker(PROJECT, test_run, db=db)
+    shards = ','.join([str(workers)] * runners) if sharded else None
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        ctt.sync_tests_in_test_run(scenarios)
+        ctt.record_scenario_durations(durations)
+        ctt.sync_tests_in_test_run(scenarios, shards=shards)
+    records = ctt._query_test_cases(force_query=True)
+    loads = Counter()
+    for record in records:
+        loads[record.get('shard_id')] += float(record['duration_estimate'])
+    claimed = Counter()
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=claim_worker,
+                         args=(db, test_run, runner if sharded else None, batch_size, claimed, lock))
+        for runner in range(runners) for _ in range(workers)
+    ]
+    db.reset_stats()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    stats = db.stats()
+    total_claims = sum(claimed.values())
+    attempts = total_claims + stats['condition_failures']
+    tracker = CucumberTestTracker(PROJECT, test_run, db=db)
+    summary = tracker.run_summary()
+    return {
+        'runners': runners,
+        'workers_per_runner': workers,
+        'sharded': sharded,
+        'tests': len(scenarios),
+        'claimed': len(claimed),
+        'duplicate_claims': total_claims - len(claimed),
+        'seconds': seconds,
+        'collisions': stats['condition_failures'],
+        'collision_rate': stats['condition_failures'] / attempts if attempts else 0,
+        'transaction_conflicts': stats['transaction_conflicts'],
+        'items_read_per_claim': stats['items_read'] / total_claims if total_claims else 0,
+        # Every claimed test must end up PASSED, and the summary item agree, None when it is marked for repair
+        'passed': tracker.db.count_items(tracker.prime_key_value, {'test_status': [PASSED]}),
+        'summary_passed': summary['counts'][PASSED] if summary is not None else None,
+        'shard_balance': max(loads.values()) / min(loads.values()) if sharded else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('tests', nargs='?', type=int, default=2000)
+    parser.add_argument('workers_per_runner', nargs='?', type=int, default=4)
+    parser.add_argument('max_runners', nargs='?', type=int, default=8)
+    parser.add_argument('batch_size', nargs='?', type=int, default=5)
+    parser.add_argument('latency_ms', nargs='?', type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    tests = synthetic_tests(args.tests)
+    # Long tailed durations, a few tests run much longer than most
+    test_durations = {f"{t['scenario_name']}:{t['example_row']}": rng.lognormvariate(3, 1) for t in tests}
+    local_db = LocalDynamoDB(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES,
+                             latency_ms=args.latency_ms)
+    results = []
+    runner_count = 1
+    while runner_count <= args.max_runners:
+        for shard_mode in [False, True]:
+            results.append(bench(local_db, tests, test_durations, runner_count, args.workers_per_runner,
+                                 args.batch_size, shard_mode))
+        runner_count *= 2
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,105 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cucumber_tracker import CucumberTestTracker, STATUS_INDEX_NAME, NOT_RUN, PASSED, current_timestamp  # noqa: E402
+from cucumber_tracker import TABLE_NAME, TRACKER_INDEXES  # noqa: E402
+from local_dynamodb import LocalDynamoDB  # noqa: E402
+
+# Measures the cost of "give me the NOT_RUN tests" in a nearly finished test run:
+#   full_partition: query the whole test run and filter by status in python (the path without the status index)
+#   status_index:   query only the NOT_RUN records through the status index
+# By default it runs against the real table, which needs AWS credentials and the status index (see
+# ci_cuc_create_status_index), and reports the consumed read units. It creates throwaway test runs under the project
+# ci_cuc_benchmark and deletes them afterward.
+# With --local it runs against the in memory stand-in of the table instead, and reports the items read and the
+# requests made, --latency-ms models the round trip of every request.
+PROJECT = 'ci_cuc_benchmark'
+
+
+def synthetic_tests(size):
+    return [
+        {
+            'scenario_name': f"benchmark scenario {i:06d} with a long enough name to look like a real one",
+            'example_row': 'N/A',
+            'scenario_outline': False,
+            'test_location': f"features/feature_files/benchmark/benchmark_{i // 50:04d}.feature:{(i % 50) * 10 + 3}",
+            'tags': ['benchmark', 'regression_api', f"JIRA-{i % 300}"]
+        }
+        for i in range(size)
+    ]
+
+
+def measure(ctt, key_condition, index_name=None, repeat=3):
+    latencies = []
+    capacity = 0.0
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        capacity = 0.0
+        items = 0
+        for page in ctt.db.iter_query_pages(key_condition, index_name, ReturnConsumedCapacity='TOTAL'):
+            capacity += page.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+            items += sum(1 for item in page.get('Items', []) if item.get('test_status') == NOT_RUN)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {'not_run_items': items, 'read_units': capacity, 'latency_ms': min(latencies)}
+
+
+def measure_local(ctt, filters=None, repeat=3):
+    # The stand-in has no consumed capacity, count the items the query reads and its requests instead
+    latencies = []
+    stats = {}
+    items = []
+    for _ in range(repeat):
+        ctt.db.reset_stats()
+        start = time.perf_counter()
+        items = list(ctt.db.query_items(ctt.prime_key_value, filters))
+        not_run = [item for item in items if item.get('test_status') == NOT_RUN]
+        latencies.append((time.perf_counter() - start) * 1000)
+        stats = ctt.db.stats()
+    return {'not_run_items': len(not_run), 'items_read': len(items), 'requests': stats['requests'].get('query', 0),
+            'latency_ms': min(latencies)}
+
+
+def bench_partition(size, remaining, db=None):
+    ctt = CucumberTestTracker(PROJECT, f"status_index_{size}", db=db)
+    records = list(ctt._tests_to_db_records(synthetic_tests(size), PASSED, current_timestamp()).values())
+    for record in records[:remaining]:
+        record['test_status'] = NOT_RUN
+    ctt.db.batch_put(records)
+    try:
+        if isinstance(ctt.db, LocalDynamoDB):
+            return {
+                'partition_size': size,
+                'not_run': remaining,
+                'full_partition': measure_local(ctt),
+                'status_index': measure_local(ctt, {'test_status': [NOT_RUN]})
+            }
+        from boto3.dynamodb.conditions import Key
+        partition = Key('project_test_run').eq(ctt.prime_key_value)
+        return {
+            'partition_size': size,
+            'not_run': remaining,
+            'full_partition': measure(ctt, partition),
+            'status_index': measure(ctt, partition & Key('test_status').eq(NOT_RUN), STATUS_INDEX_NAME)
+        }
+    finally:
+        ctt.delete_test_run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sizes', nargs='?', type=str, default='100,1000,5000')
+    parser.add_argument('remaining', nargs='?', type=int, default=10)
+    parser.add_argument('--local', action='store_true', help='use the in memory stand-in of the table, no AWS needed')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='simulated round trip of every request, --local')
+    args = parser.parse_args()
+
+    local_db = (LocalDynamoDB(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES, args.latency_ms)
+                if args.local else None)
+    results = [bench_partition(int(size), args.remaining, local_db) for size in args.sizes.split(',')]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,72 @@
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tag_expression import TagExpression  # noqa: E402
+
+# Times the tag filter of FeatureScanner over many scenarios with long include and exclude tag lists:
+#   any:      the previous filter, any(tag in scenario tags) over the include tags and the exclude tags
+#   compiled: TagExpression.from_tags, parsed once, its result remembered for every distinct tag set
+# Both must select the same scenarios.
+
+
+def synthetic_scenarios(scenarios: int, tags: int, rows_per_outline: int, rng: random.Random) -> list[dict]:
+    result = []
+    while len(result) < scenarios:
+        scenario_tags = ['regression_api'] + [f"tag_{tag}" for tag in rng.sample(range(tags), rng.randint(1, 4))]
+        # The rows of an outline share the tags of the outline
+        for row in range(rng.choice([1, rows_per_outline])):
+            result.append({'scenario_name': f"Scenario {len(result)}", 'example_row': str(row + 1),
+                           'tags': scenario_tags})
+    return result[:scenarios]
+
+
+def any_filter(scenarios: list[dict], include_tags: list[str], exclude_tags: list[str]) -> list[dict]:
+    return [
+        scenario for scenario in scenarios
+        if any(tag in scenario['tags'] for tag in include_tags)
+        and not any(tag in scenario['tags'] for tag in exclude_tags)
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench(scenarios: int, tags: int, include: int, exclude: int, rows_per_outline: int) -> dict:
+    rng = random.Random(0)
+    items = synthetic_scenarios(scenarios, tags, rows_per_outline, rng)
+    include_tags = [f"tag_{tag}" for tag in rng.sample(range(tags), include)]
+    exclude_tags = [f"tag_{tag}" for tag in rng.sample(range(tags), exclude)]
+    any_seconds, any_result = timed(any_filter, items, include_tags, exclude_tags)
+    compiled_seconds, compiled_result = timed(
+        lambda: TagExpression.from_tags(include_tags, exclude_tags).select(items))
+    return {
+        'scenarios': len(items),
+        'include_tags': include,
+        'exclude_tags': exclude,
+        'selected': len(compiled_result),
+        'any_seconds': any_seconds,
+        'compiled_seconds': compiled_seconds,
+        'speedup': any_seconds / compiled_seconds if compiled_seconds > 0 else None,
+        'same_result': [id(s) for s in any_result] == [id(s) for s in compiled_result]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scenarios', nargs='?', type=int, default=100000)
+    parser.add_argument('tags', nargs='?', type=int, default=500)
+    parser.add_argument('include', nargs='?', type=int, default=100)
+    parser.add_argument('exclude', nargs='?', type=int, default=50)
+    parser.add_argument('rows_per_outline', nargs='?', type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(bench(args.scenarios, args.tags, args.include, args.exclude, args.rows_per_outline), indent=2))
@@ -0,0 +1,110 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cucumber_tracker import CucumberTestTracker, TABLE_NAME, TRACKER_INDEXES, test_sort_key  # noqa: E402
+from test_run_reports import MultiRunReport, TICKET_TAG_PREFIX  # noqa: E402
+from local_dynamodb import LocalDynamoDB  # noqa: E402
+
+# Times the ticket table over several test runs with many tests and tickets:
+#   scan:  the previous implementation, every ticket checks every test, and a linear search counts the examples
+#   index: MultiRunReport.ticket_tests, through the tag index of every test run
+# Both read the same loaded records, so only the matching is timed. The results must be identical.
+PROJECT = 'ci_cuc_benchmark'
+
+
+def synthetic_tests(tests: int, tickets: int, rows_per_outline: int, rng: random.Random) -> list[dict]:
+    scenarios = []
+    scenario = 0
+    while len(scenarios) < tests:
+        rows = rng.choice([1, rows_per_outline])
+        tags = ['regression_api', f"area_{scenario % 20}"]
+        tags += [f"{TICKET_TAG_PREFIX}{ticket}" for ticket in rng.sample(range(tickets), rng.randint(0, 3))]
+        for row in range(rows):
+            scenarios.append({
+                'scenario_name': f"Scenario {scenario}",
+                'scenario_outline': rows > 1,
+                'example_row': 'N/A' if rows == 1 else str(row + 1),
+                'test_location': f"features/area_{scenario % 20}.feature:{scenario * 30 + row}",
+                'tags': tags
+            })
+        scenario += 1
+    return scenarios[:tests]
+
+
+def scan_ticket_tests(report: MultiRunReport, tickets) -> dict[str, list[str]]:
+    ticket_list = [f"{TICKET_TAG_PREFIX}{ticket}" for ticket in tickets]
+    content = {}
+    for test_run, tracker in report.trackers.items():
+        results = tracker.db_records
+        tests = sorted([r for r in results if any(tag in r.get('scenario_tags', []) for tag in ticket_list)],
+                       key=test_sort_key)
+        for ticket in ticket_list:
+            test_list = []
+            for actual_test in tests:
+                if ticket in actual_test['scenario_tags']:
+                    this_test = [t for t in test_list if t['scenario_name'] == actual_test['scenario_name']]
+                    if len(this_test) == 0:
+                        test_list.append({'scenario_name': actual_test['scenario_name'], 'count': 1})
+                    else:
+                        this_test[0]['count'] += 1
+            test_str_list = [
+                f"{test_run}: {t['scenario_name']} ({t['count']} exmaples)"
+                if t['count'] > 1
+                else f"{test_run}: {t['scenario_name']}"
+                for t in test_list
+            ]
+            if len(test_str_list) > 0:
+                ticket_key = ticket.replace(TICKET_TAG_PREFIX, '')
+                content[ticket_key] = content.get(ticket_key, []) + test_str_list
+    return content
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench(tests: int, tickets: int, runs: int, rows_per_outline: int) -> dict:
+    rng = random.Random(0)
+    db = LocalDynamoDB(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES)
+    test_runs = [f"tag_index_{i}" for i in range(runs)]
+    scenarios = synthetic_tests(tests, tickets, rows_per_outline, rng)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for test_run in test_runs:
+            CucumberTestTracker(PROJECT, test_run, db=db).sync_tests_in_test_run(scenarios)
+    report = MultiRunReport(PROJECT, test_runs, db=db).load()
+    ticket_ids = [str(ticket) for ticket in range(tickets)]
+    scan_seconds, scan_result = timed(scan_ticket_tests, report, ticket_ids)
+    index_seconds, index_result = timed(report.ticket_tests, ticket_ids)
+    # The second lookup reuses the tag index built by the first one
+    repeat_seconds, _ = timed(report.ticket_tests, ticket_ids)
+    return {
+        'tests_per_run': len(scenarios),
+        'runs': runs,
+        'tickets': tickets,
+        'scan_seconds': scan_seconds,
+        'index_seconds': index_seconds,
+        'index_repeat_seconds': repeat_seconds,
+        'speedup': scan_seconds / index_seconds if index_seconds > 0 else None,
+        'same_result': scan_result == index_result
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('tests', nargs='?', type=int, default=5000)
+    parser.add_argument('tickets', nargs='?', type=int, default=300)
+    parser.add_argument('runs', nargs='?', type=int, default=4)
+    parser.add_argument('rows_per_outline', nargs='?', type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(bench(args.tests, args.tickets, args.runs, args.rows_per_outline), indent=2))
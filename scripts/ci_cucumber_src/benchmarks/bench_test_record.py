@@ -0,0 +1,102 @@
+import argparse
+import copy
+import json
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cucumber_tracker import test_sort_key  # noqa: E402
+from test_record import TestRecord  # noqa: E402
+
+# Memory and sort cost of the test records of one big test run:
+#   dict:        the records as the storage returns them, sorted with the previous zero padded f-string key
+#   test_record: the same records as TestRecord objects, sorted by their precomputed sort key
+# The reports sort the records several times (all_tests, tests_by_status, tests_by_tags), sorts is how many times.
+
+
+def synthetic_items(records: int, rows_per_outline: int) -> list[dict]:
+    items = []
+    scenario = 0
+    while len(items) < records:
+        rows = 1 if scenario % 3 else rows_per_outline
+        for row in range(rows):
+            example_row = 'N/A' if rows == 1 else str(row + 1)
+            name = f"Scenario {scenario:05d} of the synthetic feature"
+            items.append({
+                'project_test_run': 'ci_cuc_benchmark/records', 'project': 'ci_cuc_benchmark',
+                'test_run_name': 'records', 'test_name_example_row': f"{name}:{example_row}",
+                'scenario_name': name, 'example_row': example_row, 'scenario_outline': rows > 1,
+                'test_location': f"features/area_{scenario % 20}/synthetic_{scenario:05d}.feature:{12 + row}",
+                'test_status': 'PASSED', 'test_run_reset_time': '2025-01-01T08:00:00',
+                'last_update_time': '2025-01-01T08:30:00', 'scenario_tags': ['regression_api', f"area_{scenario % 20}"],
+                'test_start_time': '2025-01-01T08:29:40', 'last_duration': Decimal('20.0'),
+                'duration_estimate': Decimal('18.5')
+            })
+        scenario += 1
+    return items[:records]
+
+
+def padded_sort_key(record: dict) -> str:
+    return f"{record['scenario_name']}:{str(record['example_row']):0>2}"
+
+
+def traced_mb(build) -> tuple[float, object]:
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / 1024 / 1024, result
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def misordered_rows(records: list, key) -> int:
+    # Example rows of one scenario that come before a lower row number
+    ordered = sorted(records, key=key)
+    return sum(
+        1 for previous, record in zip(ordered, ordered[1:])
+        if previous['scenario_name'] == record['scenario_name'] and previous['example_row'].isdigit()
+        and record['example_row'].isdigit() and int(previous['example_row']) > int(record['example_row'])
+    )
+
+
+def bench(records: int, rows_per_outline: int, sorts: int) -> dict:
+    items = synthetic_items(records, rows_per_outline)
+    dict_mb, dicts = traced_mb(lambda: copy.deepcopy(items))
+    # Both from their own copy of the items, the copied dicts are freed once the records are built
+    record_mb, test_records = traced_mb(lambda: [TestRecord(item) for item in copy.deepcopy(items)])
+    convert_seconds, _ = timed(lambda: [TestRecord(item) for item in items])
+    to_item_seconds, _ = timed(lambda: [record.to_item() for record in test_records])
+    dict_sort_seconds, _ = timed(lambda: [sorted(dicts, key=padded_sort_key) for _ in range(sorts)])
+    record_sort_seconds, _ = timed(lambda: [sorted(test_records, key=test_sort_key) for _ in range(sorts)])
+    return {
+        'records': len(items),
+        'rows_per_outline': rows_per_outline,
+        'dict_mb': dict_mb,
+        'test_record_mb': record_mb,
+        'from_item_seconds': convert_seconds,
+        'to_item_seconds': to_item_seconds,
+        'sorts': sorts,
+        'dict_sort_seconds': dict_sort_seconds,
+        'test_record_sort_seconds': record_sort_seconds,
+        'dict_misordered_rows': misordered_rows(dicts, padded_sort_key),
+        'test_record_misordered_rows': misordered_rows(test_records, test_sort_key)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('records', nargs='?', type=int, default=50000)
+    parser.add_argument('rows_per_outline', nargs='?', type=int, default=120)
+    parser.add_argument('sorts', nargs='?', type=int, default=3)
+    args = parser.parse_args()
+
+    print(json.dumps(bench(args.records, args.rows_per_outline, args.sorts), indent=2))
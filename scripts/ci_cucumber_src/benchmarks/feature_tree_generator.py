@@ -0,0 +1,64 @@
+import argparse
+import json
+import random
+from pathlib import Path
+
+# Writes a synthetic tree of cucumber feature files for the benchmarks:
+# plain scenarios and scenario outlines with many example rows, feature and scenario tags, JIRA ticket tags
+
+STEPS = [
+    'Given the user is authorized with "{tier}" tier "{role}" API credentials',
+    'When the user requests the "{endpoint}" endpoint',
+    'Then the response status should be {status}',
+    'And the response should contain the field "{field}"',
+]
+
+
+def scenario_steps(rng: random.Random, outline: bool) -> list[str]:
+    values = {'tier': rng.choice(['INT', 'UAT']), 'role': rng.choice(['ADMIN', 'VIEWER']),
+              'endpoint': '<endpoint>' if outline else rng.choice(['list', 'detail', 'search']),
+              'status': '<status>' if outline else rng.choice([200, 201, 404]), 'field': f"field_{rng.randint(0, 50)}"}
+    return [f"    {step.format(**values)}" for step in STEPS]
+
+
+def generate_feature_tree(root: str, features: int = 200, scenarios_per_feature: int = 10, outline_ratio: float = 0.3,
+                          rows_per_outline: int = 20, tags: int = 40, tickets: int = 300, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    root_path = Path(root)
+    counts = {'feature_files': 0, 'scenarios': 0, 'scenario_outlines': 0, 'tests': 0}
+    for f in range(features):
+        folder = root_path / f"area_{f % 20:02d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        lines = [f"@area_{f % 20:02d} @regression_api", f"Feature: Synthetic feature {f:05d}", ""]
+        for s in range(scenarios_per_feature):
+            scenario_tags = {f"@tag_{rng.randrange(tags):03d}" for _ in range(3)}
+            scenario_tags.add(f"@JIRA-{rng.randrange(tickets)}")
+            lines.append(f"  {' '.join(sorted(scenario_tags))}")
+            if rng.random() < outline_ratio:
+                lines.append(f"  Scenario Outline: Synthetic outline {f:05d}-{s:03d} checks <endpoint>")
+                lines.extend(scenario_steps(rng, True))
+                lines.extend(["", "    Examples:", "      | endpoint | status |"])
+                lines.extend(f"      | endpoint_{r:03d} | 200 |" for r in range(rows_per_outline))
+                counts['scenario_outlines'] += 1
+                counts['tests'] += rows_per_outline
+            else:
+                lines.append(f"  Scenario: Synthetic scenario {f:05d}-{s:03d}")
+                lines.extend(scenario_steps(rng, False))
+                counts['scenarios'] += 1
+                counts['tests'] += 1
+            lines.append("")
+        (folder / f"synthetic_{f:05d}.feature").write_text('\n'.join(lines), encoding='utf-8')
+        counts['feature_files'] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('root', type=str)
+    parser.add_argument('features', nargs='?', type=int, default=200)
+    parser.add_argument('scenarios_per_feature', nargs='?', type=int, default=10)
+    parser.add_argument('rows_per_outline', nargs='?', type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(generate_feature_tree(args.root, args.features, args.scenarios_per_feature,
+                                           rows_per_outline=args.rows_per_outline), indent=2))
@@ -0,0 +1,171 @@
+import copy
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage_backend import StorageBackend, ConditionFailed, TransactionConflict, added_values  # noqa: E402
+
+# An in memory stand-in of the DynamoDB table for the benchmarks, no AWS account needed.
+# Conditional updates and transactions are atomic like they are in DynamoDB, so concurrent workers collide
+# the same way, and every request sleeps latency_ms to model the network round trip of the real table.
+# A transaction holds its items for its round trip, and like DynamoDB, another transaction or a single update of
+# one of those items meanwhile fails with TransactionConflict. So workers racing for the same items show up as
+# transaction_conflicts in the stats.
+QUERY_PAGE_ITEMS = 1000
+BATCH_WRITE_SIZE = 25
+
+
+class LocalDynamoDB(StorageBackend):
+    def __init__(self, table_name, prime_key_name, sorting_key_name, indexes=None, latency_ms: float = 0.0):
+        super().__init__(table_name, prime_key_name, sorting_key_name, indexes)
+        self.latency_ms = latency_ms
+        self._partitions: dict[str, dict[str, dict]] = {}
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.condition_failures = 0
+        self.transaction_conflicts = 0
+        # Items read by the queries, what the read capacity of the real table is charged for
+        self.items_read = 0
+        # The (prime key, sorting key) of the items in the transactions in flight
+        self._in_flight: set[tuple] = set()
+
+    def _round_trip(self, operation, count=1):
+        with self._lock:
+            self.requests[operation] += count
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms * count / 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': dict(self.requests), 'condition_failures': self.condition_failures,
+                    'transaction_conflicts': self.transaction_conflicts, 'items_read': self.items_read}
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.condition_failures = 0
+            self.transaction_conflicts = 0
+            self.items_read = 0
+
+    def _conflict(self, keys) -> bool:
+        # Call with the lock held
+        if self._in_flight.isdisjoint(keys):
+            return False
+        self.transaction_conflicts += 1
+        return True
+
+    def query_items(self, prime_key_value, filters=None, attributes=None, below=None):
+        items = self._matching_items(prime_key_value, filters)
+        # Like a filter expression, the items above the bounds are read but not returned
+        items = [item for item in items if all(item.get(attribute) is not None and item[attribute] < bound
+                                               for attribute, bound in (below or {}).items())]
+        self._round_trip('query', max(1, math.ceil(len(items) / QUERY_PAGE_ITEMS)))
+        for item in items:
+            # Stored items are never changed in place (an update replaces the item), so a shallow copy is enough
+            yield {a: item[a] for a in attributes if a in item} if attributes else dict(item)
+
+    def count_items(self, prime_key_value, filters=None):
+        # Select=COUNT reads the same pages as the query, only the items are not returned
+        items = self._matching_items(prime_key_value, filters)
+        self._round_trip('query', max(1, math.ceil(len(items) / QUERY_PAGE_ITEMS)))
+        return len(items)
+
+    def _matching_items(self, prime_key_value, filters):
+        # Like a query through an index, only the matching items are read
+        filters = {attribute: set(values) for attribute, values in (filters or {}).items()}
+        with self._lock:
+            partition = self._partitions.get(prime_key_value, {})
+            items = [
+                item for item in (partition[key] for key in sorted(partition))
+                if all(item.get(attribute) in values for attribute, values in filters.items())
+            ]
+            self.items_read += len(items)
+            return items
+
+    def get_item(self, primary_value, sorting_value):
+        self._round_trip('get_item')
+        with self._lock:
+            item = self._partitions.get(primary_value, {}).get(sorting_value)
+            return dict(item) if item is not None else None
+
+    def update_item(self, primary_value, sorting_value, update_dict, condition_dict=None, add_dict=None):
+        self._round_trip('update_item')
+        with self._lock:
+            if self._conflict({(primary_value, sorting_value)}):
+                raise TransactionConflict(f"Transaction in progress for {primary_value}/{sorting_value}")
+            item = self._checked_item(primary_value, sorting_value, condition_dict)
+            if item is None:
+                self.condition_failures += 1
+                raise ConditionFailed(f"The conditional request failed for {primary_value}/{sorting_value}")
+            self._save_updated(item, {**update_dict, **added_values(item, add_dict)})
+        return {'Attributes': update_dict}
+
+    def transact_update_items(self, updates):
+        keys = {(update['primary_value'], update['sorting_value']) for update in updates}
+        with self._lock:
+            conflict = self._conflict(keys)
+            if not conflict:
+                self._in_flight.update(keys)
+        try:
+            self._round_trip('transact_write')
+            if conflict:
+                raise TransactionConflict("Transaction cancelled, a transaction is in progress for one of the items")
+            with self._lock:
+                items = [
+                    self._checked_item(update['primary_value'], update['sorting_value'], update.get('condition_dict'))
+                    for update in updates
+                ]
+                failed = {i for i, item in enumerate(items) if item is None}
+                if failed:
+                    self.condition_failures += len(failed)
+                    raise ConditionFailed(f"Transaction cancelled, {len(failed)} conditions failed", failed)
+                for item, update in zip(items, updates):
+                    self._save_updated(item, {**update['update_dict'], **added_values(item, update.get('add_dict'))})
+        finally:
+            if not conflict:
+                with self._lock:
+                    self._in_flight.difference_update(keys)
+
+    def _checked_item(self, primary_value, sorting_value, condition_dict):
+        # Call with the lock held. Same semantics as the SQLite backend: no condition upserts the item
+        partition = self._partitions.setdefault(primary_value, {})
+        item = partition.get(sorting_value)
+        if condition_dict:
+            if item is None or any(item.get(key) != value for key, value in condition_dict.items()):
+                return None
+            return item
+        return item if item is not None else {self.prime_key_name: primary_value, self.sorting_key_name: sorting_value}
+
+    def _save_updated(self, item, update_dict):
+        # Call with the lock held
+        self._partitions[item[self.prime_key_name]][item[self.sorting_key_name]] = \
+            {**item, **copy.deepcopy(update_dict)}
+
+    def bulk_write(self, put_items=None, delete_keys=None, concurrency=None) -> dict:
+        put_items = put_items or []
+        delete_keys = delete_keys or []
+        items = len(put_items) + len(delete_keys)
+        batches = math.ceil(items / BATCH_WRITE_SIZE)
+        start = time.perf_counter()
+        # The batches go out <concurrency> at a time, so the wall time is one round trip per wave of batches
+        self._round_trip('batch_write', math.ceil(batches / max(1, concurrency or 8)) if batches else 0)
+        with self._lock:
+            self.requests['batch_write_batches'] += batches
+            for item in put_items:
+                self._partitions.setdefault(item[self.prime_key_name], {})[item[self.sorting_key_name]] = \
+                    copy.deepcopy(item)
+            for key in delete_keys:
+                self._partitions.get(key[self.prime_key_name], {}).pop(key[self.sorting_key_name], None)
+        seconds = time.perf_counter() - start
+        return {'items': items, 'batches': batches, 'retries': 0, 'throttles': 0, 'seconds': seconds,
+                'items_per_second': items / seconds if seconds > 0 else 0}
+
+    def all_prime_keys(self) -> list[str]:
+        self._round_trip('scan')
+        with self._lock:
+            return sorted(key for key, partition in self._partitions.items() if partition)
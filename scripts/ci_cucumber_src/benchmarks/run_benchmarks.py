@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cucumber_tracker import CucumberTestTracker, TABLE_NAME, TRACKER_INDEXES, STATUSES, PASSED, RUNNING  # noqa: E402
+from feature_scanner import FeatureScanner, default_workers  # noqa: E402
+from feature_tree_generator import generate_feature_tree  # noqa: E402
+from local_dynamodb import LocalDynamoDB  # noqa: E402
+from test_run_reports import MultiRunReport  # noqa: E402
+
+# Measures how the pipeline scales on a synthetic feature tree, against the in memory DynamoDB stand-in:
+#   scan:   FeatureScanner without cache in one process and in CI_CUC_SCAN_WORKERS processes, with a cold cache
+#           and with a warm cache
+#   reset:  sync_tests_in_test_run of a new test run, and of an existing one resetting every test
+#   claim:  N concurrent workers claim (single or in batches) and pass every test, throughput, collisions and the
+#           transaction conflicts between the claims
+#   report: one test run in every format, and the multi-run summary and ticket tables
+# The results are printed (or written to --output) as json, so runs can be compared over time.
+PROJECT = 'ci_cuc_benchmark'
+INCLUDE_TAGS = ['regression_api']
+
+
+def quiet(func, *args, **kwargs):
+    # The scripts print progress for humans, keep it out of the json
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = quiet(func, *args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_scan(tree: Path, cache_file: Path) -> tuple[dict, list[dict]]:
+    serial_seconds, _ = timed(FeatureScanner(str(tree), str(tree), INCLUDE_TAGS, cache_file=None, workers=1).run)
+    no_cache_seconds, scenarios = timed(FeatureScanner(str(tree), str(tree), INCLUDE_TAGS, cache_file=None).run)
+    cold_seconds, _ = timed(FeatureScanner(str(tree), str(tree), INCLUDE_TAGS, cache_file=str(cache_file)).run)
+    warm_seconds, _ = timed(FeatureScanner(str(tree), str(tree), INCLUDE_TAGS, cache_file=str(cache_file)).run)
+    return {
+        'tests': len(scenarios),
+        'workers': default_workers(),
+        'no_cache_serial_seconds': serial_seconds,
+        'no_cache_seconds': no_cache_seconds,
+        'cold_cache_seconds': cold_seconds,
+        'warm_cache_seconds': warm_seconds
+    }, scenarios
+
+
+def bench_reset(db: LocalDynamoDB, scenarios: list[dict]) -> dict:
+    ctt = CucumberTestTracker(PROJECT, 'reset', db=db)
+    db.reset_stats()
+    new_seconds, _ = timed(ctt.sync_tests_in_test_run, scenarios)
+    new_requests = db.stats()['requests']
+    db.reset_stats()
+    existing_seconds, _ = timed(ctt.sync_tests_in_test_run, scenarios, STATUSES)
+    return {
+        'tests': len(scenarios),
+        'new_run_seconds': new_seconds,
+        'new_run_requests': new_requests,
+        'reset_all_seconds': existing_seconds,
+        'reset_all_requests': db.stats()['requests']
+    }
+
+
+def claim_worker(db, test_run, batch_size, claimed: Counter, lock: threading.Lock):
+    ctt = CucumberTestTracker(PROJECT, test_run, db=db)
+    while True:
+        tests = ctt.claim_batch(batch_size) if batch_size > 0 else [ctt.claim_not_run_test()]
+        tests = [test for test in tests if test]
+        if len(tests) == 0:
+            return
+        with lock:
+            claimed.update(test['test_name_example_row'] for test in tests)
+        for test in tests:
+            ctt.update_test_status(test['scenario_name'], test['example_row'], PASSED, RUNNING, print_log=False)
+
+
+def bench_claim(db: LocalDynamoDB, scenarios: list[dict], workers: int, batch_size: int) -> dict:
+    test_run = f"claim_{workers}_{batch_size}"
+    quiet(CucumberTestTracker(PROJECT, test_run, db=db).sync_tests_in_test_run, scenarios)
+    claimed = Counter()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=claim_worker, args=(db, test_run, batch_size, claimed, lock))
+               for _ in range(workers)]
+    db.reset_stats()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    stats = db.stats()
+    total_claims = sum(claimed.values())
+    attempts = total_claims + stats['condition_failures']
+    tracker = CucumberTestTracker(PROJECT, test_run, db=db)
+    summary = tracker.run_summary()
+    return {
+        'workers': workers,
+        'batch_size': batch_size,
+        'tests': len(scenarios),
+        'claimed': len(claimed),
+        'duplicate_claims': total_claims - len(claimed),
+        'seconds': seconds,
+        'claims_per_second': total_claims / seconds if seconds > 0 else 0,
+        'collisions': stats['condition_failures'],
+        'collision_rate': stats['condition_failures'] / attempts if attempts else 0,
+        'transaction_conflicts': stats['transaction_conflicts'],
+        # Every claimed test must end up PASSED, and the summary item agree, None when it is marked for repair
+        'passed': tracker.db.count_items(tracker.prime_key_value, {'test_status': [PASSED]}),
+        'summary_passed': summary['counts'][PASSED] if summary is not None else None,
+        'requests': stats['requests']
+    }
+
+
+def bench_report(db: LocalDynamoDB, scenarios: list[dict], runs: int) -> dict:
+    test_runs = [f"report_{i}" for i in range(runs)]
+    for test_run in test_runs:
+        quiet(CucumberTestTracker(PROJECT, test_run, db=db).sync_tests_in_test_run, scenarios)
+    single = CucumberTestTracker(PROJECT, test_runs[0], db=db)
+    tickets = sorted({tag.replace('JIRA-', '') for s in scenarios for tag in s['tags'] if tag.startswith('JIRA-')})
+    db.reset_stats()
+    single_seconds, _ = timed(lambda: (single.plain_text_test_result(STATUSES), single.markdown_test_result(STATUSES),
+                                       single.json_test_result()))
+    single_requests = db.stats()['requests']
+    # The polling checks of the CI steps, a count and the verdict, neither transfers the full records
+    count_seconds, _ = timed(single.count_by_status, STATUSES)
+    passed_seconds, _ = timed(single.test_run_passed)
+    db.reset_stats()
+    report = MultiRunReport(PROJECT, test_runs, db=db)
+    summary_seconds, _ = timed(report.summary_table_markdown)
+    tickets_seconds, _ = timed(report.ticket_table_markdown, tickets)
+    return {
+        'tests_per_run': len(scenarios),
+        'single_run_all_formats_seconds': single_seconds,
+        'single_run_requests': single_requests,
+        'count_by_status_seconds': count_seconds,
+        'test_run_passed_seconds': passed_seconds,
+        'runs': runs,
+        'tickets': len(tickets),
+        'summary_table_seconds': summary_seconds,
+        'ticket_table_seconds': tickets_seconds,
+        'multi_run_requests': db.stats()['requests']
+    }
+
+
+def run_benchmarks(args) -> dict:
+    results = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args)
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = Path(tmp) / 'features'
+        results['feature_tree'] = generate_feature_tree(str(tree), args.features, args.scenarios,
+                                                        rows_per_outline=args.rows, seed=args.seed)
+        results['scan'], scenarios = bench_scan(tree, Path(tmp) / 'cache' / 'feature_scan_cache.json')
+    db = LocalDynamoDB(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES, args.latency_ms)
+    results['reset'] = bench_reset(db, scenarios)
+    results['claim'] = [
+        bench_claim(db, scenarios[:args.claim_tests], int(workers), int(batch_size))
+        for workers in args.workers.split(',') for batch_size in args.batch_sizes.split(',')
+    ]
+    results['report'] = bench_report(db, scenarios, args.runs)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--features', type=int, default=200, help='feature files in the synthetic tree')
+    parser.add_argument('--scenarios', type=int, default=10, help='scenarios per feature file')
+    parser.add_argument('--rows', type=int, default=20, help='example rows per scenario outline')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=str, default='1,4,16', help='concurrent claim workers, comma separated')
+    parser.add_argument('--claim-tests', type=int, default=500, help='tests in the claim test runs')
+    parser.add_argument('--batch-sizes', type=str, default='0,10', help='0 claims one test at a time')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='simulated round trip of every request')
+    parser.add_argument('--runs', type=int, default=5, help='test runs in the multi-run reports')
+    parser.add_argument('--output', type=str, default='', help='write the json here instead of stdout')
+    args = parser.parse_args()
+
+    output = json.dumps(run_benchmarks(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
@@ -0,0 +1,67 @@
+import argparse
+import heapq
+import json
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Replays recorded test durations through N workers and compares the makespan (wall time of the whole test run)
+# when the tests are claimed in random order and in longest-first order.
+# Durations come from a recorded test run (last_duration of each test) or from a json file {"test name": seconds}
+
+
+def makespan(durations: list[float], workers: int) -> float:
+    # Every worker claims the next test as soon as it is free, same as ci_cuc_test_run_in_parallel
+    free_at = [0.0] * workers
+    for duration in durations:
+        start = heapq.heappop(free_at)
+        heapq.heappush(free_at, start + duration)
+    return max(free_at)
+
+
+def simulate(durations: list[float], workers: int, trials: int) -> dict:
+    rng = random.Random(0)
+    random_spans = []
+    for _ in range(trials):
+        shuffled = durations.copy()
+        rng.shuffle(shuffled)
+        random_spans.append(makespan(shuffled, workers))
+    longest_first_span = makespan(sorted(durations, reverse=True), workers)
+    lower_bound = max(sum(durations) / workers, max(durations))
+    return {
+        'tests': len(durations),
+        'workers': workers,
+        'total_test_seconds': sum(durations),
+        'lower_bound_seconds': lower_bound,
+        'random_mean_seconds': sum(random_spans) / trials,
+        'random_worst_seconds': max(random_spans),
+        'longest_first_seconds': longest_first_span,
+        'saved_vs_random_mean_seconds': sum(random_spans) / trials - longest_first_span
+    }
+
+
+def recorded_durations(project: str, test_run: str) -> list[float]:
+    from cucumber_tracker import CucumberTestTracker
+    records = CucumberTestTracker(project, test_run).all_tests()
+    return [float(r['last_duration']) for r in records if r.get('last_duration') is not None]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', type=str, help='a json file of durations, or <project>/<test run>')
+    parser.add_argument('workers', nargs='?', type=str, default='4,8,16')
+    parser.add_argument('trials', nargs='?', type=int, default=200)
+    args = parser.parse_args()
+
+    if Path(args.source).is_file():
+        with open(args.source, 'r', encoding='utf-8') as f:
+            durations = [float(d) for d in json.load(f).values()]
+    else:
+        project, run_name = args.source.split('/', 1)
+        durations = recorded_durations(project, run_name)
+    if len(durations) == 0:
+        raise ValueError(f"No recorded durations found in {args.source}")
+    results = [simulate(durations, int(workers), args.trials) for workers in args.workers.split(',')]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# One entry point for the ci_cucumber commands, each imports the tracker (and boto3) only once its arguments are valid
+REPORT_TYPES = ['plain', 'markdown', 'json', 'passed']
+REPORT_FILES = {'plain': 'report.txt', 'markdown': 'report.md', 'json': 'report.json', 'passed': 'passed.txt'}
+# Import time of the CLI itself and of the argument validation, profiled by "ci_cuc.py profile"
+DEFAULT_STARTUP_BUDGET_MS = 100
+HEAVY_MODULES = ['boto3', 'botocore']
+COMMANDS = ['reset', 'retry', 'claim', 'update', 'count', 'report', 'passed', 'tickets', 'summary', 'repair', 'runs',
+            'socket-path', 'profile']
+
+
+def status_name(value: str) -> str:
+    # The tracker module is light, it does not import the storage backend
+    from cucumber_tracker import STATUSES
+    status = value.strip().upper()
+    if status not in STATUSES:
+        raise argparse.ArgumentTypeError(f"invalid status {value}, expect {STATUSES}")
+    return status
+
+
+def status_list(value: str) -> list[str]:
+    return [status_name(status) for status in value.split(',') if status.strip()]
+
+
+def report_type_list(value: str) -> list[str]:
+    report_types = REPORT_TYPES if value == 'all' else value.split(',')
+    invalid = [report_type for report_type in report_types if report_type not in REPORT_TYPES]
+    if invalid:
+        raise argparse.ArgumentTypeError(f"invalid report type {invalid}, expect {REPORT_TYPES} or all")
+    return report_types
+
+
+def comma_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def run_reset(args):
+    from cucumber_tracker import CucumberTestTracker
+    from feature_scanner import FeatureScanner, DEFAULT_CACHE_FILE
+    # Do not include @ in the test run name, standardize the test run name,
+    # avoiding the case that sometimes you use @tag, sometimes you use just tag
+    test_name = args.test_run.replace('@', '')
+    print(f"Building test run <{test_name}> for inclusion tags \"{args.in_tags}\" "
+          f"and exclusion tags \"{args.ex_tags}\"")
+    fs = FeatureScanner(args.project_root, args.feature_folder, comma_list(args.in_tags), comma_list(args.ex_tags),
+                        None if args.no_cache else args.cache_file or DEFAULT_CACHE_FILE,
+                        comma_list(args.step_definitions))
+    ctt = CucumberTestTracker(args.project_name, test_name)
+    ctt.sync_tests_in_test_run(fs.run(), args.reset_statuses, args.new_status, args.impact, args.shards)
+    print(f"Test run <{test_name}> for inclusion tags \"{args.in_tags}\" and exclusion tags \"{args.ex_tags}\" "
+          f"is built successfully.")
+
+
+def run_retry(args):
+    from cucumber_tracker import CucumberTestTracker
+    ctt = CucumberTestTracker(args.project_name, args.test_run.replace('@', ''))
+    ctt.retry_failed(args.max_attempts, args.statuses)
+
+
+def run_claim(args):
+    from cucumber_tracker import CucumberTestTracker, json_default
+    ctt = CucumberTestTracker(args.project_name, args.test_run)
+    if args.batch_size > 0:
+        for test in ctt.claim_batch(args.batch_size):
+            print(json.dumps(test, default=json_default))
+    else:
+        claimed = ctt.claim_not_run_test()
+        print(json.dumps(claimed, default=json_default) if claimed else '')
+
+
+def run_update(args):
+    from cucumber_tracker import CucumberTestTracker, RUNNING
+    ctt = CucumberTestTracker(args.project_name, args.test_run)
+    ctt.update_test_status(args.scenario_name, args.example_row, args.status, RUNNING)
+
+
+def run_count(args):
+    from cucumber_tracker import CucumberTestTracker
+    ctt = CucumberTestTracker(args.project_name, args.test_run)
+    print(ctt.count_by_status(args.statuses))
+
+
+def render_report(ctt, snapshot, report_type, detail_statuses) -> str:
+    from cucumber_tracker import json_default
+    if report_type == 'plain':
+        return ctt.plain_text_test_result(detail_statuses, snapshot['result'])
+    if report_type == 'markdown':
+        return ctt.markdown_test_result(detail_statuses, snapshot['result'])
+    if report_type == 'json':
+        return json.dumps(snapshot['result'], indent=2, default=json_default)
+    return 'true' if snapshot['passed'] else 'false'
+
+
+def run_report(args):
+    from cucumber_tracker import CucumberTestTracker
+    ctt = CucumberTestTracker(args.project_name, args.test_run)
+    # Every report comes from the same snapshot, the test run is queried at most once
+    snapshot = ctt.report_snapshot(use_cache=not args.no_cache)
+    if args.output_dir:
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for report_type in args.report_types:
+            (output_dir / REPORT_FILES[report_type]).write_text(
+                render_report(ctt, snapshot, report_type, args.show_detail), encoding='utf-8')
+        print('true' if snapshot['passed'] else 'false')
+    else:
+        for report_type in args.report_types:
+            print(render_report(ctt, snapshot, report_type, args.show_detail))
+
+
+def run_passed(args):
+    from cucumber_tracker import CucumberTestTracker
+    ctt = CucumberTestTracker(args.project_name, args.test_run.replace('@', ''))
+    # The verdict gates the CI, so it is always read from the summary item of the test run, never from a cached report
+    print('true' if ctt.test_run_passed() else 'false')
+
+
+def run_tickets(args):
+    from test_run_reports import MultiRunReport
+    report = MultiRunReport(args.project_name, comma_list(args.test_run_list))
+    tickets = comma_list(args.tickets)
+    if args.format.lower() != 'json':
+        content = report.ticket_table_markdown(tickets)
+    else:
+        content = json.dumps(report.ticket_tests(tickets), indent=2)
+    print(f"## **Test Cases that are associated with the JIRA tickets for {args.title}:**\n{content}")
+
+
+def run_summary(args):
+    from test_run_reports import MultiRunReport
+    report = MultiRunReport(args.project_name, args.test_run_list.split(','))
+    print(report.summary_table_markdown(comma_list(args.link_list)))
+
+
+def run_repair(args):
+    from cucumber_tracker import CucumberTestTracker
+    ctt = CucumberTestTracker(args.project_name, args.test_run.replace('@', ''))
+    print(json.dumps(ctt.repair_run_summary(), indent=2))
+
+
+def run_runs(args):
+    from cucumber_tracker import CucumberTestRuns
+    test_runs = CucumberTestRuns()
+    if args.backfill:
+        print(f"Registered {test_runs.backfill_registry()} test runs")
+    runs = test_runs.list_test_runs(args.project_name) if args.project_name else test_runs.all_test_runs()
+    print(json.dumps(runs, indent=2))
+
+
+def run_socket_path(args):
+    # The daemon, its clients and ci_cuc_start_daemon all take the socket path from here
+    from ci_cuc_daemon_client import default_socket_path
+    print(default_socket_path(args.project_name, args.test_run))
+
+
+def import_profile(cli_args: list[str], script: str = __file__) -> dict:
+    # Run the script in a fresh interpreter with -X importtime, and sum the imports made after the interpreter startup
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', script, *cli_args],
+                            capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    import_us = 0
+    modules = []
+    after_site = False
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        modules.append(name.strip())
+        if not name.startswith('  ') and after_site:
+            import_us += int(cumulative)
+        if name.strip() == 'site':
+            after_site = True
+    return {
+        'command': ' '.join(cli_args if script == __file__ else [Path(script).name, *cli_args]),
+        'wall_ms': round(wall_ms, 1),
+        'import_ms': round(import_us / 1000, 1),
+        'heavy_imports': sorted({m.split('.')[0] for m in modules if m.split('.')[0] in HEAVY_MODULES})
+    }
+
+
+def run_profile(args):
+    commands = [[command, '--help'] for command in COMMANDS if command != 'profile']
+    # The validation error path: a bad status must be reported before any storage import
+    commands.append(['count', 'project', 'test_run', 'NOT_A_STATUS'])
+    profiles = [import_profile(command) for command in commands]
+    # The daemon imports the tracker up front, and the storage backend only when it creates the tracker
+    profiles.append(import_profile(['--help'], str(Path(__file__).resolve().parent / 'ci_cuc_daemon.py')))
+    over_budget = [p for p in profiles if p['import_ms'] > args.budget_ms or p['heavy_imports']]
+    print(json.dumps({'budget_ms': args.budget_ms, 'profiles': profiles}, indent=2))
+    if over_budget:
+        print(f"ci_cuc startup is over the budget of {args.budget_ms} ms or imports "
+              f"{HEAVY_MODULES} before it needs to: {[p['command'] for p in over_budget]}", file=sys.stderr)
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='ci_cuc')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    reset = subparsers.add_parser('reset', help='scan the feature files and sync them into the test run')
+    reset.add_argument('project_name', type=str)
+    reset.add_argument('project_root', type=str)
+    reset.add_argument('feature_folder', type=str)
+    reset.add_argument('test_run', type=str)
+    reset.add_argument('reset_statuses', type=status_list)
+    reset.add_argument('in_tags', type=str)
+    reset.add_argument('ex_tags', nargs='?', type=str, default='')
+    reset.add_argument('new_status', nargs='?', type=status_name, default='NOT_RUN')
+    reset.add_argument('--no-cache', action='store_true', help='parse every feature file, ignore the scan cache')
+    reset.add_argument('--cache-file', type=str, default=None, help='default .ci_cuc_cache/feature_scan_cache.json')
+    reset.add_argument('--impact', action='store_true',
+                       help='also reset the kept tests whose scenario or step definitions changed since they ran')
+    reset.add_argument('--step-definitions', type=str, default=os.getenv('CI_CUC_STEP_DEFINITIONS', ''),
+                       help='comma list of step definition files or folders, default the step_definitions folder '
+                            'next to the feature files')
+    reset.add_argument('--shards', type=str, default=os.getenv('CI_CUC_SHARDS', ''),
+                       help='workers of every runner, comma delimited, e.g. 4,4,2: spread the tests over one shard '
+                            'per runner by expected duration')
+    reset.set_defaults(func=run_reset)
+
+    retry = subparsers.add_parser('retry', help='move the FAILED and RUNNING tests back to NOT_RUN for another round')
+    retry.add_argument('project_name', type=str)
+    retry.add_argument('test_run', type=str)
+    # Default CI_CUC_MAX_TEST_ATTEMPTS, or 3
+    retry.add_argument('max_attempts', nargs='?', type=int, default=None)
+    retry.add_argument('statuses', nargs='?', type=status_list, default=['RUNNING', 'FAILED'])
+    retry.set_defaults(func=run_retry)
+
+    claim = subparsers.add_parser('claim', help='claim a NOT_RUN test (or a batch of them), print it as json')
+    claim.add_argument('project_name', type=str)
+    claim.add_argument('test_run', type=str)
+    # If a batch size is given, claim up to that many tests at once and print one test json per line
+    claim.add_argument('batch_size', nargs='?', type=int, default=0)
+    claim.set_defaults(func=run_claim)
+
+    update = subparsers.add_parser('update', help='set the result of a RUNNING test')
+    update.add_argument('project_name', type=str)
+    update.add_argument('test_run', type=str)
+    update.add_argument('scenario_name', type=str)
+    update.add_argument('example_row', type=str)
+    update.add_argument('status', type=status_name)
+    update.set_defaults(func=run_update)
+
+    count = subparsers.add_parser('count', help='print the number of tests with the given statuses')
+    count.add_argument('project_name', type=str)
+    count.add_argument('test_run', type=str)
+    count.add_argument('statuses', type=status_list)
+    count.set_defaults(func=run_count)
+
+    report = subparsers.add_parser('report', help='print or write the reports of a test run')
+    report.add_argument('project_name', type=str)
+    report.add_argument('test_run', type=str)
+    # One of plain, markdown, json, passed, a comma separated list of them, or all
+    report.add_argument('report_types', type=report_type_list)
+    report.add_argument('show_detail', nargs='?', type=comma_list, default=[])
+    report.add_argument('--output-dir', type=str, default='',
+                        help='write every report into a file here, and print only the verdict (true/false)')
+    report.add_argument('--no-cache', action='store_true', help='query the test run, ignore the report snapshot cache')
+    report.set_defaults(func=run_report)
+
+    passed = subparsers.add_parser('passed', help='print true if all tests of the test run PASSED')
+    passed.add_argument('project_name', type=str)
+    passed.add_argument('test_run', type=str)
+    passed.set_defaults(func=run_passed)
+
+    tickets = subparsers.add_parser('tickets', help='list the tests of the JIRA tickets across test runs')
+    tickets.add_argument('project_name', type=str)
+    tickets.add_argument('test_run_list', type=str)
+    tickets.add_argument('tickets', type=str)
+    tickets.add_argument('title', nargs='?', type=str, default='current sprint')
+    tickets.add_argument('format', nargs='?', type=str, default='json')
+    tickets.set_defaults(func=run_tickets)
+
+    summary = subparsers.add_parser('summary', help='markdown summary table of several test runs')
+    summary.add_argument('project_name', type=str)
+    summary.add_argument('test_run_list', type=str)
+    summary.add_argument('link_list', nargs='?', type=str, default='')
+    summary.set_defaults(func=run_summary)
+
+    repair = subparsers.add_parser('repair', help='count the tests again and rewrite the summary item of the test run')
+    repair.add_argument('project_name', type=str)
+    repair.add_argument('test_run', type=str)
+    repair.set_defaults(func=run_repair)
+
+    runs = subparsers.add_parser('runs', help='list the test runs of a project, or of all projects')
+    runs.add_argument('project_name', nargs='?', type=str, default='')
+    runs.add_argument('--backfill', action='store_true',
+                      help='register the test runs created before the run registry, scans the table once')
+    runs.set_defaults(func=run_runs)
+
+    socket_path = subparsers.add_parser('socket-path', help='print the socket path of the ci_cuc daemon of a test run')
+    socket_path.add_argument('project_name', type=str)
+    socket_path.add_argument('test_run', type=str)
+    socket_path.set_defaults(func=run_socket_path)
+
+    profile = subparsers.add_parser('profile', help='profile the startup import time of every command')
+    profile.add_argument('--budget-ms', type=float,
+                         default=float(os.getenv('CI_CUC_STARTUP_BUDGET_MS', DEFAULT_STARTUP_BUDGET_MS)))
+    profile.set_defaults(func=run_profile)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
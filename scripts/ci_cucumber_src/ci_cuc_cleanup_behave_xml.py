@@ -1,32 +1,107 @@
 import defusedxml.ElementTree as element_tree  # Import from defusedxml
 import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from xml.etree.ElementTree import Element, tostring
+from xml.sax.saxutils import escape
+
+# Written after the XML declaration of a cleaned report, so it is not parsed again
+CLEANED_MARKER = '<!-- ci_cuc_cleaned -->'
+MARKER_SEARCH_BYTES = 256
+
+
+def already_cleaned(xml_path) -> bool:
+    try:
+        with open(xml_path, 'rb') as f:
+            return CLEANED_MARKER.encode('utf-8') in f.read(MARKER_SEARCH_BYTES)
+    except OSError:
+        return False
+
+
+def _start_tag(element) -> str:
+    # Serialized by ElementTree itself, so the attributes are escaped the same way as in the test cases
+    empty = tostring(Element(element.tag, element.attrib), encoding='unicode')
+    return f"{empty[:-len(' />')]}>"
+
+
+def _stream_test_cases(xml_path, out):
+    # Return the number of removed test cases, None for a report with XML namespaces
+    removed = 0
+    depth = 0
+    root = None
+    root_written = False
+    # A kept test case is written once its tail is parsed, at the next test case or the root end
+    kept = None
+    # defusedxml.ElementTree.iterparse provides the same protection against XML vulnerabilities as parse
+    for event, element in element_tree.iterparse(xml_path, events=('start-ns', 'start', 'end')):
+        if event == 'start-ns':
+            return None
+        if event == 'start':
+            depth += 1
+            root = root if root is not None else element
+            if depth == 2 and kept is not None:
+                out.write(tostring(kept, encoding='unicode'))
+                kept = None
+            continue
+        depth -= 1
+        if depth == 1:
+            # A direct child of the root (a test case) is complete, keep it unless it was skipped
+            if element.find('skipped') is not None:
+                removed += 1
+            else:
+                if not root_written:
+                    # Written with the first kept test case, the text of the root before it is parsed by now
+                    out.write(_start_tag(root) + escape(root.text or ''))
+                    root_written = True
+                kept = element
+            root.remove(element)
+    if kept is not None:
+        out.write(tostring(kept, encoding='unicode'))
+    # A root without any kept test case is written whole, as an empty element if it has no text either
+    out.write(f"</{root.tag}>" if root_written else tostring(root, encoding='unicode'))
+    return removed
+
+
+def _tree_test_cases(xml_path, out):
+    # The whole report in memory, for the reports the streaming cannot write the same way
+    tree = element_tree.parse(xml_path)
+    root = tree.getroot()
+    removed = [testcase for testcase in list(root) if testcase.find('skipped') is not None]
+    for testcase in removed:
+        root.remove(testcase)
+    tree.write(out, encoding='unicode')
+    return len(removed)
 
 
 def clean_up_behave_xml(xml_path, output_path):
     """
     Cleans up a Behave XML report by removing skipped test cases.
+    The report is streamed: every test case is written out (or dropped) as soon as it is parsed,
+    so the memory stays bounded by the largest test case, not by the whole report.
+    A report with XML namespaces is cleaned as a whole tree, so it is written as before.
 
     Args:
         xml_path (str): The path to the input XML file.
-        output_path (str): The path to save the cleaned XML file.
+        output_path (str): The path to save the cleaned XML file, can be xml_path itself.
+
+    Returns:
+        int: The number of removed test cases, None if the report could not be cleaned.
     """
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    header = f"<?xml version='1.0' encoding='utf-8'?>\n{CLEANED_MARKER}\n"
     try:
-        # Load and parse the XML using defusedxml.ElementTree
-        # This provides protection against various XML vulnerabilities
-        tree = element_tree.parse(xml_path)
-        root = tree.getroot()
-
-        # Find and remove all skipped test cases
-        # Iterate over a copy of the list to avoid issues when modifying
-        # the list while iterating
-        for testcase in list(root):
-            if testcase.find('skipped') is not None:
-                root.remove(testcase)
-
-        # Save cleaned XML
-        tree.write(output_path, encoding='utf-8', xml_declaration=True)
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            out.write(header)
+            removed = _stream_test_cases(xml_path, out)
+        if removed is None:
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                out.write(header)
+                removed = _tree_test_cases(xml_path, out)
+        os.replace(tmp_path, output_path)
         print(f"Successfully cleaned up the XML file: {output_path}")
+        return removed
 
     except element_tree.ParseError as e:
         print(f"Error parsing XML file {xml_path}: {e}")
@@ -34,14 +109,42 @@ def clean_up_behave_xml(xml_path, output_path):
         print(f"Error: XML file not found at {xml_path}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return None
+
+
+def _clean_in_place(xml_path):
+    return clean_up_behave_xml(xml_path, xml_path)
+
+
+def clean_up_folder(xml_folder, workers=None) -> dict:
+    start = time.perf_counter()
+    files = [str(file_path) for file_path in Path(xml_folder).rglob('*.xml')]
+    pending = [file_path for file_path in files if not already_cleaned(file_path)]
+    workers = workers or int(os.getenv('CI_CUC_XML_WORKERS', os.cpu_count() or 1))
+    # A process pool only pays off for several reports, the usual call after one scenario has one new report
+    if len(pending) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            results = list(pool.map(_clean_in_place, pending))
+    else:
+        results = [_clean_in_place(file_path) for file_path in pending]
+    return {
+        'files': len(files),
+        'already_cleaned': len(files) - len(pending),
+        'cleaned': sum(1 for removed in results if removed is not None),
+        'removed_test_cases': sum(removed for removed in results if removed is not None),
+        'seconds': time.perf_counter() - start
+    }
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('xml_folder', type=str)
+    parser.add_argument('workers', nargs='?', type=int, default=0)
     args = parser.parse_args()
 
-    parent_path = Path(args.xml_folder)
-    for file_path in parent_path.rglob('*.xml'):
-        print(f"handling {file_path}")
-        clean_up_behave_xml(str(file_path), str(file_path))
+    stats = clean_up_folder(args.xml_folder, args.workers)
+    print(f"Cleaned {stats['cleaned']} XML files ({stats['removed_test_cases']} skipped test cases removed), "
+          f"{stats['already_cleaned']} already cleaned, in {stats['seconds']:.3f}s")
@@ -0,0 +1,15 @@
+from cucumber_tracker import CucumberTestRuns, STATUS_INDEX_NAME, SHARD_STATUS_INDEX_NAME
+
+if __name__ == "__main__":
+    # One time setup, DynamoDB builds one new index at a time: run it again once the index is ACTIVE
+    db = CucumberTestRuns().db
+    if hasattr(db, 'create_index'):
+        indexes = [(STATUS_INDEX_NAME, 'test_status'), (SHARD_STATUS_INDEX_NAME, 'shard_status')]
+        for index_name, sort_key_name in indexes:
+            if not db.has_index(index_name):
+                db.create_index(index_name, 'project_test_run', sort_key_name)
+                break
+        else:
+            print(f"Indexes {STATUS_INDEX_NAME} and {SHARD_STATUS_INDEX_NAME} already exist")
+    else:
+        print(f"{type(db).__name__} creates the status indexes together with the table, nothing to do")
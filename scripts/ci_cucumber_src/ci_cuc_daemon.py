@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from cucumber_tracker import CucumberTestTracker, STATUSES, RUNNING, json_default, test_key
+from ci_cuc_daemon_client import default_socket_path
+
+class RequestStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations: dict[str, list[float]] = {}
+
+    def record(self, op: str, duration_ms: float):
+        with self._lock:
+            self._durations.setdefault(op, []).append(duration_ms)
+
+    def summary(self) -> dict[str, dict]:
+        with self._lock:
+            durations = {op: sorted(values) for op, values in self._durations.items()}
+        return {
+            op: {
+                'count': len(values),
+                'mean_ms': sum(values) / len(values),
+                'p50_ms': values[len(values) // 2],
+                'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max_ms': values[-1],
+            }
+            for op, values in durations.items()
+        }
+
+
+class TrackerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # Closing the server waits for the requests in progress, a result being written is not cut off at exit
+    daemon_threads = False
+
+    def __init__(self, socket_path, project, test_run):
+        # The tracker imports the storage backend, the module imports are profiled by "ci_cuc.py profile"
+        start = time.perf_counter()
+        self.tracker = CucumberTestTracker(project, test_run)
+        self.startup_ms = (time.perf_counter() - start) * 1000
+        # The tracker keeps no state between calls and its DynamoDB client is thread safe
+        self.stats = RequestStats()
+        # The tests each worker claimed and has not finished yet, its heartbeat renews their leases
+        self._held_lock = threading.Lock()
+        self._held: dict[str, set[str]] = {}
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, DaemonRequestHandler)
+
+    def handle_op(self, request: dict):
+        op = request.get('op')
+        if op == 'ping':
+            return 'pong'
+        if op == 'stats':
+            return self.stats_report()
+        if op == 'stop':
+            # The handler shuts the server down once this reply is sent
+            return self.stats_report()
+        # One daemon serves all the workers of a runner, the leases are held by the worker of the request
+        worker = request.get('worker')
+        if op == 'claim':
+            test = self.tracker.claim_not_run_test(owner=worker)
+            self._hold(worker, [test] if test else [])
+            return test
+        if op == 'claim_batch':
+            tests = self.tracker.claim_batch(int(request['count']), owner=worker)
+            self._hold(worker, tests)
+            return tests
+        if op == 'renew':
+            return self.renew(worker)
+        if op == 'lease_wait':
+            return self.tracker.seconds_to_lease_expiry(worker, request.get('within'))
+        if op == 'update':
+            with self._held_lock:
+                self._held.get(worker, set()).discard(test_key(request['scenario_name'], request['example_row']))
+            return self.tracker.update_test_status(request['scenario_name'], request['example_row'],
+                                                   request['status'], RUNNING, False, worker)
+        if op == 'count':
+            statuses = request.get('statuses') or STATUSES
+            invalid = [status for status in statuses if status not in STATUSES]
+            if invalid:
+                raise Exception(f"Invalid status: {invalid}")
+            return self.tracker.count_by_status(statuses)
+        raise Exception(f"Unknown ci_cuc daemon request: {op}")
+
+    def _hold(self, worker, tests):
+        with self._held_lock:
+            self._held.setdefault(worker, set()).update(test['test_name_example_row'] for test in tests)
+
+    def renew(self, worker) -> int:
+        # Only the leases of the tests the worker holds are renewed, one conditional write each
+        with self._held_lock:
+            keys = set(self._held.get(worker, set()))
+        lost = keys - set(self.tracker.renew_leases(sorted(keys), worker))
+        with self._held_lock:
+            self._held.get(worker, set()).difference_update(lost)
+        return len(keys) - len(lost)
+
+    def stats_report(self) -> dict:
+        requests = self.stats.summary()
+        return {
+            'test_run': self.tracker.prime_key_value,
+            'startup_ms': self.startup_ms,
+            'total_requests': sum(op_stats['count'] for op_stats in requests.values()),
+            'requests': requests
+        }
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        start = time.perf_counter()
+        request = {}
+        try:
+            request = json.loads(line)
+            response = {'ok': True, 'result': self.server.handle_op(request)}
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        op = request.get('op', 'invalid')
+        if op not in ['ping', 'stats', 'stop']:
+            self.server.stats.record(op, (time.perf_counter() - start) * 1000)
+        self.wfile.write(json.dumps(response, default=json_default).encode('utf-8') + b'\n')
+        self.wfile.flush()
+        if op == 'stop' and response['ok']:
+            # serve_forever runs in the main thread, so this handler thread can wait for it to stop
+            self.server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('project_name', type=str)
+    parser.add_argument('test_run', type=str)
+    parser.add_argument('socket_path', nargs='?', type=str, default='')
+    args = parser.parse_args()
+
+    path = args.socket_path or default_socket_path(args.project_name, args.test_run)
+    with TrackerDaemon(path, args.project_name, args.test_run) as server:
+        print(f"ci_cuc daemon for <{args.project_name}/{args.test_run}> is listening on {path}, "
+              f"startup took {server.startup_ms:.1f} ms")
+        server.serve_forever()
+    print(f"ci_cuc daemon for <{args.project_name}/{args.test_run}> is stopped")
@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Exit code when the daemon cannot be reached, the shell functions fall back to the scripts
+DAEMON_UNAVAILABLE = 3
+REQUEST_TIMEOUT_SECONDS = 120
+
+# Called once per claimed test, so standard library only (cucumber_tracker would bring boto3 back)
+
+
+def default_socket_path(project: str, test_run: str) -> str:
+    digest = hashlib.sha1(f"{project}/{test_run}".encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"ci_cuc_{digest}.sock")
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+def send_request(socket_path: str, request: dict, timeout: float = REQUEST_TIMEOUT_SECONDS) -> dict:
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        conn.connect(socket_path)
+    except (socket.timeout, OSError) as e:
+        raise DaemonUnavailable(f"ci_cuc daemon is not reachable at {socket_path}: {e}")
+    with conn:
+        try:
+            conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with conn.makefile('r', encoding='utf-8') as reader:
+                line = reader.readline()
+        except (socket.timeout, OSError) as e:
+            # The daemon is shutting down, hangs or no longer accepts requests
+            raise DaemonUnavailable(f"ci_cuc daemon at {socket_path} did not answer: {e}")
+    if not line:
+        raise DaemonUnavailable(f"ci_cuc daemon at {socket_path} closed the connection without reply")
+    try:
+        response = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise DaemonUnavailable(f"ci_cuc daemon at {socket_path} sent a truncated reply: {e}")
+    if not response.get('ok'):
+        raise Exception(f"ci_cuc daemon error: {response.get('error')}")
+    return response
+
+
+def wait_until_ready(socket_path: str, wait_seconds: float) -> bool:
+    deadline = time.monotonic() + wait_seconds
+    while time.monotonic() < deadline:
+        try:
+            send_request(socket_path, {'op': 'ping'}, timeout=5)
+            return True
+        except DaemonUnavailable:
+            time.sleep(0.1)
+    return False
+
+
+def print_stats(stats: dict):
+    print(f"ci_cuc daemon for <{stats['test_run']}> served {stats['total_requests']} requests, "
+          f"tracker startup (storage backend import and client) took {stats['startup_ms']:.1f} ms")
+    print(f"  {'request':<8} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+          f"{'per-process ms':>15}")
+    for op, op_stats in stats['requests'].items():
+        # A process-per-call request pays the tracker startup, and the interpreter and imports, on top of the request
+        per_process = op_stats['mean_ms'] + stats['startup_ms']
+        print(f"  {op:<8} {op_stats['count']:>6} {op_stats['mean_ms']:>9.1f} {op_stats['p50_ms']:>9.1f} "
+              f"{op_stats['p95_ms']:>9.1f} {op_stats['max_ms']:>9.1f} {per_process:>15.1f}")
+
+
+def benchmark(socket_path: str, project: str, test_run: str, requests: int):
+    # Time the same count request end to end through the daemon and through the process-per-call script
+    script = Path(__file__).resolve().parent / 'ci_cuc_test_count_by_status.py'
+    daemon_ms = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        send_request(socket_path, {'op': 'count', 'statuses': ['NOT_RUN']})
+        daemon_ms.append((time.perf_counter() - start) * 1000)
+    process_ms = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(script), project, test_run, 'NOT_RUN'], check=True,
+                       stdout=subprocess.DEVNULL)
+        process_ms.append((time.perf_counter() - start) * 1000)
+    result = {
+        'requests': requests,
+        'daemon_mean_ms': sum(daemon_ms) / requests,
+        'process_mean_ms': sum(process_ms) / requests,
+    }
+    result['speedup'] = result['process_mean_ms'] / result['daemon_mean_ms'] if result['daemon_mean_ms'] else 0
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('socket_path', type=str)
+    subparsers = parser.add_subparsers(dest='op', required=True)
+    subparsers.add_parser('claim')
+    subparsers.add_parser('renew')
+    lease_wait_parser = subparsers.add_parser('lease_wait')
+    lease_wait_parser.add_argument('within', nargs='?', type=float, default=None)
+    claim_batch_parser = subparsers.add_parser('claim_batch')
+    claim_batch_parser.add_argument('count', type=int)
+    update_parser = subparsers.add_parser('update')
+    update_parser.add_argument('scenario_name', type=str)
+    update_parser.add_argument('example_row', type=str)
+    update_parser.add_argument('status', type=str)
+    count_parser = subparsers.add_parser('count')
+    count_parser.add_argument('statuses', type=str)
+    wait_parser = subparsers.add_parser('wait')
+    wait_parser.add_argument('seconds', nargs='?', type=float, default=30)
+    subparsers.add_parser('stats')
+    subparsers.add_parser('stop')
+    benchmark_parser = subparsers.add_parser('benchmark')
+    benchmark_parser.add_argument('project_name', type=str)
+    benchmark_parser.add_argument('test_run', type=str)
+    benchmark_parser.add_argument('requests', nargs='?', type=int, default=10)
+    args = parser.parse_args()
+    # The worker (test runner thread) that holds the leases of the tests it claims
+    worker = os.getenv('CI_CUC_WORKER_ID')
+
+    try:
+        if args.op == 'wait':
+            sys.exit(0 if wait_until_ready(args.socket_path, args.seconds) else DAEMON_UNAVAILABLE)
+        elif args.op == 'claim':
+            claimed = send_request(args.socket_path, {'op': 'claim', 'worker': worker})['result']
+            print(json.dumps(claimed) if claimed else '')
+        elif args.op == 'claim_batch':
+            for test in send_request(args.socket_path, {'op': 'claim_batch', 'count': args.count,
+                                                        'worker': worker})['result']:
+                print(json.dumps(test))
+        elif args.op == 'renew':
+            print(send_request(args.socket_path, {'op': 'renew', 'worker': worker})['result'])
+        elif args.op == 'lease_wait':
+            seconds = send_request(args.socket_path, {'op': 'lease_wait', 'worker': worker,
+                                                      'within': args.within})['result']
+            print('' if seconds is None else f"{seconds:.0f}")
+        elif args.op == 'update':
+            updated = send_request(args.socket_path, {'op': 'update', 'scenario_name': args.scenario_name,
+                                                      'example_row': args.example_row, 'status': args.status,
+                                                      'worker': worker})
+            test_key = f"{args.scenario_name}:{args.example_row}"
+            if updated['result']:
+                print(f"Successfully set status {args.status.upper()} for {test_key}")
+            else:
+                print(f"Failed to set status {args.status.upper()} for {test_key}")
+        elif args.op == 'count':
+            statuses = [status.strip().upper() for status in args.statuses.split(',') if status.strip()]
+            print(send_request(args.socket_path, {'op': 'count', 'statuses': statuses})['result'])
+        elif args.op == 'stats':
+            print_stats(send_request(args.socket_path, {'op': 'stats'})['result'])
+        elif args.op == 'stop':
+            print_stats(send_request(args.socket_path, {'op': 'stop'})['result'])
+        elif args.op == 'benchmark':
+            benchmark(args.socket_path, args.project_name, args.test_run, args.requests)
+    except DaemonUnavailable as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(DAEMON_UNAVAILABLE)
@@ -0,0 +1,14 @@
+from cucumber_tracker import CucumberTestTracker
+import argparse
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('project_name', type=str)
+    parser.add_argument('test_run', type=str)
+    # Only count the leases of other workers expiring within this many seconds, default any lease
+    parser.add_argument('within', nargs='?', type=float, default=None)
+    args = parser.parse_args()
+
+    # The seconds until the first lease held by another worker expires, empty if there is none
+    seconds = CucumberTestTracker(args.project_name, args.test_run).seconds_to_lease_expiry(within=args.within)
+    print('' if seconds is None else f"{seconds:.0f}")
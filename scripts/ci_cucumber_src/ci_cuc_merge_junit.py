@@ -0,0 +1,206 @@
+import defusedxml.ElementTree as element_tree
+import argparse
+import csv
+import os
+import re
+from pathlib import Path
+from xml.etree.ElementTree import tostring
+from xml.sax.saxutils import quoteattr
+
+# Merges the cucumber-result-* JUnit files into one, the latest result of every location counts
+RESULT_PREFIX = 'cucumber-result-'
+RESULT_NAME_PATTERN = re.compile(rf"^{RESULT_PREFIX}(?:w(?P<worker>\d+)--)?(?P<location>.+?)(?:\.xml)?$")
+TIMING_COLUMNS = ['location', 'scenario', 'duration_seconds', 'status', 'worker', 'attempts']
+PASSED = 'PASSED'
+FAILED = 'FAILED'
+SKIPPED = 'SKIPPED'
+
+
+def result_name(test_location: str) -> str:
+    # The same name ci_cuc_run_by_location gives to the result of a test location
+    name = test_location.split('/')[-1].replace(':', '-')
+    return re.sub(r'.feature', '_feature', name, count=1)
+
+
+def test_case_status(test_case) -> str:
+    if test_case.find('failure') is not None or test_case.find('error') is not None:
+        return FAILED
+    return SKIPPED if test_case.find('skipped') is not None else PASSED
+
+
+def iter_test_suites(xml_path):
+    # Yield (attributes of its test suite, test case), one test case in memory at a time
+    suite, suite_attrib = None, {}
+    for event, element in element_tree.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'testsuite':
+                suite, suite_attrib = element, dict(element.attrib)
+        elif element.tag == 'testcase':
+            yield suite_attrib, element
+            if suite is not None:
+                suite.remove(element)
+
+
+class ResultUnit:
+    """The results of one run of one test location, the unit of the rerun deduplication"""
+
+    def __init__(self, name, files):
+        self.name = name
+        self.files = sorted(files)
+        match = RESULT_NAME_PATTERN.match(name)
+        self.location = match.group('location') if match else None
+        self.worker = (match.group('worker') or '') if match else ''
+        self.mtime_ns = max(os.stat(f).st_mtime_ns for f in self.files)
+        self.attempts = 1
+
+
+def collect_units(result_folder: Path, exclude=()) -> list[ResultUnit]:
+    units = {}
+    for xml_file in result_folder.rglob('*.xml'):
+        if xml_file.resolve() in exclude:
+            continue
+        relative = xml_file.relative_to(result_folder)
+        # The first path component is the result of one run of one location, other xml files stand on their own
+        unit_name = relative.parts[0] if relative.parts[0].startswith(RESULT_PREFIX) else relative.as_posix()
+        units.setdefault(unit_name, []).append(str(xml_file))
+    return [ResultUnit(name, files) for name, files in units.items()]
+
+
+def latest_units(units: list[ResultUnit]) -> list[ResultUnit]:
+    latest = {}
+    standalone = []
+    for unit in sorted(units, key=lambda u: u.mtime_ns):
+        if unit.location is None:
+            standalone.append(unit)
+            continue
+        previous = latest.get(unit.location)
+        unit.attempts = previous.attempts + 1 if previous else 1
+        latest[unit.location] = unit
+    return sorted(list(latest.values()) + standalone, key=lambda u: u.name)
+
+
+def _start_tag(tag, attrib) -> str:
+    return f"<{tag}{''.join(f' {name}={quoteattr(str(value))}' for name, value in attrib.items())}>"
+
+
+def _suite_counts(cases) -> dict:
+    return {
+        'tests': len(cases),
+        'failures': sum(1 for status, _ in cases if status == FAILED),
+        'errors': 0,
+        'skipped': sum(1 for status, _ in cases if status == SKIPPED),
+        'time': round(sum(duration for _, duration in cases), 3)
+    }
+
+
+def merge_results(result_folder, merged_file, timing_file=None) -> dict:
+    result_folder = Path(result_folder)
+    merged_path = Path(merged_file)
+    all_units = collect_units(result_folder, exclude={merged_path.resolve()})
+    units = latest_units(all_units)
+
+    # Pass 1: the status and time of every kept test case, for the timing table and the test suite counts
+    timing_rows = []
+    suite_counts = []
+    for unit in units:
+        for xml_file in unit.files:
+            current, cases = None, []
+            try:
+                for suite_attrib, test_case in iter_test_suites(xml_file):
+                    if current is not suite_attrib:
+                        if current is not None:
+                            suite_counts.append(_suite_counts(cases))
+                        current, cases = suite_attrib, []
+                    status = test_case_status(test_case)
+                    duration = float(test_case.get('time') or 0)
+                    cases.append((status, duration))
+                    timing_rows.append({
+                        'location': unit.location or unit.name, 'scenario': test_case.get('name', ''),
+                        'duration_seconds': round(duration, 3), 'status': status, 'worker': unit.worker,
+                        'attempts': unit.attempts
+                    })
+            except element_tree.ParseError as e:
+                print(f"Error parsing XML file {xml_file}: {e}")
+            if current is not None:
+                suite_counts.append(_suite_counts(cases))
+
+    # Pass 2: write the kept test suites with their recomputed counts, test case by test case
+    totals = {key: sum(counts[key] for counts in suite_counts) for key in ['tests', 'failures', 'errors', 'skipped']}
+    totals['time'] = round(sum(counts['time'] for counts in suite_counts), 3)
+    counts_iter = iter(suite_counts)
+    merged_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = merged_path.with_name(f"{merged_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        out.write(f"{_start_tag('testsuites', {'name': 'ci_cuc merged results', **totals})}\n")
+        for unit in units:
+            for xml_file in unit.files:
+                current = None
+                try:
+                    for suite_attrib, test_case in iter_test_suites(xml_file):
+                        if current is not suite_attrib:
+                            if current is not None:
+                                out.write("  </testsuite>\n")
+                            current = suite_attrib
+                            out.write(f"  {_start_tag('testsuite', {**suite_attrib, **next(counts_iter)})}\n")
+                        test_case.tail = '\n'
+                        out.write(f"    {tostring(test_case, encoding='unicode')}")
+                except element_tree.ParseError:
+                    pass
+                if current is not None:
+                    out.write("  </testsuite>\n")
+        out.write("</testsuites>\n")
+    os.replace(tmp_path, merged_path)
+
+    timing_rows.sort(key=lambda row: row['duration_seconds'], reverse=True)
+    if timing_file:
+        with open(timing_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=TIMING_COLUMNS)
+            writer.writeheader()
+            writer.writerows(timing_rows)
+    return {
+        'result_files': sum(len(unit.files) for unit in all_units),
+        'locations': len(units),
+        'superseded_attempts': len(all_units) - len(units),
+        'test_cases': totals['tests'],
+        'failures': totals['failures'],
+        'timing_rows': timing_rows
+    }
+
+
+def location_durations(timing_rows: list[dict]) -> dict[str, float]:
+    durations = {}
+    for row in timing_rows:
+        durations[row['location']] = durations.get(row['location'], 0.0) + row['duration_seconds']
+    return durations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('project_name', type=str)
+    parser.add_argument('test_run', type=str)
+    parser.add_argument('result_folder', type=str)
+    parser.add_argument('output_folder', type=str)
+    parser.add_argument('--no-tracker-update', action='store_true',
+                        help='do not record the scenario durations in the test run')
+    args = parser.parse_args()
+
+    output_folder = Path(args.output_folder)
+    stats = merge_results(args.result_folder, output_folder / 'junit.xml', output_folder / 'timing.csv')
+    print(f"Merged {stats['result_files']} result files into {output_folder / 'junit.xml'}: {stats['locations']} "
+          f"locations, {stats['test_cases']} test cases, {stats['failures']} failures, "
+          f"{stats['superseded_attempts']} earlier attempts dropped")
+    for row in stats['timing_rows'][:10]:
+        print(f"  {row['duration_seconds']:>9.3f}s  {row['status']:<7}  {row['location']}  {row['scenario']}")
+
+    if not args.no_tracker_update:
+        from cucumber_tracker import CucumberTestTracker
+        ctt = CucumberTestTracker(args.project_name, args.test_run)
+        durations = location_durations(stats['timing_rows'])
+        by_sort_key = {
+            record['test_name_example_row']: durations[result_name(record['test_location'])]
+            for record in ctt.all_tests()
+            if result_name(record['test_location']) in durations
+        }
+        print(f"Recorded the scenario durations of {ctt.record_scenario_durations(by_sort_key)} tests "
+              f"in test run <{args.test_run}>")
@@ -1,21 +1,15 @@
 import secrets
-from cucumber_tracker import CucumberTestTracker, PASSED
+from cucumber_tracker import CucumberTestTracker, PASSED, NOT_RUN, RUNNING, REGISTRY_PRIME_KEY, ConditionFailed
 
 tests = [
     {
-        'scenario_name': 'creds_test a',
+        'scenario_name': f"creds_test {name}",
         'example_row': 'N/A',
         'scenario_outline': False,
-        'test_location': 'dummy_folder/dummy_feature.feature:5',
+        'test_location': f"dummy_folder/dummy_feature.feature:{line}",
         'tags': ['creds_test']
-    },
-    {
-        'scenario_name': 'creds_test b',
-        'example_row': 'N/A',
-        'scenario_outline': False,
-        'test_location': 'dummy_folder/dummy_feature.feature:15',
-        'tags': ['creds_test']
-    },
+    }
+    for name, line in [('a', 5), ('b', 15), ('c', 25)]
 ]
 project_name = 'ci_cuc_dummy_project'
 test_run_name = f"creds_test_{secrets.randbelow(100000)}"
@@ -23,23 +17,59 @@ validated = True
 
 ctt = CucumberTestTracker(project_name, test_run_name)
 
-# Run sync test run to make sure the AWS keys have access to the following operations:
-# dynamodb:Query, dynamodb:PutItem, dynamodb:DeleteItem, dynamodb:BatchDelete,
-ctt.sync_tests_in_test_run(tests)
-print(f"ci_cuc_validate_aws_keys: Successfully created test run: {project_name} under project: {test_run_name}")
-
-# Run update test status to make sure the AWS keys have access to the following operations:
-# dynamodb:UpdateItem,
-updated = ctt.update_test_status('creds_test a', 'N/A', PASSED)
-validated = validated and updated
-if updated:
-    print("ci_cuc_validate_aws_keys: Successfully updated test status for 'creds_test a'")
-else:
-    print("ci_cuc_validate_aws_keys FAILED: Failed to update test status for 'creds_test a'")
 
-# Run delete test run to clean up
-ctt.delete_test_run()
-print(f"ci_cuc_validate_aws_keys: Successfully deleted test run: {project_name} under project: {test_run_name}")
+def check(description, action):
+    # A step passes only if it returns a truthy value. A missing permission raises, so it fails the step
+    global validated
+    try:
+        passed = bool(action())
+    except Exception as e:
+        print(f"ci_cuc_validate_aws_keys: cannot {description}, {type(e).__name__}: {e}")
+        passed = False
+    if passed:
+        print(f"ci_cuc_validate_aws_keys: {description}: OK")
+    else:
+        print(f"ci_cuc_validate_aws_keys FAILED: Failed to {description}")
+    validated = validated and passed
+
+
+def sync_test_run():
+    ctt.sync_tests_in_test_run(tests)
+    return ctt.count_by_status([NOT_RUN]) == len(tests)
+
+
+def transact_failed_condition():
+    # Both tests are RUNNING now, so the condition of the second update fails and cancels the whole transaction
+    try:
+        ctt.db.transact_update_items([
+            {'primary_value': ctt.prime_key_value, 'sorting_value': f"{tests[i]['scenario_name']}:N/A",
+             'update_dict': {'test_status': NOT_RUN}, 'condition_dict': {'test_status': status}}
+            for i, status in [(1, RUNNING), (2, NOT_RUN)]
+        ])
+    except ConditionFailed as e:
+        return e.failed_indexes == {1}
+    return False
+
+
+def summary_counts_passed():
+    summary = ctt.run_summary()
+    return summary is not None and summary['counts'][PASSED] == 1
+
+
+# dynamodb:Query and dynamodb:BatchWriteItem of the test records, the summary item and the run registry
+check(f"create test run: {test_run_name} under project: {project_name}", sync_test_run)
+# dynamodb:GetItem of the run registry partition
+check("register the test run in the run registry",
+      lambda: ctt.db.get_item(REGISTRY_PRIME_KEY, ctt.prime_key_value) is not None)
+# dynamodb:GetItem and dynamodb:UpdateItem, a plain update and an ADD to the summary item
+check("update test status for 'creds_test a'", lambda: ctt.update_test_status('creds_test a', 'N/A', PASSED))
+check("add the status change to the summary item", summary_counts_passed)
+# dynamodb:TransactWriteItems of conditional updates, and the reasons of a cancelled transaction
+check("claim 2 tests in one transaction", lambda: len(ctt.claim_batch(2)) == 2)
+check("read the failed condition of a cancelled transaction", transact_failed_condition)
+# dynamodb:Query and dynamodb:BatchWriteItem deletes, the run registry item included
+check(f"delete test run: {test_run_name} under project: {project_name}",
+      lambda: ctt.delete_test_run() or ctt.db.get_item(REGISTRY_PRIME_KEY, ctt.prime_key_value) is None)
 
 # Final verdict
 if validated:
@@ -1,21 +1,80 @@
+import os
 import secrets
+import socket
+import sys
+import time
 from datetime import datetime
+from decimal import Decimal
+from typing import Optional
 from zoneinfo import ZoneInfo
-from botocore.exceptions import ClientError
-from db_helpers import DBHelpers
+from storage_backend import create_storage, json_default, ConditionFailed, StorageError, TransactionConflict  # noqa: F401
+from report_cache import ReportSnapshotCache
+from test_record import TestRecord, scenario_sort_key
+from tag_expression import TagExpression, is_plain_tag, tag_name
 
 TABLE_NAME = 'pmacc-bdd-result'
+# Global secondary index with project_test_run as partition key and test_status as sort key
+STATUS_INDEX_NAME = 'project_test_run-test_status-index'
+# Index of project_test_run and shard_status ("<shard_id>#<test_status>"), for the claims of a shard
+SHARD_STATUS_INDEX_NAME = 'project_test_run-shard_status-index'
+TRACKER_INDEXES = {'test_status': STATUS_INDEX_NAME, 'shard_status': SHARD_STATUS_INDEX_NAME}
 NOT_RUN = 'NOT_RUN'
 RUNNING = 'RUNNING'
 PASSED = 'PASSED'
 FAILED = 'FAILED'
 NONE = 'N/A'
 STATUSES = [NOT_RUN, RUNNING, FAILED, PASSED]
+MAX_TRANSACT_ITEMS = 100
+# One item per test run with the finished counts and timestamps, claims do not write it
+SUMMARY_SORT_KEY = '__ci_cuc_summary__'
+RUN_SUMMARY = 'run_summary'
+FINISHED_STATUSES = [FAILED, PASSED]
+COUNT_PREFIX = 'count_'
+# Set on the summary item when a finished count could not be added, its counts are then read from the test records
+REPAIR_NEEDED = 'repair_needed'
+MAX_CONFLICT_RETRIES = 5
+# One partition with an item per test run, so listing the test runs does not scan the table
+REGISTRY_PRIME_KEY = '__ci_cuc_run_registry__'
+REGISTRY_COMPLETE_KEY = '__ci_cuc_registry_complete__'
+RUN_REGISTRY = 'run_registry'
+CONFLICT_BACKOFF_SECONDS = 0.05
+# Claim order of the NOT_RUN tests, longest_first hands out the tests with the longest expected duration first
+LONGEST_FIRST = 'longest_first'
+RANDOM = 'random'
+CLAIM_ORDERS = [LONGEST_FIRST, RANDOM]
+# Pick among the few longest tests, so the workers do not all race for the very same test
+CLAIM_WINDOW = 5
+# Weight of the latest duration in the rolling duration estimate
+DURATION_ALPHA = 0.5
+DURATION_FIELDS = ['last_duration', 'duration_estimate', 'scenario_duration']
+# Content hashes of the scenario text and of its step definitions, see feature_scanner.py
+FINGERPRINT_FIELDS = ['scenario_fingerprint', 'step_fingerprint']
+# Runs of a test in the test run, a retry_failed round adds one
+DEFAULT_MAX_TEST_ATTEMPTS = 3
+# The result of a test that keeps its status across a sync, and its shard
+KEPT_RESULT_FIELDS = ['last_update_time', 'test_start_time', 'attempts', 'shard_id', 'shard_status'] + \
+    FINGERPRINT_FIELDS
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# A claimed test is leased to its worker, an expired lease can be claimed again, CI_CUC_LEASE_SECONDS=0 turns it off
+DEFAULT_LEASE_SECONDS = 600
 
 
 def displayable_test_name(test_record: dict) -> str:
     name = test_record['scenario_name']
-    return name if test_record['example_row'] == NONE else f"{name} -- {test_record['example_row']}"
+    name = name if test_record['example_row'] == NONE else f"{name} -- {test_record['example_row']}"
+    attempts = test_attempts(test_record)
+    return name if attempts == 1 else f"{name} (attempt {attempts})"
+
+
+def test_attempts(test_record: dict) -> int:
+    return int(test_record.get('attempts') or 1)
+
+
+def test_sort_key(test_record) -> tuple:
+    # Computed once by a TestRecord, a plain dict needs it computed on every sort
+    sort_key = getattr(test_record, 'sort_key', None)
+    return sort_key if sort_key is not None else scenario_sort_key(test_record['scenario_name'],
+                                                                    test_record['example_row'])
 
 
 def extract_test_run_timestamps(test_records: list[dict]) -> dict[str, str]:
@@ -26,8 +85,180 @@ def extract_test_run_timestamps(test_records: list[dict]) -> dict[str, str]:
     return {'reset_time': max_reset_time, 'finish_time': max_finish_time}
 
 
+def latest_update_time(test_records: list[dict]) -> str:
+    # Unlike the finish time, ignore the N/A of the NOT_RUN tests: this is the time of the latest status change
+    update_times = [r['last_update_time'] for r in test_records if r.get('last_update_time', NONE) != NONE]
+    return max(update_times) if update_times else NONE
+
+
+def status_counts(test_records: list[dict]) -> dict[str, int]:
+    counts = {'total': len(test_records), **{status: 0 for status in STATUSES}}
+    for record in test_records:
+        counts[record['test_status']] += 1
+    return counts
+
+
 def current_timestamp() -> str:
-    return datetime.now(ZoneInfo("America/New_York")).strftime('%Y-%m-%dT%H:%M:%S')
+    return datetime.now(ZoneInfo("America/New_York")).strftime(TIMESTAMP_FORMAT)
+
+
+def elapsed_seconds(start_time: str, end_time: str) -> float:
+    start = datetime.strptime(start_time, TIMESTAMP_FORMAT)
+    end = datetime.strptime(end_time, TIMESTAMP_FORMAT)
+    return max((end - start).total_seconds(), 0.0)
+
+
+def rolling_estimate(previous_estimate, duration: float) -> float:
+    if previous_estimate is None:
+        return duration
+    return DURATION_ALPHA * duration + (1 - DURATION_ALPHA) * float(previous_estimate)
+
+
+def expected_duration(test_record: dict) -> float:
+    # Tests that never finished have no estimate yet, treat them as the longest ones so they start early
+    estimate = test_record.get('duration_estimate')
+    return float('inf') if estimate is None else float(estimate)
+
+
+def longest_first(test_records: list[dict], count: int) -> list[dict]:
+    ranked = sorted(test_records, key=expected_duration, reverse=True)
+    window = ranked[:count + CLAIM_WINDOW]
+    picked = secrets.SystemRandom().sample(window, min(count, len(window)))
+    return sorted(picked, key=expected_duration, reverse=True)
+
+
+def test_key(test_name: str, example_row) -> str:
+    # The test_name_example_row of a test, a scenario without examples has no row
+    row = NONE if example_row in [None, '', '0'] else example_row
+    return f"{test_name}:{row}"
+
+
+def lease_expired(test_record: dict, now: float) -> bool:
+    expire_time = test_record.get('lease_expire_time')
+    return test_record.get('test_status') == RUNNING and expire_time is not None and float(expire_time) < now
+
+
+# Sharding: the NOT_RUN tests are bin-packed by duration into one shard per runner (CI_CUC_SHARDS)
+def packing_durations(test_records: list) -> list[float]:
+    # A test without an estimate counts as long as the average test, it would otherwise land all on one shard
+    known = [float(r['duration_estimate']) for r in test_records if r.get('duration_estimate') is not None]
+    default = sum(known) / len(known) if known else 1.0
+    return [float(r['duration_estimate']) if r.get('duration_estimate') is not None else default
+            for r in test_records]
+
+
+def assign_shards(test_records: list[dict], weights: list[int]) -> list[float]:
+    # Longest processing time first, return the expected seconds per worker of every shard
+    loads = [0.0] * len(weights)
+    ranked = sorted(zip(packing_durations(test_records), range(len(test_records))), reverse=True)
+    for duration, index in ranked:
+        shard = min(range(len(weights)), key=lambda s: (loads[s] + duration) / weights[s])
+        loads[shard] += duration
+        test_records[index]['shard_id'] = shard
+        test_records[index]['shard_status'] = shard_status(shard, test_records[index]['test_status'])
+    return [load / weight for load, weight in zip(loads, weights)]
+
+
+def shard_status(shard_id, status: str) -> str:
+    return f"{int(shard_id)}#{status}"
+
+
+def shard_status_values(test_record: dict, status: str) -> dict:
+    # A status change of a sharded test moves it in the shard status index too
+    if test_record.get('shard_id') is None:
+        return {}
+    return {'shard_status': shard_status(test_record['shard_id'], status)}
+
+
+def shard_weights(value) -> list[int]:
+    return [int(weight) for weight in str(value).split(',') if weight.strip()] if value else []
+
+
+def claim_condition(test_record: dict) -> dict:
+    # A RUNNING test is only claimed if its expired lease was neither renewed nor claimed by another worker meanwhile
+    if test_record.get('test_status') == RUNNING:
+        return {'test_status': RUNNING, 'lease_expire_time': test_record['lease_expire_time']}
+    return {'test_status': NOT_RUN}
+
+
+def run_summary_item(prime_key_value: str, project: str, test_run_name: str, test_records: list[dict]) -> dict:
+    counts = status_counts(test_records)
+    return {
+        'project_test_run': prime_key_value, 'test_name_example_row': SUMMARY_SORT_KEY, 'record_type': RUN_SUMMARY,
+        'project': project, 'test_run_name': test_run_name,
+        'test_run_reset_time': extract_test_run_timestamps(test_records)['reset_time'],
+        'latest_update_time': latest_update_time(test_records), 'test_count': counts['total'],
+        **{f"{COUNT_PREFIX}{status}": counts[status] for status in FINISHED_STATUSES}
+    }
+
+
+def registry_item(prime_key_value: str, reset_time=NONE) -> dict:
+    project, _, test_run_name = prime_key_value.partition('/')
+    return {
+        'project_test_run': REGISTRY_PRIME_KEY, 'test_name_example_row': prime_key_value, 'record_type': RUN_REGISTRY,
+        'project': project, 'test_run_name': test_run_name, 'test_run_reset_time': reset_time
+    }
+
+
+def summary_from_item(item: dict, running: int) -> dict:
+    # Same counts and timestamps as json_test_result. The run is only finished once no test is NOT_RUN
+    counts = {status: int(item.get(f"{COUNT_PREFIX}{status}", 0)) for status in FINISHED_STATUSES}
+    total = int(item.get('test_count', 0))
+    counts = {'total': total, NOT_RUN: max(0, total - sum(counts.values()) - running), RUNNING: running, **counts}
+    finished = counts['total'] > 0 and counts[NOT_RUN] == 0
+    return {
+        'reset_time': item.get('test_run_reset_time', NONE),
+        'finish_time': item.get('latest_update_time', NONE) if finished else NONE,
+        'latest_update_time': item.get('latest_update_time', NONE),
+        'counts': counts
+    }
+
+
+def summary_version(summary: dict) -> str:
+    # Changes with every status change and every reset of the test run, see report_cache.py
+    counts = ','.join(str(summary['counts'][status]) for status in STATUSES)
+    return f"{summary['reset_time']}|{summary['latest_update_time']}|{counts}"
+
+
+def status_delta(from_status: str, to_status: str, count=1) -> dict:
+    # The move of the finished counts only
+    if from_status == to_status or count == 0:
+        return {}
+    delta = {f"{COUNT_PREFIX}{from_status}": -count} if from_status in FINISHED_STATUSES else {}
+    if to_status in FINISHED_STATUSES:
+        delta[f"{COUNT_PREFIX}{to_status}"] = count
+    return delta
+
+
+class TagIndex:
+    """
+    The test records of one query result by tag, built in one pass over the records.
+    A tag lookup is then one dict access, instead of a scan of every record and its tag list
+    """
+
+    def __init__(self, test_records: list[dict]):
+        self.source = test_records
+        self.records = sorted(test_records, key=test_sort_key)
+        self.records_by_tag: dict[str, list[dict]] = {}
+        # {tag: {scenario_name: number of examples}}, the scenarios in the order of the sorted records
+        self.scenario_counts: dict[str, dict[str, int]] = {}
+        for record in self.records:
+            for tag in dict.fromkeys(record.get('scenario_tags', [])):
+                self.records_by_tag.setdefault(tag, []).append(record)
+                counts = self.scenario_counts.setdefault(tag, {})
+                counts[record['scenario_name']] = counts.get(record['scenario_name'], 0) + 1
+
+    def tests_by_tags(self, tag_list) -> list[dict]:
+        # Sorted like the records, a test with several of the tags is returned once
+        if all(is_plain_tag(tag) for tag in tag_list):
+            tags = [tag_name(tag) for tag in tag_list]
+            matched = {id(record): record for tag in tags for record in self.records_by_tag.get(tag, [])}
+            return sorted(matched.values(), key=test_sort_key)
+        tag_filter = TagExpression.from_tags(tag_list)
+        return [record for record in self.records if tag_filter.matches(record.get('scenario_tags', []))]
+
+    def scenarios_by_tag(self, tag) -> dict[str, int]:
+        return self.scenario_counts.get(tag, {})
 
 
 def scenario_info_same(record1: dict, record2: dict) -> bool:
@@ -36,13 +267,37 @@ def scenario_info_same(record1: dict, record2: dict) -> bool:
     return all(record1[field] == record2[field] for field in fields)
 
 
+def fingerprints_same(db_record, record: dict) -> bool:
+    # A test without fingerprints, stored before they were, cannot be compared and counts as changed
+    return 'scenario_fingerprint' in db_record and all(
+        db_record.get(field) == record[field] for field in FINGERPRINT_FIELDS if field in record)
+
+
 class CucumberTestTracker:
-    def __init__(self, project, test_run_name):
+    def __init__(self, project, test_run_name, claim_order=None, db=None, lease_seconds=None, worker_id=None,
+                 shard=None):
         self.project = project
         self.test_run_name = test_run_name
+        self.claim_order = claim_order or os.getenv('CI_CUC_CLAIM_ORDER', LONGEST_FIRST)
+        if self.claim_order not in CLAIM_ORDERS:
+            raise Exception(f"Unknown claim order: {self.claim_order}, expect {CLAIM_ORDERS}")
+        self.lease_seconds = int(lease_seconds if lease_seconds is not None
+                                 else os.getenv('CI_CUC_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+        # The owner of the leases claimed through this tracker, the daemon passes the worker of each request instead
+        self.worker_id = worker_id or os.getenv('CI_CUC_WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+        # Only a worker given by name can prove it holds a lease, the default id changes with every process
+        self.named_worker = bool(worker_id or os.getenv('CI_CUC_WORKER_ID'))
+        # The shard this worker claims from first, None claims from the whole test run
+        shard = shard if shard is not None else os.getenv('CI_CUC_SHARD', '')
+        self.shard = int(shard) if str(shard).strip() else None
         self.prime_key_value = f"{self.project}/{self.test_run_name}"
-        self.db = DBHelpers(TABLE_NAME, 'project_test_run', 'test_name_example_row')
+        # Trackers of several test runs can share one storage backend, and so one DynamoDB client
+        self.db = db or create_storage(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES)
         self.db_records = []
+        self._tag_index = None
+        self.report_cache = ReportSnapshotCache()
+        # False once the test run turned out to have no summary item (created before there was one), see repair
+        self.has_summary = True
 
     def delete_test_run(self):
         keys_to_delete = [
@@ -52,36 +307,134 @@ class CucumberTestTracker:
             }
             for record in self._query_test_cases(force_query=True)
         ]
-        self.db.batch_delete(keys_to_delete)
+        keys_to_delete.append({'project_test_run': self.prime_key_value, 'test_name_example_row': SUMMARY_SORT_KEY})
+        keys_to_delete.append({'project_test_run': REGISTRY_PRIME_KEY, 'test_name_example_row': self.prime_key_value})
+        self.db.bulk_write(delete_keys=keys_to_delete)
+        self.report_cache.invalidate(self.prime_key_value)
         print(f"Deleted test run '{self.prime_key_value}' from table '{TABLE_NAME}'.")
 
     def _query_test_cases(self, force_query=False):
         if len(self.db_records) > 0 and not force_query:
             return self.db_records
-        return self.db.query_by_prime_key(self.prime_key_value)
+        return [
+            TestRecord(item) for item in self.db.query_items(self.prime_key_value)
+            if item['test_name_example_row'] != SUMMARY_SORT_KEY
+        ]
+
+    def load_records(self):
+        # Query the test run once, the reports are then built from these records without querying again
+        self.db_records = self._query_test_cases(force_query=True)
+        return self.db_records
 
     def all_tests(self):
         results = self._query_test_cases()
         return sorted(
             results,
-            key=lambda r: f"{r['scenario_name']}:{str(r['example_row']):0>2}"
+            key=test_sort_key
         )
 
     def tests_by_status(self, status_list):
-        results = self._query_test_cases()
-        filtered = [r for r in results if r.get('test_status') in status_list]
+        if all(status in status_list for status in STATUSES):
+            filtered = self._query_test_cases()
+        else:
+            filtered = list(self._iter_tests_by_status(status_list))
         return sorted(
             filtered,
-            key=lambda r: f"{r['scenario_name']}:{str(r['example_row']):0>2}"
+            key=test_sort_key
         )
 
+    def _iter_tests_by_status(self, status_list, attributes=None):
+        # With the status index only the records with the given statuses are read
+        for item in self.db.query_items(self.prime_key_value, {'test_status': list(status_list)}, attributes):
+            yield TestRecord(item)
+
+    def count_by_status(self, status_list) -> int:
+        item = self._summary_item()
+        if item is not None:
+            running = self._count_running() if set(status_list) - set(FINISHED_STATUSES) else 0
+            counts = summary_from_item(item, running)['counts']
+            return sum(counts[status] for status in set(status_list))
+        # Counted by the storage. Filtered by status even for all of them, so the summary item is not counted
+        return self.db.count_items(self.prime_key_value, {'test_status': list(status_list)})
+
+    def _count_running(self) -> int:
+        return self.db.count_items(self.prime_key_value, {'test_status': [RUNNING]})
+
+    def _summary_item(self) -> Optional[dict]:
+        # None without a summary item, or while it is marked for repair
+        item = self.db.get_item(self.prime_key_value, SUMMARY_SORT_KEY)
+        self.has_summary = item is not None
+        return item if item is not None and REPAIR_NEEDED not in item else None
+
+    def run_summary(self) -> Optional[dict]:
+        # The counts by status and the timestamps, from the summary item and a count of the RUNNING tests
+        item = self._summary_item()
+        return summary_from_item(item, self._count_running()) if item is not None else None
+
+    def repair_run_summary(self) -> dict:
+        # Count the test records again and overwrite the summary item
+        item = run_summary_item(self.prime_key_value, self.project, self.test_run_name,
+                                self._query_test_cases(force_query=True))
+        self.db.bulk_write(put_items=[item])
+        self.has_summary = True
+        self.report_cache.invalidate(self.prime_key_value)
+        return summary_from_item(item, self._count_running())
+
+    def _update_with_summary(self, updates, summary_delta, timestamp):
+        # Update the test records, then ADD the moved counts to the summary item
+        self._retry_conflicts(lambda: self._update_records(updates))
+        if summary_delta and self.has_summary:
+            self._add_to_summary(summary_delta, timestamp)
+
+    def _update_records(self, updates):
+        if len(updates) == 1:
+            update = updates[0]
+            try:
+                self.db.update_item(update['primary_value'], update['sorting_value'], update['update_dict'],
+                                    update.get('condition_dict'))
+            except ConditionFailed as e:
+                # Same as a transaction of the one update
+                raise ConditionFailed(str(e), {0})
+        else:
+            self.db.transact_update_items(updates)
+
+    def _add_to_summary(self, summary_delta, timestamp):
+        # Best effort, after the test records are written: a failure marks the summary item for repair
+        try:
+            self._retry_conflicts(lambda: self.db.update_item(
+                self.prime_key_value, SUMMARY_SORT_KEY, {'latest_update_time': timestamp},
+                {'record_type': RUN_SUMMARY}, summary_delta))
+        except ConditionFailed:
+            self.has_summary = False
+        except StorageError as e:
+            print(f"The summary item of {self.prime_key_value} is marked for repair: {e}", file=sys.stderr)
+            try:
+                self.db.update_item(self.prime_key_value, SUMMARY_SORT_KEY, {REPAIR_NEEDED: timestamp},
+                                    {'record_type': RUN_SUMMARY})
+            except StorageError as marker_error:
+                print(f"Cannot mark the summary item of {self.prime_key_value} for repair: {marker_error}",
+                      file=sys.stderr)
+
+    @staticmethod
+    def _retry_conflicts(write):
+        for attempt in range(MAX_CONFLICT_RETRIES + 1):
+            try:
+                return write()
+            except TransactionConflict:
+                # Other workers changed one of the items at the same time
+                if attempt == MAX_CONFLICT_RETRIES:
+                    raise
+                time.sleep(secrets.SystemRandom().uniform(0, CONFLICT_BACKOFF_SECONDS * 2 ** attempt))
+
     def tests_by_tags(self, tag_list):
+        return self.tag_index().tests_by_tags(tag_list)
+
+    def tag_index(self) -> TagIndex:
+        # Built once per query result: reused while the loaded records are, rebuilt from a new query otherwise
         results = self._query_test_cases()
-        filtered = [r for r in results if any(tag in r.get('scenario_tags', []) for tag in tag_list)]
-        return sorted(
-            filtered,
-            key=lambda r: f"{r['scenario_name']}:{str(r['example_row']):0>2}"
-        )
+        if self._tag_index is None or self._tag_index.source is not results:
+            self._tag_index = TagIndex(results)
+        return self._tag_index
 
     def random_test_by_status(self, status_list):
         try:
@@ -90,12 +443,180 @@ class CucumberTestTracker:
         except Exception as e:
             return f"error: cannot get tests by status - {str(e)}"
 
+    def tests_to_claim(self, count):
+        # The own shard first, the whole test run once the shard is empty
+        if self.shard is not None:
+            own = self.claimable_tests(self.shard)
+            if own:
+                return self.pick_tests_to_claim(own, count)
+            candidates = self.claimable_tests()
+            if any(c.get('shard_id') is not None for c in candidates):
+                return self.steal_tests(candidates, count)
+            return self.pick_tests_to_claim(candidates, count)
+        return self.pick_tests_to_claim(self.claimable_tests(), count)
+
+    def pick_tests_to_claim(self, candidates, count):
+        if self.claim_order == LONGEST_FIRST:
+            return longest_first(candidates, count)
+        return secrets.SystemRandom().sample(candidates, min(count, len(candidates)))
+
+    def steal_tests(self, candidates, count):
+        # The shortest tests of the busiest shard, its own workers take the longest first
+        shards = {}
+        for candidate, duration in zip(candidates, packing_durations(candidates)):
+            shards.setdefault(candidate.get('shard_id'), []).append((duration, candidate))
+        busiest = max(shards.values(), key=lambda tests: sum(duration for duration, _ in tests))
+        busiest.sort(key=lambda test: test[0])
+        return [candidate for _, candidate in busiest[:count]]
+
+    def claimable_tests(self, shard=None):
+        # The NOT_RUN tests, once there is none the RUNNING tests with an expired lease
+        records = self._tests_with_status(NOT_RUN, shard)
+        now = time.time()
+        if not records and self.lease_seconds > 0:
+            records = self._tests_with_status(RUNNING, shard, below={'lease_expire_time': now})
+        # The status is checked again, a test whose status was set without its record at hand keeps its shard status
+        return [r for r in records if r['test_status'] == NOT_RUN or lease_expired(r, now)]
+
+    def _tests_with_status(self, status, shard=None, attributes=None, below=None) -> list[dict]:
+        # Through the status index, or the shard status index with a shard
+        filters = {'test_status': [status]} if shard is None else {'shard_status': [shard_status(shard, status)]}
+        return [TestRecord(item) for item in self.db.query_items(self.prime_key_value, filters, attributes, below)]
+
+    def _lease_values(self, owner=None):
+        if self.lease_seconds <= 0:
+            return {}
+        return {'lease_owner': owner or self.worker_id, 'lease_expire_time': int(time.time()) + self.lease_seconds}
+
+    def _claim_values(self, owner=None):
+        timestamp = current_timestamp()
+        values = {'test_status': RUNNING, 'last_update_time': timestamp, 'test_start_time': timestamp}
+        values.update(self._lease_values(owner))
+        return values
+
+    def claim_not_run_test(self, max_attempts=100, owner=None):
+        attempt = 0
+        while attempt < max_attempts:
+            try:
+                picked = self.tests_to_claim(1)
+                if len(picked) == 0:
+                    break
+                test = picked[0]
+                # A claim does not change the finished counts, the summary item is left alone
+                self.db.update_item(self.prime_key_value, test['test_name_example_row'],
+                                    {**self._claim_values(owner), **shard_status_values(test, RUNNING)},
+                                    claim_condition(test))
+                self.report_cache.invalidate(self.prime_key_value)
+                return test
+            except Exception:
+                attempt += 1
+        return {}
+
+    def claim_batch(self, count, max_attempts=10, owner=None):
+        # Move up to <count> claimable tests to RUNNING with one transactional write per round trip
+        claimed = []
+        attempt = 0
+        while len(claimed) < count and attempt < max_attempts:
+            picked = self.tests_to_claim(min(count - len(claimed), MAX_TRANSACT_ITEMS))
+            if len(picked) == 0:
+                break
+            while picked:
+                try:
+                    lost = self._transact_claim(picked, owner)
+                except TransactionConflict:
+                    # Other workers kept claiming the same tests through every retry, pick again from a new query
+                    break
+                if not lost:
+                    claimed.extend(picked)
+                    break
+                # Another worker got some of the picked tests first, retry the rest without querying again
+                picked = [test for i, test in enumerate(picked) if i not in lost]
+            attempt += 1
+        if claimed:
+            self.report_cache.invalidate(self.prime_key_value)
+        return claimed
+
+    def _transact_claim(self, tests, owner=None) -> set[int]:
+        values = self._claim_values(owner)
+        updates = [
+            {
+                'primary_value': self.prime_key_value,
+                'sorting_value': test['test_name_example_row'],
+                'update_dict': {**values, **shard_status_values(test, RUNNING)},
+                'condition_dict': claim_condition(test)
+            }
+            for test in tests
+        ]
+        try:
+            self._retry_conflicts(lambda: self._update_records(updates))
+            return set()
+        except ConditionFailed as e:
+            return e.failed_indexes
+
+    def renew_leases(self, keys, owner=None) -> list[str]:
+        # Push back the lease of each held test, return the keys still held
+        owner = owner or self.worker_id
+        if self.lease_seconds <= 0:
+            return list(keys)
+        held = []
+        for key in keys:
+            try:
+                self.db.update_item(self.prime_key_value, key, self._lease_values(owner),
+                                    {'test_status': RUNNING, 'lease_owner': owner})
+                held.append(key)
+            except ConditionFailed:
+                pass
+            except StorageError:
+                # Still held, the next heartbeat tries again
+                held.append(key)
+        return held
+
+    def seconds_to_lease_expiry(self, owner=None, within=None) -> Optional[float]:
+        # Seconds until the first lease of another worker expiring within <within> seconds expires, or None
+        owner = owner or self.worker_id
+        if self.lease_seconds <= 0:
+            return None
+        now = time.time()
+        within = self.lease_seconds if within is None else within
+        expire_times = [
+            float(test['lease_expire_time'])
+            for test in self._tests_with_status(RUNNING, attributes=['lease_owner', 'lease_expire_time'],
+                                                below={'lease_expire_time': now + within})
+            if test.get('lease_owner') != owner
+        ]
+        return max(0.0, min(expire_times) - now) if expire_times else None
+
     def test_run_passed(self):
+        item = self._summary_item()
+        if item is not None:
+            counts = summary_from_item(item, 0)['counts']
+            return counts[PASSED] == counts['total']
+        # Stop at the first test that has not passed, and read only its key
+        not_passed = self._iter_tests_by_status([s for s in STATUSES if s != PASSED], ['test_name_example_row'])
+        return next(not_passed, None) is None
+
+    def report_snapshot(self, use_cache=True) -> dict:
+        # Everything the reports need, from one query, cached by the version of the test run
+        summary = self.run_summary() if self.report_cache.enabled else None
+        version = summary_version(summary) if summary is not None else None
+        snapshot = self.report_cache.load(self.prime_key_value, version) if use_cache else None
+        if snapshot is not None:
+            return snapshot
         report = self.tests_by_status(STATUSES)
-        return all(r.get('test_status') == PASSED for r in report)
+        snapshot = {
+            'prime_key': self.prime_key_value,
+            'version': version,
+            'created_at': time.time(),
+            'latest_update_time': latest_update_time(report),
+            'passed': all(r.get('test_status') == PASSED for r in report),
+            'result': self.json_test_result(report)
+        }
+        self.report_cache.save(snapshot)
+        return snapshot
 
-    def json_test_result(self):
-        report = self.tests_by_status(STATUSES)
+    def json_test_result(self, report=None):
+        if report is None:
+            report = self.tests_by_status(STATUSES)
         timestamps = extract_test_run_timestamps(report)
         final_result = {
             'title': f"Test Result for {self.project} test run <{self.test_run_name}>",
@@ -103,16 +624,21 @@ class CucumberTestTracker:
             'finish_time': timestamps['finish_time'],
             'timestamp': f"Reset At: {timestamps['reset_time']},  Finish At: {timestamps['finish_time']}",
             'summary': [f"Total: {len(report)}"],
+            'counts': status_counts(report),
             'detail_result': {status: [] for status in STATUSES}
         }
         for item in report:
             final_result['detail_result'][item['test_status']].append(displayable_test_name(item))
         for status in STATUSES:
-            final_result['summary'].append(f"{status}: {len(final_result['detail_result'][status])}")
+            final_result['summary'].append(f"{status}: {final_result['counts'][status]}")
+        # The tests that passed on a retry
+        flaky = sum(1 for item in report if item['test_status'] == PASSED and test_attempts(item) > 1)
+        if flaky:
+            final_result['summary'].append(f"FLAKY: {flaky}")
         return final_result
 
-    def markdown_test_result(self, show_detail=None):
-        raw = self.json_test_result()
+    def markdown_test_result(self, show_detail=None, raw=None):
+        raw = raw or self.report_snapshot()['result']
         report_txt = f"## **{raw['title']}**\n"
         report_txt += f"### **Reset At**: {raw['reset_time']}, **Finish At**: {raw['finish_time']}\n"
         report_txt += f"### {' &nbsp; &nbsp; &nbsp;'.join(raw['summary'])}"
@@ -126,8 +652,8 @@ class CucumberTestTracker:
         report_txt += "\n"
         return report_txt
 
-    def plain_text_test_result(self, show_detail=None):
-        raw = self.json_test_result()
+    def plain_text_test_result(self, show_detail=None, raw=None):
+        raw = raw or self.report_snapshot()['result']
         report_txt = f"\n**** {raw['title']} ***\n\n{raw['timestamp']}\n\n{'   '.join(raw['summary'])}"
         for status, test_list in raw['detail_result'].items():
             if len(test_list) > 0:
@@ -138,43 +664,149 @@ class CucumberTestTracker:
                     report_txt += f"The list of {len(test_list)} {status} tests is hidden"
         return report_txt
 
-    def update_test_status(self, test_name, example_row, status, from_status='', print_log=True):
-        row = NONE if example_row in [None, '', '0'] else example_row
+    def retry_failed(self, max_attempts=None, statuses=None) -> dict:
+        # Move the FAILED and left over RUNNING tests back to NOT_RUN, up to max_attempts runs
+        if max_attempts is None:
+            max_attempts = int(os.getenv('CI_CUC_MAX_TEST_ATTEMPTS', DEFAULT_MAX_TEST_ATTEMPTS))
+        tests = list(self._iter_tests_by_status(
+            statuses or [RUNNING, FAILED],
+            ['test_name_example_row', 'test_status', 'last_update_time', 'attempts', 'shard_id']))
+        to_retry = [test for test in tests if test_attempts(test) < max_attempts]
+        retried = 0
+        for start in range(0, len(to_retry), MAX_TRANSACT_ITEMS):
+            chunk = to_retry[start:start + MAX_TRANSACT_ITEMS]
+            while chunk:
+                lost = self._transact_retry(chunk)
+                if not lost:
+                    retried += len(chunk)
+                    break
+                # Changed since they were read, e.g. retried by another job, leave them
+                chunk = [test for i, test in enumerate(chunk) if i not in lost]
+        if retried:
+            self.report_cache.invalidate(self.prime_key_value)
+        print(f"retry_failed: {retried} tests moved to {NOT_RUN}, "
+              f"{len(tests) - len(to_retry)} tests already ran {max_attempts} times")
+        return {'retried': retried, 'exhausted': len(tests) - len(to_retry)}
+
+    def _transact_retry(self, tests) -> set[int]:
+        timestamp = current_timestamp()
+        updates = [
+            {
+                'primary_value': self.prime_key_value,
+                'sorting_value': test['test_name_example_row'],
+                'update_dict': {'test_status': NOT_RUN, 'last_update_time': NONE, 'attempts': test_attempts(test) + 1,
+                                **shard_status_values(test, NOT_RUN)},
+                'condition_dict': {'test_status': test['test_status'], 'last_update_time': test['last_update_time']}
+            }
+            for test in tests
+        ]
+        summary_delta = {}
+        for test in tests:
+            for key, value in status_delta(test['test_status'], NOT_RUN).items():
+                summary_delta[key] = summary_delta.get(key, 0) + value
+        try:
+            self._update_with_summary(updates, summary_delta, timestamp)
+            return set()
+        except ConditionFailed as e:
+            return e.failed_indexes
+
+    def update_test_status(self, test_name, example_row, status, from_status='', print_log=True, owner=None):
         status = status.upper()
         if status not in STATUSES:
             raise Exception(f"Unknown test status: {status}")
         if from_status and from_status not in STATUSES:
             raise Exception(f"Unknown test status: {status}")
 
-        sort_key_value = f"{test_name}:{row}"
+        sort_key_value = test_key(test_name, example_row)
         new_values = {
             'test_status': status,
             'last_update_time': current_timestamp()
         }
-        condition = {'test_status': from_status.upper()} if from_status else None
+        # The record gives the status the test moves from, for the summary counts, and its shard
+        record = self.db.get_item(self.prime_key_value, sort_key_value)
+        if record is None:
+            if print_log:
+                print(f"Failed to set status {status} for {sort_key_value}. The test is not in the test run.")
+            return False
+        condition = {'test_status': from_status.upper() if from_status else record['test_status']}
+        new_values.update(shard_status_values(record, status))
+        if status == RUNNING:
+            new_values['test_start_time'] = new_values['last_update_time']
+            new_values.update(self._lease_values())
+        elif from_status.upper() == RUNNING:
+            duration_values, start_condition = self._duration_update(record, new_values['last_update_time'])
+            new_values.update(duration_values)
+            condition.update(start_condition)
+            # A worker whose lease expired must not overwrite the result of the worker that claimed the test again
+            if self.lease_seconds > 0 and (owner or self.named_worker):
+                condition['lease_owner'] = owner or self.worker_id
 
         try:
-            self.db.update_item(
-                self.prime_key_value,
-                sort_key_value,
-                new_values,
-                condition
+            self._update_with_summary(
+                [{'primary_value': self.prime_key_value, 'sorting_value': sort_key_value,
+                  'update_dict': new_values, 'condition_dict': condition}],
+                status_delta(condition['test_status'], status), new_values['last_update_time']
             )
+            self.report_cache.invalidate(self.prime_key_value)
             if print_log:
                 print(f"Successfully set status {status} for {sort_key_value}")
             return True
 
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                if print_log:
-                    print(
-                        f"Failed to set status {status} for {sort_key_value}. Condition not met (status was not {from_status.upper()}).")
-            else:
-                if print_log:
-                    print(f"Error updating DynamoDB: {e.response['Error']['Message']}")
+        except ConditionFailed:
+            if print_log:
+                lease = f" or the lease is not held by {condition['lease_owner']}" if 'lease_owner' in condition else ''
+                print(
+                    f"Failed to set status {status} for {sort_key_value}. Condition not met (status was not {condition['test_status']}{lease}).")
+            return False
+        except StorageError as e:
+            if print_log:
+                print(f"Error updating test status storage: {e}")
             return False
 
-    def sync_tests_in_test_run(self, tests, reset_statuses=None, new_status=NOT_RUN):
+    def _duration_update(self, record, finish_time):
+        # Finishing a RUNNING test, conditional on its start time so a re-claim is not mixed up
+        if not record or record.get('test_start_time', NONE) == NONE:
+            return {}, {}
+        duration = elapsed_seconds(record['test_start_time'], finish_time)
+        estimate = rolling_estimate(record.get('duration_estimate'), duration)
+        return (
+            {'last_duration': Decimal(str(round(duration, 1))), 'duration_estimate': Decimal(str(round(estimate, 1)))},
+            {'test_start_time': record['test_start_time']}
+        )
+
+    def record_scenario_durations(self, durations: dict[str, float]) -> int:
+        # Durations from the JUnit results, keyed by test_name_example_row
+        updates = []
+        for record in self._query_test_cases(force_query=True):
+            duration = durations.get(record['test_name_example_row'])
+            if duration is None:
+                continue
+            values = {'scenario_duration': Decimal(str(round(duration, 1)))}
+            if record.get('duration_estimate') is None:
+                values['duration_estimate'] = values['scenario_duration']
+            elif record.get('scenario_duration') == values['scenario_duration']:
+                continue
+            # Conditional on the status just read, so a deleted or reset record is not brought back
+            updates.append({'primary_value': self.prime_key_value, 'sorting_value': record['test_name_example_row'],
+                            'update_dict': values, 'condition_dict': {'test_status': record['test_status']}})
+        updated = 0
+        for start in range(0, len(updates), MAX_TRANSACT_ITEMS):
+            chunk = updates[start:start + MAX_TRANSACT_ITEMS]
+            while chunk:
+                try:
+                    self._retry_conflicts(lambda: self._update_records(chunk))
+                    updated += len(chunk)
+                    break
+                except ConditionFailed as e:
+                    # Changed since they were read, leave them
+                    chunk = [update for i, update in enumerate(chunk) if i not in e.failed_indexes]
+                except StorageError as e:
+                    print(f"Cannot record the durations of {len(chunk)} tests: {e}", file=sys.stderr)
+                    break
+        return updated
+
+    def sync_tests_in_test_run(self, tests, reset_statuses=None, new_status=NOT_RUN, impact=False, shards=None):
+        # With impact, kept tests whose scenario or steps changed are reset too. With shards, see assign_shards
         if reset_statuses is None:
             reset_statuses = [RUNNING, FAILED, PASSED]
         if len(tests) == 0:
@@ -183,16 +815,27 @@ class CucumberTestTracker:
         db_records = {r['test_name_example_row']: r for r in self._query_test_cases(force_query=True)}
         new_records = self._tests_to_db_records(tests, new_status, current_timestamp())
         records_to_update = []
+        impacted = 0
         for key, record in new_records.items():
             db_record = db_records.get(key)
+            # Keep the recorded durations across resets, the claim order depends on them
+            if db_record is not None:
+                record.update({field: db_record[field] for field in DURATION_FIELDS if field in db_record})
             # If this new record cannot be found in db, or find in db, but the status is in the list of reset status, this record needs to be updated
             if db_record is None or db_record['test_status'] in reset_statuses:
                 records_to_update.append(record)
+            elif impact and not fingerprints_same(db_record, record):
+                impacted += db_record['test_status'] != new_status
+                records_to_update.append(record)
             # If this record can be found in db, and the db status is also good, But the test case info has changed, also need to be updated
             elif not scenario_info_same(db_record, record):
                 record['test_status'] = db_record['test_status']
+                for field in KEPT_RESULT_FIELDS:
+                    if field in db_record:
+                        record[field] = db_record[field]
+                    else:
+                        record.pop(field, None)
                 records_to_update.append(record)
-        self.db.batch_put(records_to_update)
         keys_to_delete = [
             {
                 'project_test_run': self.prime_key_value,
@@ -201,7 +844,19 @@ class CucumberTestTracker:
             for sort_key in db_records
             if sort_key not in new_records
         ]
-        self.db.batch_delete(keys_to_delete)
+        # The summary item is rebuilt from the records as they are after this write
+        final_records = {**{key: db_records[key] for key in db_records if key in new_records},
+                         **{record['test_name_example_row']: record for record in records_to_update}}
+        # An unsharded reset puts every NOT_RUN test in shard 0, so no test keeps the shard of an earlier reset
+        records_to_update += self._shard_tests(final_records, records_to_update, shard_weights(shards) or [1])
+        summary = run_summary_item(self.prime_key_value, self.project, self.test_run_name, list(final_records.values()))
+        registry = registry_item(self.prime_key_value, summary['test_run_reset_time'])
+        self.db.bulk_write(put_items=records_to_update + [summary, registry], delete_keys=keys_to_delete)
+        self.has_summary = True
+        self.report_cache.invalidate(self.prime_key_value)
+        print(f"sync_tests_in_test_run: {len(records_to_update)} records updated, {len(keys_to_delete)} records deleted")
+        if impact:
+            print(f"sync_tests_in_test_run: {impacted} tests reset by changes to their scenario or step definitions")
 
         # self.
         # for this_new_record in new_records:
@@ -221,6 +876,21 @@ class CucumberTestTracker:
         # records_to_delete = db_records.select { |r| !new_sorting_keys.include?(r['test_name_example_row']) }
         # delete_unupdated_records(records_to_delete)
 
+    def _shard_tests(self, final_records: dict, records_to_update: list, weights: list[int]) -> list[dict]:
+        # Assign a shard to every NOT_RUN test, and return the tests not written yet whose shard changed
+        written = {id(record) for record in records_to_update}
+        not_run = [record if id(record) in written else dict(record)
+                   for record in final_records.values() if record['test_status'] == NOT_RUN]
+        previous = [(record.get('shard_id'), record.get('shard_status')) for record in not_run]
+        seconds = assign_shards(not_run, weights)
+        if len(weights) > 1:
+            print(f"sync_tests_in_test_run: {len(not_run)} tests in {len(weights)} shards, "
+                  f"expected seconds per worker {[round(s) for s in seconds]}")
+        return [
+            record for record, shard in zip(not_run, previous)
+            if id(record) not in written and shard != (record['shard_id'], record['shard_status'])
+        ]
+
     def _tests_to_db_records(self, test_list, status, reset_time):
         return {
             f"{scn['scenario_name']}:{scn['example_row']}": {
@@ -228,18 +898,47 @@ class CucumberTestTracker:
                 'test_name_example_row': f"{scn['scenario_name']}:{scn['example_row']}", 'last_update_time': NONE,
                 'scenario_name': scn['scenario_name'], 'example_row': scn['example_row'],
                 'scenario_outline': scn['scenario_outline'], 'test_location': scn['test_location'],
-                'test_status': status, 'test_run_reset_time': reset_time, 'scenario_tags': scn.get('tags', [])
+                'test_status': status, 'test_run_reset_time': reset_time, 'scenario_tags': scn.get('tags', []),
+                **({'scenario_fingerprint': scn['fingerprint']} if 'fingerprint' in scn else {}),
+                **({'step_fingerprint': scn['step_fingerprint']} if 'step_fingerprint' in scn else {})
             }
             for scn in test_list
         }
 
 
 class CucumberTestRuns:
-    def __init__(self):
-        self.db = DBHelpers(TABLE_NAME, 'project_test_run', 'test_name_example_row')
+    def __init__(self, db=None):
+        self.db = db or create_storage(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES)
+        self._test_runs = None
+
+    def registered_runs(self) -> Optional[list[str]]:
+        # The prime keys of the test runs in the run registry, None until the registry is complete
+        keys = [item['test_name_example_row']
+                for item in self.db.query_items(REGISTRY_PRIME_KEY, attributes=['test_name_example_row'])]
+        if REGISTRY_COMPLETE_KEY not in keys:
+            return None
+        return sorted(key for key in keys if key != REGISTRY_COMPLETE_KEY)
+
+    def scanned_runs(self) -> list[str]:
+        return [key for key in self.db.all_prime_keys() if key != REGISTRY_PRIME_KEY]
+
+    def backfill_registry(self) -> int:
+        # Register every test run found by a scan, then mark the registry complete. Safe to run again
+        prime_keys = self.scanned_runs()
+        items = [registry_item(prime_key) for prime_key in prime_keys]
+        items.append({'project_test_run': REGISTRY_PRIME_KEY, 'test_name_example_row': REGISTRY_COMPLETE_KEY,
+                      'record_type': RUN_REGISTRY, 'backfill_time': current_timestamp()})
+        self.db.bulk_write(put_items=items)
+        self._test_runs = None
+        return len(prime_keys)
 
     def all_test_runs(self) -> dict[str, list[str]]:
-        prime_keys = self.db.all_prime_keys()
+        # Read once per instance, list_projects and list_test_runs reuse it
+        if self._test_runs is not None:
+            return self._test_runs
+        prime_keys = self.registered_runs()
+        if prime_keys is None:
+            prime_keys = self.scanned_runs()
         result = {}
         for prime_key in prime_keys:
             parts = prime_key.split('/')
@@ -249,6 +948,7 @@ class CucumberTestRuns:
                 result[project].append(test_run_name)
             else:
                 result[project] = [test_run_name]
+        self._test_runs = result
         return result
 
     def list_projects(self) -> list[str]:
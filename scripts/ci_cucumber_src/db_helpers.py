@@ -1,69 +1,324 @@
+import atexit
 import boto3
+import json
 import os
-from botocore.exceptions import ProfileNotFound
-from boto3.dynamodb.conditions import Key
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key, Attr
+from storage_backend import StorageBackend, StorageError, ConditionFailed, TransactionConflict
 
 REGION = 'us-east-1'
+BATCH_WRITE_SIZE = 25
+DEFAULT_WRITE_CONCURRENCY = 8
+DEFAULT_SCAN_SEGMENTS = 4
+MAX_BATCH_RETRIES = 8
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 5
+THROTTLE_ERRORS = ['ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded']
+# Client tuning, each one can be overridden by its CI_CUC_DB_* env var, see client_config()
+DEFAULT_POOL_CONNECTIONS = 50
+DEFAULT_RETRY_MODE = 'adaptive'
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 10
+# The credential sources in the order they are tried, the first one found is used for the whole process
+CREDENTIAL_PROFILES = ['DEVINT', 'INT']
+ENV_CREDENTIALS = 'env'
+_sessions = {}
+_sessions_lock = threading.Lock()
 
 
-class DBHelpers:
-    def __init__(self, table_name, prime_key_name, sorting_key_name):
-        self.table_name = table_name
-        self.dynamodb = self._get_dynamodb_resource()
+def client_config(pool_connections=None, retry_mode=None, max_attempts=None, connect_timeout=None,
+                  read_timeout=None, tcp_keepalive=None) -> Config:
+    # One pooled connection per bulk write thread, adaptive retries back off on throttling
+    pool_connections = pool_connections or int(os.getenv('CI_CUC_DB_POOL_SIZE', DEFAULT_POOL_CONNECTIONS))
+    if tcp_keepalive is None:
+        tcp_keepalive = os.getenv('CI_CUC_DB_TCP_KEEPALIVE', 'true').lower() != 'false'
+    return Config(
+        region_name=REGION,
+        max_pool_connections=max(pool_connections, DEFAULT_WRITE_CONCURRENCY),
+        retries={
+            'mode': retry_mode or os.getenv('CI_CUC_DB_RETRY_MODE', DEFAULT_RETRY_MODE),
+            'max_attempts': max_attempts or int(os.getenv('CI_CUC_DB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        },
+        connect_timeout=connect_timeout or float(os.getenv('CI_CUC_DB_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+        read_timeout=read_timeout or float(os.getenv('CI_CUC_DB_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)),
+        tcp_keepalive=tcp_keepalive
+    )
+
+
+def credential_session() -> tuple[str, boto3.Session]:
+    # The profiles are looked up and the session is created once per process
+    with _sessions_lock:
+        if 'source' not in _sessions:
+            _sessions['source'], _sessions['session'] = _resolve_session()
+        return _sessions['source'], _sessions['session']
+
+
+def _resolve_session() -> tuple[str, boto3.Session]:
+    available_profiles = boto3.Session().available_profiles
+    for profile in CREDENTIAL_PROFILES:
+        if profile in available_profiles:
+            return profile, boto3.Session(profile_name=profile, region_name=REGION)
+
+    aws_access_key = os.getenv("INT_AWS_ACCESS_KEY_ID")
+    aws_secret_key = os.getenv("INT_AWS_SECRET_ACCESS_KEY")
+    aws_session_token = os.getenv("INT_AWS_SESSION_TOKEN")
+    if aws_session_token is None:
+        aws_session_token = os.getenv("INT_SESSION_TOKEN")
+
+    if aws_access_key and aws_secret_key:
+        return ENV_CREDENTIALS, boto3.Session(
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key,
+            aws_session_token=aws_session_token,
+            region_name=REGION
+        )
+
+    raise Exception("AWS credentials not found via DEVINT, INT, or env vars")
+
+
+class DBCallProfile:
+    """
+    Latency and consumed capacity of the DynamoDB calls of this process, by operation.
+    Set CI_CUC_DB_PROFILE to a folder to write the profile of every process there when it exits,
+    as db_profile_<pid>.json.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.capacity: dict[str, float] = {}
+        self.errors: dict[str, int] = {}
+
+    def record(self, operation, seconds, response=None, error=None):
+        consumed = response.get('ConsumedCapacity') if response else None
+        # A single table call returns one dict, batch and transaction calls a list of them
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        units = sum(float(c.get('CapacityUnits', 0)) for c in consumed or [])
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(seconds)
+            self.capacity[operation] = self.capacity.get(operation, 0) + units
+            if error:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            operations = {}
+            for operation, latencies in self.latencies.items():
+                ordered = sorted(latencies)
+                operations[operation] = {
+                    'calls': len(ordered),
+                    'errors': self.errors.get(operation, 0),
+                    'total_ms': sum(ordered) * 1000,
+                    'p50_ms': _percentile(ordered, 50) * 1000,
+                    'p95_ms': _percentile(ordered, 95) * 1000,
+                    'p99_ms': _percentile(ordered, 99) * 1000,
+                    'max_ms': ordered[-1] * 1000,
+                    'capacity_units': self.capacity.get(operation, 0)
+                }
+        return {'pid': os.getpid(), 'operations': operations}
+
+    def dump(self, folder):
+        summary = self.summary()
+        if len(summary['operations']) == 0:
+            return
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"db_profile_{os.getpid()}.json"), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(summary, indent=2))
+
+
+def _percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+DB_PROFILE = DBCallProfile()
+if os.getenv('CI_CUC_DB_PROFILE'):
+    atexit.register(DB_PROFILE.dump, os.getenv('CI_CUC_DB_PROFILE'))
+
+
+class DBHelpers(StorageBackend):
+    def __init__(self, table_name, prime_key_name, sorting_key_name, indexes=None, config=None):
+        super().__init__(table_name, prime_key_name, sorting_key_name, indexes)
+        self.credential_source, session = credential_session()
+        self.dynamodb = session.resource('dynamodb', region_name=REGION, config=config or client_config())
+        # Calls go through the client of the resource, it serializes the python values the same way the table does
+        self.client = self.dynamodb.meta.client
         self.table = self.dynamodb.Table(table_name)
-        self.prime_key_name = prime_key_name
-        self.sorting_key_name = sorting_key_name
+        self._missing_indexes = set()
+        self.profile = DB_PROFILE
 
-    def _get_dynamodb_resource(self):
+    def _call(self, operation, **kwargs):
+        # Every data call is timed and asks for its consumed capacity, see DBCallProfile
+        kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        start = time.perf_counter()
         try:
-            session = boto3.Session(profile_name="DEVINT", region_name=REGION)
-            return session.resource('dynamodb', region_name=REGION)
-        except ProfileNotFound:
-            pass
+            response = getattr(self.client, operation)(**kwargs)
+        except ClientError as e:
+            self.profile.record(operation, time.perf_counter() - start, e.response, error=True)
+            raise
+        self.profile.record(operation, time.perf_counter() - start, response)
+        return response
 
-        try:
-            session = boto3.Session(profile_name="INT", region_name=REGION)
-            return session.resource('dynamodb', region_name=REGION)
-        except ProfileNotFound:
-            pass
-
-        aws_access_key = os.getenv("INT_AWS_ACCESS_KEY_ID")
-        aws_secret_key = os.getenv("INT_AWS_SECRET_ACCESS_KEY")
-        aws_session_token = os.getenv("INT_AWS_SESSION_TOKEN")
-        if aws_session_token is None:
-            aws_session_token = os.getenv("INT_SESSION_TOKEN")
-
-        if aws_access_key and aws_secret_key:
-            session = boto3.Session(
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key,
-                aws_session_token=aws_session_token,
-                region_name=REGION
-            )
-            return session.resource('dynamodb', region_name=REGION)
-
-        raise Exception("AWS credentials not found via DEVINT, INT, or env vars")
-
-    def query_by_prime_key(self, prime_key_value):
-        response = self.table.query(
-            KeyConditionExpression=Key(self.prime_key_name).eq(prime_key_value)
+    def query_items(self, prime_key_value, filters=None, attributes=None, below=None):
+        query_kwargs = {}
+        if attributes:
+            query_kwargs['ProjectionExpression'] = ', '.join(f"#P{i}" for i in range(len(attributes)))
+            query_kwargs['ExpressionAttributeNames'] = {f"#P{i}": attribute for i, attribute in enumerate(attributes)}
+        for page in self._query_pages(prime_key_value, filters, below, **query_kwargs):
+            yield from page.get('Items', [])
+
+    def count_items(self, prime_key_value, filters=None):
+        # Select=COUNT reads the same items, but none of them is sent back
+        return sum(page['Count'] for page in self._query_pages(prime_key_value, filters, Select='COUNT'))
+
+    def _query_pages(self, prime_key_value, filters=None, below=None, **query_kwargs):
+        partition = Key(self.prime_key_name).eq(prime_key_value)
+        # The items below the bounds are filtered on the server side, only they are sent back
+        below_expression = None
+        for attribute, bound in (below or {}).items():
+            condition = Attr(attribute).lt(Decimal(str(bound)))
+            below_expression = condition if below_expression is None else below_expression & condition
+        if below_expression is not None:
+            query_kwargs['FilterExpression'] = below_expression
+        if not filters:
+            yield from self.iter_query_pages(partition, **query_kwargs)
+            return
+        attribute, values = next(iter(filters.items()))
+        index_name = self.indexes.get(attribute)
+        # Through the index of the attribute, or a filter on the whole partition without it
+        if len(filters) == 1 and index_name and index_name not in self._missing_indexes:
+            yielded = False
+            try:
+                for value in values:
+                    for page in self.iter_query_pages(partition & Key(attribute).eq(value), index_name,
+                                                      **query_kwargs):
+                        yielded = True
+                        yield page
+                return
+            except ClientError as e:
+                missing_index = e.response['Error']['Code'] in ['ValidationException', 'ResourceNotFoundException']
+                if yielded or not missing_index:
+                    raise
+                self._missing_indexes.add(index_name)
+        filter_expression = below_expression
+        for attribute, values in filters.items():
+            condition = Attr(attribute).is_in(list(values))
+            filter_expression = condition if filter_expression is None else filter_expression & condition
+        query_kwargs['FilterExpression'] = filter_expression
+        yield from self.iter_query_pages(partition, **query_kwargs)
+
+    def iter_query(self, key_condition, index_name=None, **query_kwargs):
+        for page in self.iter_query_pages(key_condition, index_name, **query_kwargs):
+            yield from page.get('Items', [])
+
+    def iter_query_pages(self, key_condition, index_name=None, **query_kwargs):
+        # One response per page of up to 1 MB
+        kwargs = {'TableName': self.table_name, 'KeyConditionExpression': key_condition, **query_kwargs}
+        if index_name:
+            kwargs['IndexName'] = index_name
+        while True:
+            response = self._call('query', **kwargs)
+            yield response
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def has_index(self, index_name) -> bool:
+        indexes = self.table.global_secondary_indexes or []
+        return any(index['IndexName'] == index_name for index in indexes)
+
+    def create_index(self, index_name, partition_key_name, sort_key_name):
+        if self.has_index(index_name):
+            print(f"Index {index_name} already exists in table '{self.table_name}'")
+            return
+        index = {
+            'IndexName': index_name,
+            'KeySchema': [
+                {'AttributeName': partition_key_name, 'KeyType': 'HASH'},
+                {'AttributeName': sort_key_name, 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }
+        if self.table.provisioned_throughput.get('ReadCapacityUnits'):
+            index['ProvisionedThroughput'] = {
+                'ReadCapacityUnits': self.table.provisioned_throughput['ReadCapacityUnits'],
+                'WriteCapacityUnits': self.table.provisioned_throughput['WriteCapacityUnits']
+            }
+        self.table.update(
+            AttributeDefinitions=[
+                {'AttributeName': partition_key_name, 'AttributeType': 'S'},
+                {'AttributeName': sort_key_name, 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': index}]
         )
-        return response.get('Items', [])
+        print(f"Creating index {index_name} in table '{self.table_name}', it is usable once its status is ACTIVE")
+
+    def all_prime_keys(self, segments=None) -> list[str]:
+        # A parallel scan of the prime keys, it still reads the whole table
+        segments = segments or int(os.getenv('CI_CUC_SCAN_SEGMENTS', DEFAULT_SCAN_SEGMENTS))
+        with ThreadPoolExecutor(max_workers=segments) as pool:
+            key_sets = list(pool.map(self._scan_prime_keys, range(segments), [segments] * segments))
+        return sorted(set().union(*key_sets))
 
-    def all_prime_keys(self) -> list[str]:
-        response = self.table.scan()
-        items = response.get('Items', [])
+    def _scan_prime_keys(self, segment, total_segments) -> set[str]:
+        scan_kwargs = {'TableName': self.table_name, 'ProjectionExpression': '#P',
+                       'ExpressionAttributeNames': {'#P': self.prime_key_name},
+                       'Segment': segment, 'TotalSegments': total_segments}
+        prime_keys = set()
+        while True:
+            response = self._call('scan', **scan_kwargs)
+            prime_keys.update(item[self.prime_key_name] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return prime_keys
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
-        while 'LastEvaluatedKey' in response:
-            response = self.table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-            items.extend(response.get('Items', []))
+    def get_item(self, primary_value, sorting_value):
+        # Strongly consistent, the item is usually read to update it or to check a status just written
+        response = self._call('get_item', TableName=self.table_name, ConsistentRead=True,
+                              Key={self.prime_key_name: primary_value, self.sorting_key_name: sorting_value})
+        return response.get('Item')
 
-        prime_keys = [item.get(self.prime_key_name) for item in items]
-        prime_keys = list(set(prime_keys))
-        prime_keys.sort()
-        return prime_keys
+    def update_item(self, primary_value, sorting_value, update_dict, condition_dict=None, add_dict=None):
+        kwargs = self._update_kwargs(primary_value, sorting_value, update_dict, condition_dict, add_dict)
+        kwargs['ReturnValues'] = "UPDATED_NEW"
+        try:
+            return self._call('update_item', TableName=self.table_name, **kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                raise ConditionFailed(e.response['Error']['Message'])
+            # The item is part of a transaction in progress
+            if e.response['Error']['Code'] == 'TransactionConflictException':
+                raise TransactionConflict(e.response['Error']['Message'])
+            raise StorageError(e.response['Error']['Message'])
+
+    def transact_update_items(self, updates):
+        # All or nothing: if any condition fails, none of the updates is applied. Max 100 updates per call
+        transact_items = []
+        for update in updates:
+            kwargs = self._update_kwargs(update['primary_value'], update['sorting_value'],
+                                         update['update_dict'], update.get('condition_dict'), update.get('add_dict'))
+            kwargs['TableName'] = self.table_name
+            transact_items.append({'Update': kwargs})
+        try:
+            return self._call('transact_write_items', TransactItems=transact_items)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise StorageError(e.response['Error']['Message'])
+            reasons = e.response.get('CancellationReasons', [])
+            failed = {i for i, reason in enumerate(reasons) if reason.get('Code') == 'ConditionalCheckFailed'}
+            if not failed and any(reason.get('Code') == 'TransactionConflict' for reason in reasons):
+                raise TransactionConflict(e.response['Error']['Message'])
+            # Without the reasons we cannot tell which update failed, report all of them
+            raise ConditionFailed(e.response['Error']['Message'], failed if failed else set(range(len(updates))))
 
-    def update_item(self, primary_value, sorting_value, update_dict, condition_dict=None):
+    def _update_kwargs(self, primary_value, sorting_value, update_dict, condition_dict=None, add_dict=None):
         expression_names = {}
         expression_values = {}
         expression_list = []
@@ -71,14 +326,20 @@ class DBHelpers:
             expression_list.append(f"#F{i} = :v{i}")
             expression_names[f"#F{i}"] = key
             expression_values[f":v{i}"] = update_dict[key]
-        update_expression = f"SET {', '.join(expression_list)}"
+        update_expression = f"SET {', '.join(expression_list)}" if expression_list else ''
+        add_list = []
+        for i, key in enumerate((add_dict or {}).keys()):
+            add_list.append(f"#AF{i} :av{i}")
+            expression_names[f"#AF{i}"] = key
+            expression_values[f":av{i}"] = add_dict[key]
+        if add_list:
+            update_expression = f"{update_expression} ADD {', '.join(add_list)}".strip()
 
         kwargs = {
             'Key': {self.prime_key_name: primary_value, self.sorting_key_name: sorting_value},
             'UpdateExpression': update_expression,
             'ExpressionAttributeNames': expression_names,
-            'ExpressionAttributeValues': expression_values,
-            'ReturnValues': "UPDATED_NEW"
+            'ExpressionAttributeValues': expression_values
         }
         if condition_dict:
             condition_list = []
@@ -86,18 +347,46 @@ class DBHelpers:
                 condition_list.append(f"#CF{i} = :cv{i}")
                 expression_names[f"#CF{i}"] = key
                 expression_values[f":cv{i}"] = condition_dict[key]
-            kwargs['ConditionExpression'] = ', '.join(condition_list)
-
-        return self.table.update_item(**kwargs)
+            kwargs['ConditionExpression'] = ' AND '.join(condition_list)
+        return kwargs
 
-    def batch_put(self, items):
-        with self.table.batch_writer() as batch:
-            for item in items:
-                batch.put_item(Item=item)
-        print(f"Processed batch_put for {len(items)} records")
+    def bulk_write(self, put_items=None, delete_keys=None, concurrency=None) -> dict:
+        # Spread the 25-item BatchWriteItem calls across a thread pool
+        if concurrency is None:
+            concurrency = int(os.getenv('CI_CUC_WRITE_CONCURRENCY', DEFAULT_WRITE_CONCURRENCY))
+        requests = [{'PutRequest': {'Item': item}} for item in (put_items or [])]
+        requests += [{'DeleteRequest': {'Key': key}} for key in (delete_keys or [])]
+        batches = [requests[i:i + BATCH_WRITE_SIZE] for i in range(0, len(requests), BATCH_WRITE_SIZE)]
+        stats = {'items': len(requests), 'batches': len(batches), 'retries': 0, 'throttles': 0}
+        start = time.perf_counter()
+        if len(batches) > 0:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+                for retries, throttles in pool.map(self._write_batch, batches):
+                    stats['retries'] += retries
+                    stats['throttles'] += throttles
+        stats['seconds'] = time.perf_counter() - start
+        stats['items_per_second'] = stats['items'] / stats['seconds'] if stats['seconds'] > 0 else 0
+        if len(batches) > 0:
+            print(f"bulk_write: {stats['items']} items in {stats['batches']} batches, "
+                  f"{stats['items_per_second']:.1f} items/s, {stats['retries']} retries, "
+                  f"{stats['throttles']} throttles")
+        return stats
 
-    def batch_delete(self, keys):
-        with self.table.batch_writer() as batch:
-            for key in keys:
-                batch.delete_item(Key=key)
-        print(f"Processed batch_delete for {len(keys)} records")
+    def _write_batch(self, batch):
+        retries = 0
+        throttles = 0
+        for attempt in range(MAX_BATCH_RETRIES + 1):
+            try:
+                response = self._call('batch_write_item', RequestItems={self.table_name: batch})
+                batch = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                if len(batch) == 0:
+                    return retries, throttles
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLE_ERRORS:
+                    raise
+                throttles += 1
+            if attempt < MAX_BATCH_RETRIES:
+                retries += 1
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)))
+        raise Exception(f"bulk_write: {len(batch)} items still unprocessed after {MAX_BATCH_RETRIES} retries")
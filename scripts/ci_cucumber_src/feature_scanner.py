@@ -1,17 +1,60 @@
+import hashlib
+import heapq
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterable, Iterator, Optional, Any, Tuple
+from test_record import scenario_sort_key
+from step_definitions import StepDefinitions, FINGERPRINT_LENGTH, is_step
+from tag_expression import TagExpression
 
 FEATURE = 'Feature:'
-SCN = 'Scenario:'
-SCN_OTL = 'Scenario Outline:'
-EXAMPLES = 'Examples:'
+RULE = 'Rule:'
+BACKGROUND = 'Background:'
+SCN = ('Scenario:', 'Example:')
+SCN_OTL = ('Scenario Outline:', 'Scenario Template:')
+EXAMPLES = ('Examples:', 'Scenarios:')
+DOC_STRING = ('"""', '```')
+PLACEHOLDER = re.compile(r"<([^<>]+)>")
 NO_EXAMPLE = 'N/A'
-SCAN_STATUSES = ['look_for_tag', 'look_for_scn_name', 'look_for_example']
+# Bump this version whenever the parsing result of CucumberFeature changes, it invalidates all cached results
+CACHE_VERSION = 4
+DEFAULT_CACHE_FILE = '.ci_cuc_cache/feature_scan_cache.json'
+# Parse in CI_CUC_SCAN_WORKERS processes from this many feature files on
+PARALLEL_MIN_FILES = 200
+
+
+def table_cells(row: str) -> list[str]:
+    return [cell.strip() for cell in row.strip().strip('|').split('|')]
+
+
+def text_hash(scenario_name: str, lines: list[str], example_header: str):
+    # The text the scenario runs, an outline adds its header and example row. Tags and comments do not count
+    return hashlib.sha256(('\n'.join([scenario_name, *lines, example_header]) + '\n').encode('utf-8'))
+
+
+def parse_feature(filename: str, content: Optional[bytes] = None) -> Tuple['CucumberFeature', float]:
+    # The parsed feature file and the parse time. Runs in the worker processes of FeatureScanner as well
+    start = time.perf_counter()
+    cf = CucumberFeature(filename, content.decode('utf-8') if content is not None else None)
+    return cf, time.perf_counter() - start
+
+
+def default_workers() -> int:
+    return int(os.getenv('CI_CUC_SCAN_WORKERS', os.cpu_count() or 1))
 
 
 class FeatureScanner:
     def __init__(self, repo_root_path: str, feature_folder_path: str,
-                 include_tags: List[str], exclude_tags: List[str] = None):
+                 include_tags: List[str], exclude_tags: List[str] = None,
+                 cache_file: Optional[str] = DEFAULT_CACHE_FILE, step_definitions: Optional[List[str]] = None,
+                 workers: Optional[int] = None):
         if exclude_tags is None:
             exclude_tags = []
         self.repo_root: Path = Path(repo_root_path).resolve()
@@ -19,103 +62,312 @@ class FeatureScanner:
         if not feature_path_obj.is_absolute():
             feature_path_obj = self.repo_root / feature_folder_path
         self.feature_path: Path = feature_path_obj.resolve()
+        # The step definition files or folders, found next to the feature files when not given
+        if step_definitions:
+            self.step_definitions: Optional[StepDefinitions] = StepDefinitions(
+                [p if p.is_absolute() else self.repo_root / p for p in map(Path, step_definitions)], self.repo_root)
+        else:
+            self.step_definitions = StepDefinitions.discover(self.feature_path, self.repo_root)
+        # Pass cache_file=None to parse every feature file again
+        self.cache: Optional[FeatureScanCache] = None
+        if cache_file:
+            cache_path = Path(cache_file)
+            if not cache_path.is_absolute():
+                cache_path = self.repo_root / cache_path
+            step_key = self.step_definitions.all_files_fingerprint if self.step_definitions else None
+            self.cache = FeatureScanCache(cache_path, step_key)
 
-        # Ensure tags start with '@' and store them as sets for efficient lookup
-        self.include_tags = [t[1:] if t.startswith('@') else t for t in include_tags]
-        self.exclude_tags = [t[1:] if t.startswith('@') else t for t in exclude_tags]
-
-        # Internal state variables reset for each file
-        self._scenario_name: Optional[str] = None
-        self._has_tag: bool = False
-        self._looking_for_example: bool = False
-        self._scanning_example: bool = False
-        self._example_table_row: int = 0  # 0=Not started, 1=Header, 2+=Data rows
+        # Every tag is a tag or a tag expression like "@a and not @b", see tag_expression.py
+        self.include_tags = include_tags
+        self.exclude_tags = exclude_tags
+        self.tag_filter = TagExpression.from_tags(include_tags, exclude_tags)
+        self.workers = default_workers() if workers is None else workers
 
     def run(self) -> List[Dict[str, Any]]:
-        scenarios: List[Dict[str, Any]] = []
-        for file_path in self.feature_path.rglob('*.feature'):
-            cf = CucumberFeature(file_path.as_posix())
-            scenarios.extend(cf.scenarios_by_tag(self.include_tags, self.exclude_tags))
+        return list(self.iter_scenarios())
 
-        for scenario in scenarios:
-            scenario['test_location'] = scenario['test_location'].replace(f"{self.repo_root.as_posix()}/", "")
-        scenarios.sort(key=lambda scn: f"{scn['scenario_name']}:{scn['example_row']:0>2}")
+    def iter_scenarios(self) -> Iterator[Dict[str, Any]]:
+        # The selected scenarios of all feature files, every file is sorted on its own and they are merged
+        features = self._features()
+        if self.cache:
+            self.cache.save(self.feature_path)
+            print(self.cache.summary())
+        return heapq.merge(*(self._selected(cf) for cf in features),
+                           key=lambda scn: scenario_sort_key(scn['scenario_name'], scn['example_row']))
+
+    def _selected(self, cf: 'CucumberFeature') -> List[Dict[str, Any]]:
+        # Copies, the scenarios of the feature stay as they were parsed or cached
+        prefix = f"{self.repo_root.as_posix()}/"
+        scenarios = [dict(scenario, test_location=scenario['test_location'].replace(prefix, ""))
+                     for scenario in self.tag_filter.select(cf.scenarios)]
+        scenarios.sort(key=lambda scn: scenario_sort_key(scn['scenario_name'], scn['example_row']))
         return scenarios
 
+    def _fingerprint_steps(self, cf: 'CucumberFeature'):
+        # The steps of a parsed feature are replaced by their step fingerprint, they are neither cached nor synced
+        for scenario in cf.scenarios:
+            steps = scenario.pop('steps', [])
+            if self.step_definitions:
+                scenario['step_fingerprint'] = self.step_definitions.fingerprint(steps)
+
+    def _features(self) -> List['CucumberFeature']:
+        # Every feature file in rglob order, from the cache or parsed. Without a cache, a file is read by its parser
+        features: List[Optional[CucumberFeature]] = []
+        to_parse = []
+        for file_path in self.feature_path.rglob('*.feature'):
+            cf, content = self.cache.cached(file_path) if self.cache else (None, None)
+            if cf is None:
+                to_parse.append((len(features), file_path.as_posix(), content))
+            features.append(cf)
+        for (index, _, _), (cf, parse_seconds) in zip(to_parse, self._parse_all(to_parse)):
+            self._fingerprint_steps(cf)
+            features[index] = cf
+            if self.cache:
+                self.cache.add(cf, parse_seconds)
+        return features
+
+    def _parse_all(self, to_parse: list) -> List[Tuple['CucumberFeature', float]]:
+        filenames = [filename for _, filename, _ in to_parse]
+        contents = [content for _, _, content in to_parse]
+        if len(to_parse) >= PARALLEL_MIN_FILES and self.workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    return list(pool.map(parse_feature, filenames, contents,
+                                         chunksize=max(1, len(to_parse) // (self.workers * 4))))
+            except (OSError, BrokenProcessPool) as e:
+                print(f"FeatureScanner: cannot parse in {self.workers} processes ({e}), parsing in this process")
+        return [parse_feature(filename, content) for filename, content in zip(filenames, contents)]
+
+
+class FeatureScanCache:
+    """
+    Parse results of the feature files, stored on disk between scans.
+    A file is reused without reading it when its mtime and size are unchanged,
+    otherwise it is reused when its content hash is unchanged, and parsed again when the content changed.
+    The scenarios keep their step fingerprint instead of their steps, so a file is parsed again when the step
+    definitions changed.
+    """
+
+    def __init__(self, cache_path: Path, step_key: Optional[str] = None):
+        self.cache_path = cache_path
+        self.step_key = step_key
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.seen: set[str] = set()
+        # The stat and content hash of the files read by cached() and not added yet
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.parse_seconds = 0.0
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+            if content.get('version') == CACHE_VERSION:
+                self.entries = content.get('files', {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def cached(self, file_path: Path) -> Tuple[Optional['CucumberFeature'], Optional[bytes]]:
+        # The cached parse result, or None and the content of the file to parse and add()
+        key = file_path.as_posix()
+        self.seen.add(key)
+        stat = file_path.stat()
+        entry = self.entries.get(key)
+        if entry and entry.get('step_key') != self.step_key:
+            entry = None
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return self._hit(key, entry), None
+        content = file_path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        if entry and entry['sha256'] == digest:
+            entry['mtime_ns'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            self.dirty = True
+            return self._hit(key, entry), None
+        self.pending[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}
+        return None, content
+
+    def add(self, cf: 'CucumberFeature', parse_seconds: float):
+        self.misses += 1
+        self.parse_seconds += parse_seconds
+        self.dirty = True
+        self.entries[cf.filename] = {
+            **self.pending.pop(cf.filename), 'parse_seconds': parse_seconds, 'step_key': self.step_key,
+            'feature_name': cf.feature_name, 'feature_tags': cf.feature_tags,
+            'scenarios': [dict(scenario, tags=list(scenario['tags'])) for scenario in cf.all_scenarios()]
+        }
+
+    def _hit(self, key: str, entry: Dict[str, Any]) -> 'CucumberFeature':
+        self.hits += 1
+        self.saved_seconds += entry['parse_seconds']
+        return CucumberFeature.from_scenarios(key, entry['feature_name'], entry['feature_tags'], entry['scenarios'])
+
+    def save(self, feature_path: Path):
+        # Drop the files under the scanned folder that do not exist anymore
+        prefix = f"{feature_path.as_posix()}/"
+        removed = [k for k in self.entries if k not in self.seen and k.startswith(prefix)]
+        for key in removed:
+            del self.entries[key]
+        if not self.dirty and len(removed) == 0:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        # json.dumps uses the C encoder, json.dump to a file does not and is several times slower
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'version': CACHE_VERSION, 'files': self.entries}))
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        return (f"FeatureScanner cache: {total} feature files, {self.hits} cache hits ({hit_rate:.1f}%), "
+                f"{self.misses} parsed in {self.parse_seconds:.3f}s, about {self.saved_seconds:.3f}s of parsing saved")
+
 
 class CucumberFeature:
-    def __init__(self, filename: str):
+    """
+    The scenarios of one feature file, one per scenario and one per example row of a scenario outline.
+    iter_scenarios() parses the lines as they are read and yields every scenario once its text is complete.
+    """
+
+    def __init__(self, filename: str, content: Optional[str] = None):
         self.filename = filename
-        with open(self.filename, 'r', encoding='utf-8') as f:
-            self.feature_lines = [line.strip() for line in f.readlines()]
         self.feature_name: str = ''
         self.feature_tags: list[str] = []
-        self.scenarios: list[dict] = []
-        self.current_tags: list[str] = []
-        self._parse()
+        if content is None:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                self.scenarios: list[dict] = list(self.iter_scenarios(f))
+        else:
+            self.scenarios = list(self.iter_scenarios(io.StringIO(content)))
+
+    @classmethod
+    def from_scenarios(cls, filename: str, feature_name: str, feature_tags: list[str],
+                       scenarios: list[dict]) -> 'CucumberFeature':
+        cf = cls.__new__(cls)
+        cf.filename = filename
+        cf.feature_name = feature_name
+        cf.feature_tags = list(feature_tags)
+        cf.scenarios = [dict(scenario, tags=[sys.intern(tag) for tag in scenario['tags']]) for scenario in scenarios]
+        return cf
 
     def all_scenarios(self) -> list[dict]:
         return self.scenarios.copy()
 
     def scenarios_by_tag(self, inclusion_tags: list[str], exclusion_tags: list[str] = None) -> list[dict]:
-        if exclusion_tags is None:
-            exclusion_tags = []
-        filtered_scn = []
-        for scenario in self.scenarios:
-            inclusion_match = any(in_tag in scenario['tags'] for in_tag in inclusion_tags)
-            exclusion_match = any(ex_tag in scenario['tags'] for ex_tag in exclusion_tags)
-            if inclusion_match and not exclusion_match:
-                filtered_scn.append(scenario)
-        return filtered_scn.copy()
-
-    def _parse(self):
-        scenario_outline_name = ''
-        scenario_outline_tags = []
-        example_line = 0
-        for i, line in enumerate(self.feature_lines):
-            line_number = i + 1
-            location = f"{self.filename}:{line_number}"
-            self._gather_tags(line)
-            if line.startswith('Feature:'):
-                self.feature_name = line[len('Feature:'):].strip()
-                self.feature_tags = self.current_tags
-                self.current_tags = []
-                scenario_outline_name = ''
-            elif line.startswith('Scenario:'):
-                this_scenario_tags = self.current_tags + self.feature_tags
-                self.scenarios.append({
-                    'scenario_name': line[len('Scenario:'):].strip(),
-                    'scenario_outline': False,
-                    'example_row': NO_EXAMPLE,
-                    'test_location': location,
-                    'tags': this_scenario_tags
-                })
-                self.current_tags = []
-                scenario_outline_name = ''
-            elif line.startswith('Scenario Outline:'):
-                scenario_outline_name = line[len('Scenario Outline:'):].strip()
-                scenario_outline_tags = self.current_tags + self.feature_tags
-                example_line = 0
-                self.current_tags = []
-            elif line.startswith('Examples:'):
-                if scenario_outline_name:
-                    example_line = line_number
+        return TagExpression.from_tags(inclusion_tags, exclusion_tags).select(self.scenarios)
+
+    def iter_scenarios(self, lines: Iterable[str]) -> Iterator[dict]:
+        # A Rule adds its tags and background, example rows are numbered across the Examples blocks
+        tags: list[str] = []
+        rule_tags: list[str] = []
+        background: list[str] = []
+        rule_background: list[str] = []
+        in_rule = False
+        # The lines of the background, scenario or scenario outline being read, None outside of them
+        body: Optional[list[str]] = None
+        scenario: Optional[dict] = None
+        outline: Optional[dict] = None
+        doc_string = ''
+        for line_number, raw_line in enumerate(lines, 1):
+            line = raw_line.strip()
+            if doc_string:
+                # Nothing in a doc string is a keyword, a tag or a comment
+                if body is not None:
+                    body.append(line)
+                if line.startswith(doc_string):
+                    doc_string = ''
+                continue
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('@'):
+                tags.extend(self._tags(line))
+            elif line.startswith('|'):
+                if outline is not None and outline['examples_tags'] is not None:
+                    if outline['text_hash'] is None:
+                        self._examples_header(outline, line, background + rule_background)
+                    else:
+                        outline['rows'] += 1
+                        yield self._example(outline, line, f"{self.filename}:{line_number}")
+                elif body is not None:
+                    body.append(line)
+            elif line.startswith(EXAMPLES):
+                if outline is None:
+                    raise ValueError(f"Cannot find Scenario Outline before Examples at {self.filename}:{line_number}")
+                outline['examples_tags'], outline['text_hash'], tags = tags, None, []
+                body = None
+            elif line.startswith((FEATURE, RULE, BACKGROUND) + SCN + SCN_OTL):
+                if scenario is not None:
+                    yield self._scenario_text(scenario, background + rule_background + body)
+                scenario = outline = body = None
+                if line.startswith(FEATURE):
+                    self.feature_name = line[len(FEATURE):].strip()
+                    self.feature_tags, tags = tags, []
+                elif line.startswith(RULE):
+                    in_rule = True
+                    rule_tags, rule_background, tags = tags, [], []
+                elif line.startswith(BACKGROUND):
+                    body = rule_background if in_rule else background
+                elif line.startswith(SCN):
+                    body = []
+                    scenario = {
+                        'scenario_name': line[line.index(':') + 1:].strip(),
+                        'scenario_outline': False,
+                        'example_row': NO_EXAMPLE,
+                        'test_location': f"{self.filename}:{line_number}",
+                        'tags': tags + rule_tags + self.feature_tags
+                    }
+                    tags = []
                 else:
-                    raise ValueError("Cannot find Scenario Outline before Examples at {location}")
-            elif line.startswith('|') and scenario_outline_name and example_line > 0:
-                example_table_row = line_number - example_line
-                if example_table_row > 1:
-                    self.scenarios.append({
-                        'scenario_name': scenario_outline_name,
-                        'scenario_outline': True,
-                        'example_row': f"{example_table_row - 1}",
-                        'test_location': location,
-                        'tags': scenario_outline_tags
-                    })
-
-    def _gather_tags(self, line: str):
-        if line.startswith('@'):
-            self.current_tags.extend([tag.strip() for tag in line.split('@') if tag.strip()])
+                    body = []
+                    outline = {'name': line[line.index(':') + 1:].strip(), 'tags': tags + rule_tags + self.feature_tags,
+                               'body': body, 'examples_tags': None, 'text_hash': None, 'rows': 0}
+                    tags = []
+            else:
+                if body is not None:
+                    body.append(line)
+                if line.startswith(DOC_STRING):
+                    doc_string = line[:3]
+        if scenario is not None:
+            yield self._scenario_text(scenario, background + rule_background + body)
+
+    @staticmethod
+    def _scenario_text(scenario: dict, lines: list[str]) -> dict:
+        scenario['fingerprint'] = text_hash(scenario['scenario_name'], lines, '').hexdigest()[:FINGERPRINT_LENGTH]
+        scenario['steps'] = [line for line in lines if is_step(line)]
+        return scenario
+
+    @staticmethod
+    def _examples_header(outline: dict, header: str, background: list[str]):
+        # Everything the rows of one Examples block share, computed once for the block
+        lines = background + outline['body']
+        outline['text_hash'] = text_hash(outline['name'], lines, header)
+        outline['columns'] = table_cells(header)
+        outline['steps'] = [line for line in lines if is_step(line)]
+
+    def _example(self, outline: dict, row: str, location: str) -> dict:
+        row_hash = outline['text_hash'].copy()
+        row_hash.update(row.encode('utf-8'))
+        values = dict(zip(outline['columns'], table_cells(row)))
+        return {
+            'scenario_name': outline['name'],
+            'scenario_outline': True,
+            'example_row': f"{outline['rows']}",
+            'test_location': location,
+            'tags': outline['examples_tags'] + outline['tags'] if outline['examples_tags'] else outline['tags'],
+            'fingerprint': row_hash.hexdigest()[:FINGERPRINT_LENGTH],
+            'steps': [
+                PLACEHOLDER.sub(lambda m: values.get(m.group(1), m.group(0)), step) if '<' in step else step
+                for step in outline['steps']
+            ]
+        }
+
+    @staticmethod
+    def _tags(line: str) -> list[str]:
+        # Interned, the tags of every scenario are compared with the tags of the tag filter. A comment may follow
+        tags = line.split(' #', 1)[0]
+        return [sys.intern(tag.strip()) for tag in tags.split('@') if tag.strip()]
 
 # import json
 #
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+from storage_backend import json_default
+
+# Report snapshots cached by the version of the test run, for CI_CUC_REPORT_CACHE_SECONDS (0 turns it off)
+DEFAULT_REPORT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'ci_cuc_reports')
+DEFAULT_REPORT_CACHE_SECONDS = 30
+
+
+class ReportSnapshotCache:
+    def __init__(self, cache_dir=None, ttl_seconds=None):
+        self.cache_dir = Path(cache_dir or os.getenv('CI_CUC_REPORT_CACHE_DIR', DEFAULT_REPORT_CACHE_DIR))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None
+                                 else os.getenv('CI_CUC_REPORT_CACHE_SECONDS', DEFAULT_REPORT_CACHE_SECONDS))
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _path(self, prime_key_value) -> Path:
+        digest = hashlib.sha1(prime_key_value.encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"{digest}.json"
+
+    def load(self, prime_key_value, version: Optional[str]) -> Optional[dict]:
+        # No version (a test run without a summary item) cannot be checked, so nothing is served
+        if not self.enabled or version is None:
+            return None
+        try:
+            with open(self._path(prime_key_value), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        fresh = time.time() - snapshot.get('created_at', 0) <= self.ttl_seconds
+        same = snapshot.get('prime_key') == prime_key_value and snapshot.get('version') == version
+        return snapshot if fresh and same else None
+
+    def save(self, snapshot: dict):
+        if not self.enabled or snapshot.get('version') is None:
+            return
+        path = self._path(snapshot['prime_key'])
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write and rename, so a concurrent reader never sees half a snapshot
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(snapshot, default=json_default), encoding='utf-8')
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is an optimization only, the report itself is already built
+            pass
+
+    def invalidate(self, prime_key_value):
+        if not self.enabled:
+            return
+        try:
+            os.remove(self._path(prime_key_value))
+        except FileNotFoundError:
+            pass
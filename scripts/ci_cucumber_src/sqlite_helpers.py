@@ -0,0 +1,179 @@
+import json
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from storage_backend import StorageBackend, ConditionFailed, json_default, added_values
+
+BUSY_TIMEOUT_MS = 30000
+
+
+def _dump_item(item: dict) -> str:
+    return json.dumps(item, default=json_default)
+
+
+def _load_item(text: str) -> dict:
+    # Numbers come back as Decimal, same as they do from DynamoDB
+    return json.loads(text, parse_float=Decimal, parse_int=Decimal)
+
+
+def _load_value(value):
+    # json_extract returns text for strings, numbers as python numbers, lists and objects as json text
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, str) and value[:1] in ['[', '{']:
+        return _load_item(value)
+    return value
+
+
+class SQLiteHelpers(StorageBackend):
+    """
+    Local storage of the test records in one SQLite file, in WAL mode.
+    Many worker processes can share the file: readers never block, and every write takes the database
+    write lock first (BEGIN IMMEDIATE), so the conditional updates are atomic across processes.
+    """
+
+    def __init__(self, db_path, table_name, prime_key_name, sorting_key_name, indexes=None):
+        super().__init__(table_name, prime_key_name, sorting_key_name, indexes)
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections cannot be shared across threads, every thread gets its own
+        self._local = threading.local()
+        self._table = f'"{table_name}"'
+        conn = self._connection()
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (prime_key TEXT NOT NULL, sort_key TEXT NOT NULL, "
+                         f"item TEXT NOT NULL, PRIMARY KEY (prime_key, sort_key))")
+            for attribute, index_name in self.indexes.items():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{table_name}_{index_name}" ON {self._table} '
+                             f"(prime_key, json_extract(item, '$.{attribute}'))")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+            self._local.conn = conn
+        return conn
+
+    def _write_transaction(self):
+        return _WriteTransaction(self._connection())
+
+    def query_items(self, prime_key_value, filters=None, attributes=None, below=None):
+        where, params = self._where(prime_key_value, filters, below)
+        if where is None:
+            return
+        if attributes:
+            # Only extract the requested attributes, the whole item is not decoded
+            columns = ', '.join(f"json_extract(item, '$.{attribute}')" for attribute in attributes)
+            for row in self._connection().execute(f"SELECT {columns} FROM {self._table} WHERE {where} "
+                                                  f"ORDER BY sort_key", params):
+                yield {attribute: _load_value(value) for attribute, value in zip(attributes, row)
+                       if value is not None}
+            return
+        for (item,) in self._connection().execute(f"SELECT item FROM {self._table} WHERE {where} ORDER BY sort_key",
+                                                  params):
+            yield _load_item(item)
+
+    def count_items(self, prime_key_value, filters=None):
+        where, params = self._where(prime_key_value, filters)
+        if where is None:
+            return 0
+        return self._connection().execute(f"SELECT COUNT(*) FROM {self._table} WHERE {where}", params).fetchone()[0]
+
+    def _where(self, prime_key_value, filters, below=None):
+        # The WHERE clause and its parameters, None if a filter has no values and so nothing can match
+        where = "prime_key = ?"
+        params = [prime_key_value]
+        for attribute, values in (filters or {}).items():
+            values = list(values)
+            if len(values) == 0:
+                return None, []
+            where += f" AND json_extract(item, '$.{attribute}') IN ({', '.join('?' * len(values))})"
+            params.extend(values)
+        for attribute, bound in (below or {}).items():
+            where += f" AND json_extract(item, '$.{attribute}') < ?"
+            params.append(bound)
+        return where, params
+
+    def get_item(self, primary_value, sorting_value):
+        row = self._connection().execute(f"SELECT item FROM {self._table} WHERE prime_key = ? AND sort_key = ?",
+                                         [primary_value, sorting_value]).fetchone()
+        return _load_item(row[0]) if row else None
+
+    def update_item(self, primary_value, sorting_value, update_dict, condition_dict=None, add_dict=None):
+        with self._write_transaction() as conn:
+            item = self._checked_item(conn, primary_value, sorting_value, condition_dict)
+            if item is None:
+                raise ConditionFailed(f"The conditional request failed for {primary_value}/{sorting_value}")
+            self._save_updated(conn, item, {**update_dict, **added_values(item, add_dict)})
+        return {'Attributes': update_dict}
+
+    def transact_update_items(self, updates):
+        with self._write_transaction() as conn:
+            items = [
+                self._checked_item(conn, update['primary_value'], update['sorting_value'],
+                                   update.get('condition_dict'))
+                for update in updates
+            ]
+            failed = {i for i, item in enumerate(items) if item is None}
+            if failed:
+                raise ConditionFailed(f"Transaction cancelled, {len(failed)} conditions failed", failed)
+            for item, update in zip(items, updates):
+                self._save_updated(conn, item, {**update['update_dict'], **added_values(item, update.get('add_dict'))})
+
+    def _checked_item(self, conn, primary_value, sorting_value, condition_dict):
+        # Return the current item (a new one if it does not exist), or None if the condition is not met
+        row = conn.execute(f"SELECT item FROM {self._table} WHERE prime_key = ? AND sort_key = ?",
+                           [primary_value, sorting_value]).fetchone()
+        item = _load_item(row[0]) if row else {self.prime_key_name: primary_value,
+                                                 self.sorting_key_name: sorting_value}
+        if condition_dict:
+            if row is None or any(item.get(key) != value for key, value in condition_dict.items()):
+                return None
+        return item
+
+    def _save_updated(self, conn, item, update_dict):
+        item.update(update_dict)
+        conn.execute(f"INSERT OR REPLACE INTO {self._table} (prime_key, sort_key, item) VALUES (?, ?, ?)",
+                     [item[self.prime_key_name], item[self.sorting_key_name], _dump_item(item)])
+
+    def bulk_write(self, put_items=None, delete_keys=None, concurrency=None) -> dict:
+        # One local transaction is faster than any fan out, concurrency is accepted for interface parity only
+        put_items = put_items or []
+        delete_keys = delete_keys or []
+        start = time.perf_counter()
+        with self._write_transaction() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self._table} (prime_key, sort_key, item) VALUES (?, ?, ?)",
+                [(item[self.prime_key_name], item[self.sorting_key_name], _dump_item(item)) for item in put_items]
+            )
+            conn.executemany(
+                f"DELETE FROM {self._table} WHERE prime_key = ? AND sort_key = ?",
+                [(key[self.prime_key_name], key[self.sorting_key_name]) for key in delete_keys]
+            )
+        seconds = time.perf_counter() - start
+        items = len(put_items) + len(delete_keys)
+        return {'items': items, 'batches': 1 if items else 0, 'retries': 0, 'throttles': 0, 'seconds': seconds,
+                'items_per_second': items / seconds if seconds > 0 else 0}
+
+    def all_prime_keys(self) -> list[str]:
+        rows = self._connection().execute(f"SELECT DISTINCT prime_key FROM {self._table} ORDER BY prime_key")
+        return [row[0] for row in rows]
+
+
+class _WriteTransaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        # Take the write lock up front, so the read-check-write of a conditional update cannot interleave
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
@@ -0,0 +1,103 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# The step definition files of a cucumber project (cucumber-js, ruby and behave), and the steps they match
+STEP_DEFINITION_SUFFIXES = ['.js', '.mjs', '.cjs', '.ts', '.rb', '.py']
+STEP_DEFINITION_FOLDERS = ['step_definitions', 'steps']
+STEP_KEYWORDS = ('Given ', 'When ', 'Then ', 'And ', 'But ', '* ')
+STEP_DEFINITION = re.compile(
+    r"(?:@(?:given|when|then|step)\s*\(|\b(?:Given|When|Then|And|But|Step|defineStep)\s*\(?)\s*u?r?"
+    r"(/(?:\\.|[^/\\\n])+/[a-z]*|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\\n])*`)"
+)
+# {string}, {int}, {word} ... of a cucumber expression, {name} or {name:d} of a behave parse pattern
+EXPRESSION_PARAMETER = re.compile(r"\\\{[^}]*\\\}")
+FINGERPRINT_LENGTH = 16
+
+
+def step_text(line: str) -> str:
+    # The step without its keyword, the step definitions match this text
+    for keyword in STEP_KEYWORDS:
+        if line.startswith(keyword):
+            return line[len(keyword):].strip()
+    return line
+
+
+def is_step(line: str) -> bool:
+    return line.startswith(STEP_KEYWORDS)
+
+
+def pattern_regex(literal: str) -> Optional[re.Pattern]:
+    # The regex of a step definition literal, None if it cannot be compiled
+    try:
+        if literal.startswith('/'):
+            body = literal[1:literal.rindex('/')].replace('(?<', '(?P<').replace('(?P<=', '(?<=').replace('(?P<!', '(?<!')
+            return re.compile(body)
+        text = literal[1:-1]
+        if text.startswith('^') or text.endswith('$'):
+            return re.compile(text)
+        # A cucumber expression or a parse pattern: the parameters match anything, the rest literally
+        return re.compile(f"^{EXPRESSION_PARAMETER.sub('(.*)', re.escape(text))}$")
+    except re.error:
+        return None
+
+
+class StepDefinitions:
+    """
+    The step definition files under the given folders, with the content hash of each file.
+    fingerprint(steps) hashes the files that the steps of one scenario match, so it changes when one of those
+    step definitions changes, and not when an unrelated step definition file does.
+    """
+
+    def __init__(self, paths: List[Path], root: Path):
+        self.root = root
+        self.file_hashes: Dict[str, str] = {}
+        self.patterns: List[tuple] = []
+        for path in paths:
+            files = [path] if path.is_file() else sorted(p for p in path.rglob('*') if p.is_file())
+            for file_path in files:
+                if file_path.suffix in STEP_DEFINITION_SUFFIXES:
+                    self._add_file(file_path)
+        # The fingerprint of all the step definition files, it changes whenever one of them does
+        self.all_files_fingerprint = self._hash(sorted(self.file_hashes))
+        self._matches: Dict[str, Optional[str]] = {}
+
+    @classmethod
+    def discover(cls, feature_path: Path, root: Path) -> Optional['StepDefinitions']:
+        # The step_definitions (or behave steps) folder next to the feature files or inside their folder
+        paths = [
+            folder / name for folder in [feature_path, feature_path.parent] for name in STEP_DEFINITION_FOLDERS
+            if (folder / name).is_dir()
+        ]
+        return cls(paths, root) if paths else None
+
+    def _add_file(self, file_path: Path):
+        content = file_path.read_bytes()
+        key = file_path.resolve().as_posix().replace(f"{self.root.as_posix()}/", '')
+        self.file_hashes[key] = hashlib.sha256(content).hexdigest()
+        for literal in STEP_DEFINITION.findall(content.decode('utf-8', errors='replace')):
+            regex = pattern_regex(literal)
+            if regex is not None:
+                self.patterns.append((regex, key))
+
+    def matching_file(self, step: str) -> Optional[str]:
+        # The file of the first step definition that matches the step text, None if none does
+        if step not in self._matches:
+            text = step_text(step)
+            self._matches[step] = next((key for regex, key in self.patterns if regex.search(text)), None)
+        return self._matches[step]
+
+    def fingerprint(self, steps: List[str]) -> str:
+        files = set()
+        for step in steps:
+            file_key = self.matching_file(step)
+            if file_key is None:
+                # Cannot tell which definition runs this step, depend on every step definition file
+                return self.all_files_fingerprint
+            files.add(file_key)
+        return self._hash(sorted(files))
+
+    def _hash(self, file_keys: List[str]) -> str:
+        content = '\n'.join(f"{key}:{self.file_hashes[key]}" for key in file_keys)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:FINGERPRINT_LENGTH]
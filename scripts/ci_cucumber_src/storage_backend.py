@@ -0,0 +1,120 @@
+import os
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Storage of the test records, CI_CUC_STORAGE=dynamodb (default) or sqlite (at CI_CUC_SQLITE_PATH)
+DYNAMODB = 'dynamodb'
+SQLITE = 'sqlite'
+STORAGE_BACKENDS = [DYNAMODB, SQLITE]
+DEFAULT_SQLITE_PATH = str(Path.home() / '.ci_cuc' / 'ci_cuc.sqlite3')
+
+
+def json_default(value):
+    # DynamoDB returns every number as Decimal, which json cannot dump by itself
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    # A record object (see test_record.py) is dumped as the item it stands for
+    if hasattr(value, 'to_item'):
+        return value.to_item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class StorageError(Exception):
+    pass
+
+
+class ConditionFailed(StorageError):
+    # failed_indexes: for a transaction, the positions of the updates whose condition was not met
+    def __init__(self, message, failed_indexes: Optional[set[int]] = None):
+        super().__init__(message)
+        self.failed_indexes = failed_indexes if failed_indexes is not None else set()
+
+
+class TransactionConflict(StorageError):
+    # Another transaction changed one of the items at the same time, nothing was applied and it can be retried
+    pass
+
+
+def added_values(item: dict, add_dict: Optional[dict]) -> dict:
+    # The values of an atomic ADD: a missing attribute counts as 0
+    return {key: item.get(key, 0) + value for key, value in (add_dict or {}).items()}
+
+
+class StorageBackend(ABC):
+    """
+    A table of items, each identified by a prime (partition) key and a sorting key.
+    Items are plain dicts, numbers come back as Decimal like they do from DynamoDB.
+    """
+
+    def __init__(self, table_name, prime_key_name, sorting_key_name, indexes=None):
+        self.table_name = table_name
+        self.prime_key_name = prime_key_name
+        self.sorting_key_name = sorting_key_name
+        # {attribute name: index name}, an index keyed by the prime key and the attribute
+        self.indexes = indexes or {}
+
+    @abstractmethod
+    def query_items(self, prime_key_value, filters: Optional[dict[str, list]] = None,
+                    attributes: Optional[list[str]] = None, below: Optional[dict[str, float]] = None) -> Iterator[dict]:
+        """
+        Yield the items of one prime key, optionally only those whose attribute value is in filters[attribute].
+        With below, only the items whose attribute is lower than below[attribute] are returned.
+        With attributes, the items only have those attributes, the rest is not transferred
+        """
+
+    def count_items(self, prime_key_value, filters: Optional[dict[str, list]] = None) -> int:
+        """The number of items query_items would yield, without transferring them where the backend can"""
+        return sum(1 for _ in self.query_items(prime_key_value, filters, [self.sorting_key_name]))
+
+    @abstractmethod
+    def get_item(self, primary_value, sorting_value) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def update_item(self, primary_value, sorting_value, update_dict, condition_dict=None, add_dict=None):
+        """
+        Set the values of update_dict and add the numbers of add_dict (optional) to the current values,
+        raise ConditionFailed if any attribute does not equal condition_dict
+        """
+
+    @abstractmethod
+    def transact_update_items(self, updates):
+        """
+        Apply a list of {primary_value, sorting_value, update_dict, condition_dict, add_dict} updates all or nothing,
+        raise ConditionFailed with the failed positions if any condition is not met.
+        add_dict (optional) adds its numbers to the current values of the attributes
+        """
+
+    @abstractmethod
+    def bulk_write(self, put_items=None, delete_keys=None, concurrency=None) -> dict:
+        """Put and delete items without conditions, return the throughput stats"""
+
+    @abstractmethod
+    def all_prime_keys(self) -> list[str]:
+        """Every distinct prime key of the table. Reads the whole table"""
+
+    def query_by_prime_key(self, prime_key_value):
+        return list(self.query_items(prime_key_value))
+
+    def batch_put(self, items):
+        self.bulk_write(put_items=items)
+        print(f"Processed batch_put for {len(items)} records")
+
+    def batch_delete(self, keys):
+        self.bulk_write(delete_keys=keys)
+        print(f"Processed batch_delete for {len(keys)} records")
+
+
+def create_storage(table_name, prime_key_name, sorting_key_name, indexes=None, backend=None) -> StorageBackend:
+    # The backends are imported here, so only the one in use is loaded (boto3 is not needed for sqlite)
+    backend = backend or os.getenv('CI_CUC_STORAGE', DYNAMODB)
+    if backend == DYNAMODB:
+        from db_helpers import DBHelpers
+        return DBHelpers(table_name, prime_key_name, sorting_key_name, indexes)
+    if backend == SQLITE:
+        from sqlite_helpers import SQLiteHelpers
+        return SQLiteHelpers(os.getenv('CI_CUC_SQLITE_PATH', DEFAULT_SQLITE_PATH), table_name,
+                             prime_key_name, sorting_key_name, indexes)
+    raise StorageError(f"Unknown CI_CUC_STORAGE: {backend}, expect {STORAGE_BACKENDS}")
@@ -0,0 +1,121 @@
+import re
+import sys
+from typing import Callable, Dict, FrozenSet, Iterable, List
+
+# Cucumber tag expressions like cucumber-js -t "@a and (@b or not @c)", compared without the @
+OPERATORS = ('or', 'and', 'not')
+TOKEN = re.compile(r"\s*((?:\\.|[^\s()\\])+|[()])")
+
+
+def tag_name(tag: str) -> str:
+    return sys.intern(tag[1:] if tag.startswith('@') else tag)
+
+
+def tokenize(expression: str) -> List[str]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError(f"Invalid tag expression \"{expression}\" at position {position}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class TagExpression:
+    """
+    A tag expression parsed once into a predicate over a set of tags.
+    The result is remembered for every tag set, and the scenarios of a feature, or the rows of an outline, share
+    a few tag sets, so filtering many scenarios costs about one set lookup per scenario.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self._tokens = tokenize(expression)
+        self._position = 0
+        self.tags: set[str] = set()
+        if self._tokens:
+            self.predicate = self._parse_or()
+            if self._position < len(self._tokens):
+                self._error(f"unexpected \"{self._tokens[self._position]}\"")
+        else:
+            # An empty expression matches every scenario, like cucumber-js without -t
+            self.predicate = lambda tags: True
+        self._results: Dict[FrozenSet[str], bool] = {}
+
+    @classmethod
+    def from_tags(cls, include_tags: List[str], exclude_tags: List[str] = None) -> 'TagExpression':
+        # Any of the include entries and none of the exclude entries, each a tag or a tag expression
+        include_tags = [tag for tag in include_tags if tag.strip()]
+        exclude_tags = [tag for tag in exclude_tags or [] if tag.strip()]
+        for tag in include_tags + exclude_tags:
+            # Report an invalid entry as it was given, not as a part of the combined expression
+            cls(tag)
+        include = ' or '.join(f"({tag})" for tag in include_tags)
+        exclude = ' or '.join(f"({tag})" for tag in exclude_tags)
+        if not include:
+            # No include tag selects nothing, as before the tag expressions
+            nothing = cls('')
+            nothing.predicate = lambda tags: False
+            return nothing
+        return cls(f"({include}) and not ({exclude})" if exclude else include)
+
+    def matches(self, tags: Iterable[str]) -> bool:
+        tag_set = tags if isinstance(tags, frozenset) else frozenset(tags)
+        result = self._results.get(tag_set)
+        if result is None:
+            result = self._results[tag_set] = self.predicate(tag_set)
+        return result
+
+    def select(self, scenarios: List[dict], tags_key: str = 'tags') -> List[dict]:
+        return [scenario for scenario in scenarios if self.matches(scenario.get(tags_key, []))]
+
+    def _peek(self) -> str:
+        return self._tokens[self._position] if self._position < len(self._tokens) else ''
+
+    def _next(self) -> str:
+        token = self._peek()
+        if not token:
+            self._error('unexpected end')
+        self._position += 1
+        return token
+
+    def _error(self, message: str):
+        raise ValueError(f"Invalid tag expression \"{self.expression}\": {message}")
+
+    def _parse_or(self) -> Callable[[FrozenSet[str]], bool]:
+        operands = [self._parse_and()]
+        while self._peek() == 'or':
+            self._next()
+            operands.append(self._parse_and())
+        return operands[0] if len(operands) == 1 else lambda tags: any(operand(tags) for operand in operands)
+
+    def _parse_and(self) -> Callable[[FrozenSet[str]], bool]:
+        operands = [self._parse_not()]
+        while self._peek() == 'and':
+            self._next()
+            operands.append(self._parse_not())
+        return operands[0] if len(operands) == 1 else lambda tags: all(operand(tags) for operand in operands)
+
+    def _parse_not(self) -> Callable[[FrozenSet[str]], bool]:
+        token = self._next()
+        if token == 'not':
+            operand = self._parse_not()
+            return lambda tags: not operand(tags)
+        if token == '(':
+            operand = self._parse_or()
+            if self._next() != ')':
+                self._error('missing ")"')
+            return operand
+        if token == ')' or token in OPERATORS:
+            self._error(f"unexpected \"{token}\"")
+        tag = tag_name(re.sub(r"\\(.)", r"\1", token))
+        self.tags.add(tag)
+        return lambda tags: tag in tags
+
+
+def is_plain_tag(tag: str) -> bool:
+    tokens = tokenize(tag)
+    return len(tokens) == 1 and tokens[0] not in OPERATORS and tokens[0] not in ('(', ')')
@@ -0,0 +1,79 @@
+from collections.abc import Mapping
+
+NO_EXAMPLE = 'N/A'
+# The attributes of a test record, every one of them is a slot. Anything else stored with the record is kept in extra
+RECORD_FIELDS = (
+    'project_test_run', 'test_name_example_row', 'project', 'test_run_name', 'scenario_name', 'example_row',
+    'scenario_outline', 'test_location', 'test_status', 'test_run_reset_time', 'last_update_time', 'scenario_tags',
+    'test_start_time', 'last_duration', 'duration_estimate', 'scenario_duration', 'lease_owner', 'lease_expire_time',
+    'scenario_fingerprint', 'step_fingerprint', 'attempts', 'shard_id', 'shard_status'
+)
+_RECORD_FIELD_SET = frozenset(RECORD_FIELDS)
+
+
+def scenario_sort_key(scenario_name: str, example_row) -> tuple:
+    # By scenario name, then the example rows in numeric order, then the scenario without examples
+    row = str(example_row)
+    return (scenario_name, 0, int(row)) if row.isdigit() else (scenario_name, 1, row)
+
+
+class TestRecord(Mapping):
+    """
+    One test of a test run, in the compact form of a slotted object with its sort key computed once.
+    It reads like the storage item it was built from, record['test_status'] or record.get('lease_owner'),
+    and to_item() gives the item back.
+    """
+    __slots__ = (*RECORD_FIELDS, 'extra', 'sort_key')
+
+    def __init__(self, item: dict):
+        extra = None
+        for key, value in item.items():
+            if key in _RECORD_FIELD_SET:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self.extra = extra
+        # Projected records may have no scenario name, they are not sorted
+        self.sort_key = scenario_sort_key(item['scenario_name'], item.get('example_row', NO_EXAMPLE)) \
+            if 'scenario_name' in item else None
+
+    def __getitem__(self, key):
+        if key in _RECORD_FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _RECORD_FIELD_SET:
+            return getattr(self, key, default)
+        return self.extra.get(key, default) if self.extra is not None else default
+
+    def __contains__(self, key):
+        if key in _RECORD_FIELD_SET:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self):
+        for key in RECORD_FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"TestRecord({self.to_item()!r})"
+
+    def to_item(self) -> dict:
+        item = {key: getattr(self, key) for key in RECORD_FIELDS if hasattr(self, key)}
+        if self.extra is not None:
+            item.update(self.extra)
+        return item
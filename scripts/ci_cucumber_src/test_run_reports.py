@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from cucumber_tracker import CucumberTestTracker, TABLE_NAME, TRACKER_INDEXES, NOT_RUN, RUNNING, FAILED, PASSED
+from storage_backend import create_storage
+
+JIRA_ENDPOINT = 'https://bioappdev.atlassian.net/browse'
+TICKET_TAG_PREFIX = 'JIRA-'
+DEFAULT_REPORT_CONCURRENCY = 8
+
+
+class MultiRunReport:
+    """
+    Reports over several test runs of one project.
+    All test runs are queried concurrently through one shared storage client, once,
+    and every output (summary table, ticket table, json) is built from that one data set.
+    """
+
+    def __init__(self, project, test_run_list, concurrency=None, db=None):
+        self.project = project
+        self.test_run_list = test_run_list
+        self.concurrency = concurrency or int(os.getenv('CI_CUC_REPORT_CONCURRENCY', DEFAULT_REPORT_CONCURRENCY))
+        self.db = db or create_storage(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES)
+        self.trackers = {run: CucumberTestTracker(project, run, db=self.db) for run in test_run_list}
+        self.loaded = False
+
+    def load(self):
+        if not self.loaded and len(self.trackers) > 0:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(self.trackers)))) as pool:
+                list(pool.map(lambda tracker: tracker.load_records(), self.trackers.values()))
+            self.loaded = True
+        return self
+
+    def json_results(self) -> dict[str, dict]:
+        self.load()
+        return {run: tracker.json_test_result() for run, tracker in self.trackers.items()}
+
+    def run_summaries(self) -> dict[str, dict]:
+        # The counts and timestamps of every test run, from its summary item or its records
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(self.trackers)))) as pool:
+            summaries = dict(zip(self.trackers, pool.map(lambda tracker: tracker.run_summary(),
+                                                         self.trackers.values())))
+        for test_run, summary in summaries.items():
+            if summary is None:
+                tracker = self.trackers[test_run]
+                if not self.loaded:
+                    tracker.load_records()
+                summaries[test_run] = tracker.json_test_result()
+        return summaries
+
+    def summary_table_markdown(self, link_list=None) -> str:
+        link_list = link_list or []
+        report_txt = f"## **Test Result for {self.project}**\n"
+        report_txt += ("| All Passed | Test Run | Reset Time | Finish Time | Total | Not Run | Running "
+                       "| ❌ Failed | ✅ Passed | Link |\n")
+        report_txt += "| --- | --- | --- | --- | --- | --- | --- | --- | --- | --- |\n"
+        for i, (test_run, result_obj) in enumerate(self.run_summaries().items()):
+            counts = result_obj['counts']
+            nr, rn, fd, pd = counts[NOT_RUN], counts[RUNNING], counts[FAILED], counts[PASSED]
+            row_status = "⚠️" if fd > 0 or nr > 0 or rn > 0 else '✅'
+            report_txt += (f"|  {row_status} | {test_run} | {result_obj['reset_time']} | {result_obj['finish_time']} "
+                           f"| {counts['total']} | {nr} | {rn} | {fd} | {pd} "
+                           f"| {link_list[i] if i < len(link_list) else ''} |\n")
+        report_txt += "---\n"
+        return report_txt
+
+    def ticket_tests(self, tickets) -> dict[str, list[str]]:
+        self.load()
+        ticket_list = [f"{TICKET_TAG_PREFIX}{ticket}" for ticket in tickets]
+        content = {}
+        for test_run, tracker in self.trackers.items():
+            # The examples of every scenario are counted once per test run by the tag index
+            tag_index = tracker.tag_index()
+            for ticket in ticket_list:
+                test_str_list = [
+                    f"{test_run}: {scenario_name} ({count} exmaples)"
+                    if count > 1
+                    else f"{test_run}: {scenario_name}"
+                    for scenario_name, count in tag_index.scenarios_by_tag(ticket).items()
+                ]
+                if len(test_str_list) > 0:
+                    ticket_key = ticket.replace(TICKET_TAG_PREFIX, '')
+                    content.setdefault(ticket_key, []).extend(test_str_list)
+        return content
+
+    def ticket_table_markdown(self, tickets) -> str:
+        markdown_table = "|         Ticket         | Tests |\n| --- | --- |\n"
+        for ticket, tests in self.ticket_tests(tickets).items():
+            ticket_link = f"[{ticket}]({JIRA_ENDPOINT}/{ticket})"
+            tests_formatted = "<br>".join([f"• {test}" for test in tests])
+            markdown_table += f"| {ticket_link} | {tests_formatted} |\n"
+        return f"{markdown_table}\n---\n"
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The modules of ci_cucumber_src import each other as top level modules, the fake DynamoDB is in benchmarks
+SRC = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(SRC / 'benchmarks'))
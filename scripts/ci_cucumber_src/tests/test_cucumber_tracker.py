@@ -0,0 +1,105 @@
+import threading
+from collections import Counter
+
+import pytest
+from cucumber_tracker import CucumberTestTracker, assign_shards, shard_status, TRACKER_INDEXES, TABLE_NAME, \
+    NOT_RUN, RUNNING, PASSED
+from local_dynamodb import LocalDynamoDB
+
+PROJECT = 'ci_cuc_test'
+
+
+def synthetic_tests(count: int) -> list[dict]:
+    return [
+        {'scenario_name': f"Scenario {i}", 'example_row': 'N/A', 'scenario_outline': False,
+         'test_location': f"features/area.feature:{i}", 'tags': ['regression']}
+        for i in range(count)
+    ]
+
+
+def records(durations: list) -> list[dict]:
+    return [{'duration_estimate': duration, 'test_status': NOT_RUN} for duration in durations]
+
+
+@pytest.fixture
+def db():
+    return LocalDynamoDB(TABLE_NAME, 'project_test_run', 'test_name_example_row', TRACKER_INDEXES)
+
+
+@pytest.fixture
+def tracker(db, capsys):
+    ctt = CucumberTestTracker(PROJECT, 'run', db=db, worker_id='worker-1')
+    ctt.sync_tests_in_test_run(synthetic_tests(20))
+    capsys.readouterr()
+    return ctt
+
+
+def test_assign_shards_balances_the_longest_tests_first():
+    test_records = records([6, 5, 4, 3, 2, 2])
+    loads = assign_shards(test_records, [1, 1])
+    # 6 and 5 open the two shards, 4 goes with 5, 3 with 6, then each shard gets a 2
+    assert loads == [11.0, 11.0]
+    assert [r['shard_id'] for r in test_records] == [0, 1, 1, 0, 1, 0]
+    assert test_records[0]['shard_status'] == shard_status(0, NOT_RUN)
+
+
+def test_assign_shards_by_workers_per_shard():
+    test_records = records([1] * 30)
+    loads = assign_shards(test_records, [2, 1])
+    assert Counter(r['shard_id'] for r in test_records) == {0: 20, 1: 10}
+    assert loads == [10.0, 10.0]
+
+
+def test_assign_shards_counts_a_test_without_estimate_as_the_average():
+    test_records = records([10, None, None, 2])
+    assign_shards(test_records, [1, 1])
+    assert [r['shard_id'] for r in test_records] == [0, 1, 1, 0]
+
+
+def test_claim_batch_moves_tests_to_running(tracker):
+    claimed = tracker.claim_batch(5)
+    assert len(claimed) == 5
+    assert tracker.count_by_status([RUNNING]) == 5
+    assert {r['lease_owner'] for r in tracker.tests_by_status([RUNNING])} == {'worker-1'}
+
+
+def test_concurrent_claims_claim_every_test_once(db, tracker):
+    claimed = Counter()
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        ctt = CucumberTestTracker(PROJECT, 'run', db=db, worker_id=worker_id)
+        while tests := ctt.claim_batch(3):
+            with lock:
+                claimed.update(test['test_name_example_row'] for test in tests)
+
+    threads = [threading.Thread(target=worker, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == 20
+    assert set(claimed.values()) == {1}
+
+
+def test_status_changes_update_the_summary(tracker):
+    for test in tracker.claim_batch(3):
+        tracker.update_test_status(test['scenario_name'], test['example_row'], PASSED, RUNNING, print_log=False)
+    summary = tracker.run_summary()
+    assert summary['counts'][PASSED] == 3
+    assert summary['counts'][NOT_RUN] == 17
+    assert tracker.count_by_status([PASSED]) == 3
+
+
+def test_sharded_reset_claims_the_own_shard_first(db, tracker, capsys):
+    tracker.sync_tests_in_test_run(synthetic_tests(20), shards='1,1')
+    capsys.readouterr()
+    shard_one = CucumberTestTracker(PROJECT, 'run', db=db, worker_id='worker-2', shard=1)
+    claimed = shard_one.claim_batch(5)
+    assert {test['shard_id'] for test in claimed} == {1}
+
+
+def test_renew_leases_keeps_only_the_leases_of_the_owner(tracker):
+    keys = [test['test_name_example_row'] for test in tracker.claim_batch(2)]
+    assert sorted(tracker.renew_leases(keys, 'worker-1')) == sorted(keys)
+    assert tracker.renew_leases(keys, 'worker-2') == []
@@ -0,0 +1,58 @@
+import pytest
+from botocore.exceptions import ClientError
+from db_helpers import DBHelpers
+from storage_backend import StorageBackend, StorageError, ConditionFailed, TransactionConflict
+
+UPDATES = [
+    {'primary_value': 'project/run', 'sorting_value': f"t{i}", 'update_dict': {'status': 'RUNNING'},
+     'condition_dict': {'status': 'NOT_RUN'}}
+    for i in range(3)
+]
+
+
+def cancelled(*codes, error_code='TransactionCanceledException'):
+    response = {'Error': {'Code': error_code, 'Message': 'Transaction cancelled'}}
+    if codes:
+        response['CancellationReasons'] = [{'Code': code} for code in codes]
+    return ClientError(response, 'TransactWriteItems')
+
+
+def helpers(error: ClientError) -> DBHelpers:
+    # Without a session, every call fails with the given error
+    db = DBHelpers.__new__(DBHelpers)
+    StorageBackend.__init__(db, 'results', 'project_test_run', 'test_name_example_row')
+
+    def call(operation, **kwargs):
+        raise error
+
+    db._call = call
+    return db
+
+
+def test_failed_conditions_are_reported_by_position():
+    with pytest.raises(ConditionFailed) as failed:
+        helpers(cancelled('None', 'ConditionalCheckFailed', 'ConditionalCheckFailed')).transact_update_items(UPDATES)
+    assert failed.value.failed_indexes == {1, 2}
+
+
+def test_failed_conditions_win_over_conflicts():
+    with pytest.raises(ConditionFailed) as failed:
+        helpers(cancelled('TransactionConflict', 'ConditionalCheckFailed', 'None')).transact_update_items(UPDATES)
+    assert failed.value.failed_indexes == {1}
+
+
+def test_conflict_only_is_a_transaction_conflict():
+    with pytest.raises(TransactionConflict):
+        helpers(cancelled('None', 'TransactionConflict', 'None')).transact_update_items(UPDATES)
+
+
+def test_without_reasons_every_update_failed():
+    with pytest.raises(ConditionFailed) as failed:
+        helpers(cancelled()).transact_update_items(UPDATES)
+    assert failed.value.failed_indexes == {0, 1, 2}
+
+
+def test_other_errors_are_storage_errors():
+    with pytest.raises(StorageError) as failed:
+        helpers(cancelled(error_code='AccessDeniedException')).transact_update_items(UPDATES)
+    assert not isinstance(failed.value, ConditionFailed)
@@ -0,0 +1,115 @@
+from feature_scanner import CucumberFeature
+
+RULES = """@feature_tag
+Feature: Rules
+  Background:
+    Given the feature background
+
+  Scenario: Before the rules
+    Given a step
+
+  @rule_tag
+  Rule: First rule
+    Background:
+      Given the rule background
+
+    @scenario_tag
+    Scenario: In the rule
+      Given a step
+
+  Rule: Second rule
+    Scenario: In the second rule
+      Given a step
+"""
+
+OUTLINE = """Feature: Outline
+  @outline_tag
+  Scenario Outline: Many rows
+    Given the value <value>
+
+    @first_block
+    Examples:
+      | value |
+      | 1     |
+      | 2     |
+
+    # A comment between the blocks
+    @second_block
+    Examples: More
+      | value |
+      | 3     |
+"""
+
+DOC_STRING = '''Feature: Doc strings
+  Scenario: With a doc string
+    Given the text
+      """
+      @not_a_tag
+      # not a comment
+      Scenario: not a scenario
+      """
+    Then it is one scenario
+
+  Scenario: After the doc string
+    Given a step
+'''
+
+
+def by_name(cf: CucumberFeature) -> dict:
+    return {scenario['scenario_name']: scenario for scenario in cf.scenarios}
+
+
+def test_rule_tags_apply_to_the_scenarios_of_the_rule_only():
+    scenarios = by_name(CucumberFeature('rules.feature', RULES))
+    assert scenarios['Before the rules']['tags'] == ['feature_tag']
+    assert scenarios['In the rule']['tags'] == ['scenario_tag', 'rule_tag', 'feature_tag']
+    assert scenarios['In the second rule']['tags'] == ['feature_tag']
+
+
+def test_rule_background_is_part_of_the_scenarios_of_the_rule():
+    scenarios = by_name(CucumberFeature('rules.feature', RULES))
+    assert scenarios['Before the rules']['steps'] == ['Given the feature background', 'Given a step']
+    assert scenarios['In the rule']['steps'] == \
+        ['Given the feature background', 'Given the rule background', 'Given a step']
+    assert scenarios['In the second rule']['steps'] == ['Given the feature background', 'Given a step']
+
+
+def test_example_rows_are_numbered_across_examples_blocks():
+    scenarios = CucumberFeature('outline.feature', OUTLINE).scenarios
+    assert [s['example_row'] for s in scenarios] == ['1', '2', '3']
+    assert [s['test_location'] for s in scenarios] == \
+        ['outline.feature:9', 'outline.feature:10', 'outline.feature:16']
+    assert all(s['scenario_outline'] for s in scenarios)
+    assert [s['steps'] for s in scenarios] == [['Given the value 1'], ['Given the value 2'], ['Given the value 3']]
+
+
+def test_every_examples_block_adds_its_tags():
+    scenarios = CucumberFeature('outline.feature', OUTLINE).scenarios
+    assert scenarios[0]['tags'] == ['first_block', 'outline_tag']
+    assert scenarios[2]['tags'] == ['second_block', 'outline_tag']
+
+
+def test_example_rows_have_distinct_fingerprints():
+    scenarios = CucumberFeature('outline.feature', OUTLINE).scenarios
+    assert len({s['fingerprint'] for s in scenarios}) == 3
+
+
+def test_doc_string_content_is_not_parsed():
+    scenarios = CucumberFeature('doc.feature', DOC_STRING).scenarios
+    assert [s['scenario_name'] for s in scenarios] == ['With a doc string', 'After the doc string']
+    assert scenarios[0]['tags'] == []
+    assert scenarios[1]['tags'] == []
+    assert scenarios[0]['steps'] == ['Given the text', 'Then it is one scenario']
+
+
+def test_doc_string_changes_the_fingerprint():
+    changed = DOC_STRING.replace('# not a comment', '# another line')
+    assert CucumberFeature('doc.feature', DOC_STRING).scenarios[0]['fingerprint'] != \
+        CucumberFeature('doc.feature', changed).scenarios[0]['fingerprint']
+
+
+def test_scenarios_by_tag():
+    cf = CucumberFeature('rules.feature', RULES)
+    assert [s['scenario_name'] for s in cf.scenarios_by_tag(['@rule_tag'])] == ['In the rule']
+    assert [s['scenario_name'] for s in cf.scenarios_by_tag(['feature_tag'], ['rule_tag'])] == \
+        ['Before the rules', 'In the second rule']
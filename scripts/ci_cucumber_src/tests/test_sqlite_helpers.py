@@ -0,0 +1,77 @@
+import threading
+from decimal import Decimal
+
+import pytest
+from sqlite_helpers import SQLiteHelpers
+from storage_backend import ConditionFailed
+
+PK = 'project/run'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'ci_cuc.sqlite3'
+
+
+def storage(db_path) -> SQLiteHelpers:
+    return SQLiteHelpers(db_path, 'results', 'pk', 'sk', {'status': 'status-index'})
+
+
+def test_conditional_claim_succeeds_once_across_connections(db_path):
+    first, second = storage(db_path), storage(db_path)
+    first.bulk_write(put_items=[{'pk': PK, 'sk': 'test', 'status': 'NOT_RUN'}])
+    first.update_item(PK, 'test', {'status': 'RUNNING', 'owner': 'first'}, {'status': 'NOT_RUN'})
+    with pytest.raises(ConditionFailed):
+        second.update_item(PK, 'test', {'status': 'RUNNING', 'owner': 'second'}, {'status': 'NOT_RUN'})
+    assert second.get_item(PK, 'test')['owner'] == 'first'
+
+
+def test_concurrent_claims_of_one_test_have_one_winner(db_path):
+    storage(db_path).bulk_write(put_items=[{'pk': PK, 'sk': 'test', 'status': 'NOT_RUN'}])
+    winners = []
+    start = threading.Barrier(8)
+
+    def claim(worker):
+        # Every thread has its own connection, and BEGIN IMMEDIATE serializes the read-check-write
+        db = storage(db_path)
+        start.wait()
+        try:
+            db.update_item(PK, 'test', {'status': 'RUNNING', 'owner': worker}, {'status': 'NOT_RUN'})
+            winners.append(worker)
+        except ConditionFailed:
+            pass
+
+    threads = [threading.Thread(target=claim, args=(f"w{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(winners) == 1
+    assert storage(db_path).get_item(PK, 'test')['owner'] == winners[0]
+
+
+def test_condition_on_a_missing_item_fails(db_path):
+    with pytest.raises(ConditionFailed):
+        storage(db_path).update_item(PK, 'missing', {'status': 'RUNNING'}, {'status': 'NOT_RUN'})
+
+
+def test_transaction_reports_the_failed_conditions_and_applies_nothing(db_path):
+    db = storage(db_path)
+    db.bulk_write(put_items=[{'pk': PK, 'sk': f"t{i}", 'status': 'NOT_RUN'} for i in range(3)])
+    db.update_item(PK, 't1', {'status': 'RUNNING'})
+    updates = [{'primary_value': PK, 'sorting_value': f"t{i}", 'update_dict': {'status': 'RUNNING'},
+                'condition_dict': {'status': 'NOT_RUN'}} for i in range(3)]
+    with pytest.raises(ConditionFailed) as failed:
+        db.transact_update_items(updates)
+    assert failed.value.failed_indexes == {1}
+    assert [item['status'] for item in db.query_items(PK)] == ['NOT_RUN', 'RUNNING', 'NOT_RUN']
+
+
+def test_add_and_query_filters(db_path):
+    db = storage(db_path)
+    db.bulk_write(put_items=[{'pk': PK, 'sk': f"t{i}", 'status': 'NOT_RUN', 'expire': i} for i in range(3)])
+    db.update_item(PK, 't0', {}, add_dict={'count': 2})
+    db.update_item(PK, 't0', {}, add_dict={'count': 1})
+    assert db.get_item(PK, 't0')['count'] == Decimal(3)
+    assert [item['sk'] for item in db.query_items(PK, {'status': ['NOT_RUN']}, below={'expire': 2})] == ['t0', 't1']
+    assert db.count_items(PK, {'status': []}) == 0
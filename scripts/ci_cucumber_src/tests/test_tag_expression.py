@@ -0,0 +1,69 @@
+import pytest
+from tag_expression import TagExpression, is_plain_tag, tokenize
+
+
+def test_not_binds_tighter_than_and_and_and_tighter_than_or():
+    expression = TagExpression('@a or @b and not @c')
+    assert expression.matches(['a', 'c'])
+    assert expression.matches(['b'])
+    assert not expression.matches(['b', 'c'])
+    assert not expression.matches([])
+
+
+def test_parentheses():
+    expression = TagExpression('(@a or @b) and not (@c or @d)')
+    assert expression.matches(['a'])
+    assert expression.matches(['b'])
+    assert not expression.matches(['a', 'd'])
+    assert not expression.matches(['c'])
+    assert expression.tags == {'a', 'b', 'c', 'd'}
+
+
+def test_tags_with_and_without_at_sign_are_the_same():
+    assert TagExpression('@smoke').matches(['smoke'])
+    assert TagExpression('smoke').matches(['smoke'])
+
+
+def test_escaped_characters_in_tag_names():
+    assert tokenize(r'@a\ b and @c\(1\)') == [r'@a\ b', 'and', r'@c\(1\)']
+    assert TagExpression(r'@a\ b and @c\(1\)').matches(['a b', 'c(1)'])
+
+
+def test_empty_expression_matches_everything():
+    assert TagExpression('').matches(['a'])
+    assert TagExpression('  ').matches([])
+
+
+@pytest.mark.parametrize('expression', ['@a and', '@a or or @b', '(@a', '@a)', 'not', '@a @b'])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        TagExpression(expression)
+
+
+def test_from_tags_is_any_include_and_no_exclude():
+    expression = TagExpression.from_tags(['a', '@b and @c'], ['skip'])
+    assert expression.matches(['a'])
+    assert expression.matches(['b', 'c'])
+    assert not expression.matches(['b'])
+    assert not expression.matches(['a', 'skip'])
+
+
+def test_from_tags_comma_list_entries_and_or_expression_select_the_same():
+    scenarios = [{'tags': ['a']}, {'tags': ['b']}, {'tags': ['c']}]
+    assert TagExpression.from_tags(['a', 'b']).select(scenarios) == TagExpression('@a or @b').select(scenarios)
+
+
+def test_from_tags_without_include_selects_nothing():
+    assert not TagExpression.from_tags([], ['skip']).matches(['a'])
+    assert not TagExpression.from_tags(['', ' ']).matches(['a'])
+
+
+def test_from_tags_reports_the_invalid_entry():
+    with pytest.raises(ValueError, match='"@b and"'):
+        TagExpression.from_tags(['a', '@b and'])
+
+
+def test_is_plain_tag():
+    assert is_plain_tag('@smoke')
+    assert not is_plain_tag('@a or @b')
+    assert not is_plain_tag('not')
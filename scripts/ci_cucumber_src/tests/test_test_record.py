@@ -0,0 +1,28 @@
+import test_record
+from test_record import NO_EXAMPLE, scenario_sort_key
+
+
+def test_example_rows_sort_numerically():
+    rows = ['10', '2', '100', '1', '99']
+    assert sorted(rows, key=lambda row: scenario_sort_key('outline', row)) == ['1', '2', '10', '99', '100']
+
+
+def test_scenario_without_examples_sorts_after_the_example_rows():
+    keys = [scenario_sort_key('s', NO_EXAMPLE), scenario_sort_key('s', '3')]
+    assert sorted(keys) == [scenario_sort_key('s', '3'), scenario_sort_key('s', NO_EXAMPLE)]
+
+
+def test_scenario_name_sorts_first():
+    assert scenario_sort_key('a', '100') < scenario_sort_key('b', '1')
+
+
+def test_record_sort_key_and_item_round_trip():
+    item = {'scenario_name': 'outline', 'example_row': '10', 'test_status': 'PASSED', 'custom': 1}
+    # Through the module, pytest would otherwise take TestRecord for a test class
+    record = test_record.TestRecord(item)
+    assert record.sort_key == scenario_sort_key('outline', '10')
+    assert record['custom'] == 1
+    assert record.get('lease_owner') is None
+    assert 'lease_owner' not in record
+    assert record.to_item() == item
+    assert test_record.TestRecord({'test_status': 'PASSED'}).sort_key is None